@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+对比证书探测方式的基准测试: 原生 ssl 握手 vs openssl 管道。
+
+用法:
+    python benchmarks/bench_probe.py [--iterations 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cert_probe import PROBE_MODE_NATIVE, PROBE_MODE_OPENSSL, probe_expiry
+from tls_server import LocalTLSServer
+
+
+def bench(mode: str, port: int, iterations: int) -> list:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = probe_expiry('localhost', port=port, timeout=5, mode=mode)
+        timings.append(time.perf_counter() - started)
+        if not result.ok:
+            raise RuntimeError(f"{mode} 探测失败: {result.error}")
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=50)
+    args = parser.parse_args()
+
+    with LocalTLSServer() as server:
+        print(f"本地 TLS 服务器: 127.0.0.1:{server.port}, 每种方式 {args.iterations} 次")
+        print(f"{'方式':<10}{'平均(ms)':>12}{'中位数(ms)':>14}{'p95(ms)':>12}")
+        for mode in (PROBE_MODE_OPENSSL, PROBE_MODE_NATIVE):
+            timings = sorted(bench(mode, server.port, args.iterations))
+            p95 = timings[int(len(timings) * 0.95) - 1]
+            print(f"{mode:<10}{statistics.mean(timings) * 1000:>12.2f}"
+                  f"{statistics.median(timings) * 1000:>14.2f}{p95 * 1000:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
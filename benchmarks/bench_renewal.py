@@ -0,0 +1,371 @@
+#!/usr/bin/env python3
+"""
+续签流程的基准测试 / 压力测试。
+
+所有外部依赖都由本地替身提供:
+  * acme.sh        -> benchmarks/stubs/acme.sh (用本地 CA 签发证书)
+  * 线上证书探测    -> TLSServerPool (域名:443 被解析到本地端口)
+  * 企业微信 API    -> FakeWeComServer
+  * 群晖 DSM API    -> FakeDSMServer (--dsm-targets 大于 1 时启动多台，并通过 SYNO_TARGETS 并发部署)
+  * DNS            -> FakeDNSServer (TXT 记录在 --dns-propagation 秒后在全部权威服务器上生效)
+
+每个域名数量下依次运行以下场景，每个场景都在独立进程中执行:
+  fresh   本地没有证书，线上证书即将过期: 全部域名走完 签发/部署/安装/通知 流程
+  steady  本地证书有效: 只读取本地证书文件
+  verify  VERIFY_DEPLOYED_CERT=true: 对全部域名进行网络探测
+  loop    在同一进程内连续执行 --cycles 轮 main_loop 检查任务
+
+每个场景记录 墙钟时间、子进程数量、峰值 RSS 以及各替身收到的请求数，
+结果追加到 --results 文件 (JSON Lines，带 git 提交号)，--compare 会与其他提交的最近一次结果对比。
+
+用法:
+    python benchmarks/bench_renewal.py [--domains 1,10,100] [--scenarios fresh,steady,verify,loop]
+                                       [--cycles 3] [--acme-delay 0] [--dsm-targets 1] [--san-batching]
+                                       [--dns-propagation 0] [--no-dns-check] [--compare]
+
+--no-dns-check 关闭 DNS 生效检查 (DNS_PROPAGATION_CHECK=false)，acme.sh 替身固定等待 --acme-delay 秒；
+开启时 acme.sh 替身按 --dnssleep 等待，由 DNS 生效检查提前结束。
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_dns import FakeDNSServer
+from fake_services import FakeDSMServer, FakeWeComServer
+from tls_server import TLSServerPool, generate_self_signed_cert
+
+SCENARIOS = ('fresh', 'steady', 'verify', 'loop')
+DEFAULT_RESULTS_PATH = os.path.join(BENCH_DIR, 'results', 'history.jsonl')
+BENCH_ZONE = 'bench.test'
+DSM_USERNAME = 'bench'
+DSM_PASSWORD = 'bench-password'
+
+
+def git_revision() -> tuple:
+    """返回 (提交号, 工作区是否有未提交的修改)"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def generate_ca(directory: str) -> str:
+    """生成签发测试证书用的 CA，返回所在目录"""
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes',
+        '-keyout', os.path.join(directory, 'ca.key'), '-out', os.path.join(directory, 'ca.crt'),
+        '-days', '3650', '-subj', '/CN=Bench Intermediate CA',
+        '-addext', 'basicConstraints=critical,CA:TRUE'
+    ], check=True, capture_output=True)
+    return directory
+
+
+def domain_names(count: int) -> list:
+    return [f'd{i:04d}.{BENCH_ZONE}' for i in range(1, count + 1)]
+
+
+class Workspace:
+    """一个域名数量对应的临时工作目录: acme.sh 替身目录、证书输出目录和状态目录"""
+
+    def __init__(self, root: str, domains: list, ca_dir: str, services: dict, args):
+        self.root = root
+        self.domains = domains
+        self.acme_home = os.path.join(root, 'acme.sh')
+        self.output = os.path.join(root, 'output')
+        self.state = os.path.join(root, 'state')
+        self.dns_records = os.path.join(root, 'dns_records.jsonl')
+        for path in (self.acme_home, self.output, self.state):
+            os.makedirs(path, exist_ok=True)
+        shutil.copy(os.path.join(BENCH_DIR, 'stubs', 'acme.sh'), os.path.join(self.acme_home, 'acme.sh'))
+        os.chmod(os.path.join(self.acme_home, 'acme.sh'), 0o755)
+        self.ca_dir = ca_dir
+        self.services = services
+        self.args = args
+
+    def env(self, verify_deployed: bool) -> dict:
+        wecom, dsm = self.services['wecom'], self.services['dsm'][0]
+        env = {k: os.environ[k] for k in ('PATH', 'HOME', 'LANG', 'TZ', 'TZ_OFFSET_HOURS') if k in os.environ}
+        env.update({
+            'DOMAIN': self.domains[0],
+            'DOMAINS': ','.join(self.domains[1:]),
+            'DNS_API': 'dns_bench',
+            'ACME_EMAIL': 'bench@example.com',
+            'CERT_OUTPUT_PATH': self.output,
+            'ACME_HOME': self.acme_home,
+            'APP_STATE_DIR': self.state,
+            'VERIFY_DEPLOYED_CERT': 'true' if verify_deployed else 'false',
+            'PROBE_CONCURRENCY': str(self.args.probe_concurrency),
+            'AUTO_DEPLOY_TO_SYNOLOGY': 'true',
+            'SYNO_USERNAME': DSM_USERNAME,
+            'SYNO_PASSWORD': DSM_PASSWORD,
+            'SYNO_HOSTNAME': '127.0.0.1',
+            'SYNO_PORT': str(dsm.port),
+            'SYNO_SCHEME': 'http',
+            'SYNO_DEPLOY_CONCURRENCY': str(self.args.deploy_concurrency),
+            'SAN_BATCHING': 'true' if self.args.san_batching else 'false',
+            'WECOM_CORP_ID': 'bench-corp',
+            'WECOM_CORP_SECRET': 'bench-secret',
+            'WECOM_AGENT_ID': '1000001',
+            'WECOM_API_ORIGIN': wecom.url,
+            'WECOM_TOKEN_CACHE': os.path.join(self.state, 'wecom_token.json'),
+            'BENCH_CA_DIR': self.ca_dir,
+            'BENCH_ACME_DELAY': str(self.args.acme_delay),
+            'BENCH_DNS_RECORDS': self.dns_records,
+            'BENCH_DNS_PORT': str(self.services['dns'].port),
+            'DNS_RESOLVER': '127.0.0.1',
+            'DNS_PROPAGATION_CHECK': 'false' if self.args.no_dns_check else 'true',
+        })
+        if len(self.services['dsm']) > 1:
+            env['SYNO_TARGETS'] = json.dumps([{'name': f'nas{i}', 'hostname': '127.0.0.1', 'port': server.port}
+                                              for i, server in enumerate(self.services['dsm'], 1)])
+        return env
+
+    def dsm_stats(self) -> Counter:
+        total = Counter()
+        for server in self.services['dsm']:
+            total.update(server.stats)
+        return total
+
+    def acme_calls(self) -> Counter:
+        calls = Counter()
+        try:
+            with open(os.path.join(self.acme_home, 'stub_calls.log')) as f:
+                for line in f:
+                    calls[json.loads(line)['command']] += 1
+        except FileNotFoundError:
+            pass
+        return calls
+
+
+def run_scenario(workspace: Workspace, scenario: str, pools: dict, args) -> dict:
+    """在子进程中运行一个场景，返回一条结果记录"""
+    verify_deployed = scenario == 'verify'
+    pool = pools['expiring'] if scenario == 'fresh' else pools['valid']
+    resolve_path = os.path.join(workspace.root, f'resolve-{scenario}.json')
+    with open(resolve_path, 'w') as f:
+        json.dump(pool.resolve_map(workspace.domains), f)
+    metrics_path = os.path.join(workspace.root, f'metrics-{scenario}.json')
+    log_path = os.path.join(workspace.root, f'{scenario}.log')
+
+    command = [sys.executable, os.path.join(BENCH_DIR, 'flow_runner.py'),
+               '--mode', 'loop' if scenario == 'loop' else 'main',
+               '--cycles', str(args.cycles), '--resolve', resolve_path, '--metrics', metrics_path]
+
+    acme_before = workspace.acme_calls()
+    wecom_before = Counter(workspace.services['wecom'].stats)
+    dsm_before = workspace.dsm_stats()
+
+    started = time.perf_counter()
+    with open(log_path, 'w') as log_file:
+        process = subprocess.Popen(command, env=workspace.env(verify_deployed), cwd=REPO_DIR,
+                                   stdout=log_file, stderr=subprocess.STDOUT)
+        try:
+            process.wait(timeout=args.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+    wall = time.perf_counter() - started
+
+    try:
+        with open(metrics_path) as f:
+            metrics = json.load(f)
+    except (OSError, ValueError):
+        metrics = {'exit_code': process.returncode if process.returncode else -1, 'elapsed': None,
+                   'cycles': [], 'spawns': None, 'spawn_commands': {}, 'peak_rss_kb': None}
+
+    return {
+        'scenario': scenario,
+        'domains': len(workspace.domains),
+        'dsm_targets': len(workspace.services['dsm']),
+        'san_batching': args.san_batching,
+        'dns_check': not args.no_dns_check,
+        'dns_propagation': args.dns_propagation,
+        'wall_s': round(wall, 4),
+        'flow_s': round(metrics['elapsed'], 4) if metrics['elapsed'] is not None else None,
+        'cycle_s': [round(c, 4) for c in metrics['cycles']],
+        'spawns': metrics['spawns'],
+        'spawn_commands': metrics['spawn_commands'],
+        'peak_rss_kb': metrics['peak_rss_kb'],
+        'exit_code': metrics['exit_code'],
+        'acme_calls': dict(workspace.acme_calls() - acme_before),
+        'wecom_requests': dict(Counter(workspace.services['wecom'].stats) - wecom_before),
+        'dsm_requests': dict(workspace.dsm_stats() - dsm_before),
+        'log': log_path if args.keep_workdir else None,
+    }
+
+
+def run_count(count: int, scenarios: list, fixtures: dict, args) -> list:
+    domains = domain_names(count)
+    records = []
+    with ExitStack() as stack:
+        wecom = stack.enter_context(FakeWeComServer(delay=args.wecom_delay))
+        dsm = [stack.enter_context(FakeDSMServer(delay=args.dsm_delay, username=DSM_USERNAME, password=DSM_PASSWORD))
+               for _ in range(max(1, args.dsm_targets))]
+        expiring = stack.enter_context(TLSServerPool(args.tls_servers, *fixtures['expiring']))
+        valid = stack.enter_context(TLSServerPool(args.tls_servers, *fixtures['valid']))
+        root = tempfile.mkdtemp(prefix=f'bench-{count}-')
+        # 第一台权威服务器先生效，第二台在 --dns-propagation 秒后生效
+        dns = stack.enter_context(FakeDNSServer(BENCH_ZONE, os.path.join(root, 'dns_records.jsonl'),
+                                                delays=(args.dns_propagation / 2, args.dns_propagation)))
+        try:
+            workspace = Workspace(root, domains, fixtures['ca'], {'wecom': wecom, 'dsm': dsm, 'dns': dns}, args)
+            pools = {'expiring': expiring, 'valid': valid}
+            # 其他场景依赖 fresh 场景签发的本地证书
+            if 'fresh' not in scenarios:
+                run_scenario(workspace, 'fresh', pools, args)
+            for scenario in scenarios:
+                record = run_scenario(workspace, scenario, pools, args)
+                records.append(record)
+                print_record(record)
+        finally:
+            if args.keep_workdir:
+                print(f"  工作目录保留在: {root}")
+            else:
+                shutil.rmtree(root, ignore_errors=True)
+    return records
+
+
+def print_header():
+    print(f"{'场景':<8}{'域名数':>8}{'墙钟(s)':>10}{'每轮(s)':>10}{'子进程':>8}{'峰值RSS(MB)':>13}"
+          f"{'acme.sh':>9}{'WeCom':>7}{'DSM':>6}{'退出码':>7}")
+
+
+def print_record(record: dict):
+    cycle = min(record['cycle_s']) if record['cycle_s'] else record['flow_s']
+    rss = f"{record['peak_rss_kb'] / 1024:.1f}" if record['peak_rss_kb'] else '-'
+    print(f"{record['scenario']:<8}{record['domains']:>8}{record['wall_s']:>10.3f}"
+          f"{(cycle if cycle is not None else float('nan')):>10.3f}{str(record['spawns']):>8}{rss:>13}"
+          f"{sum(record['acme_calls'].values()):>9}{sum(record['wecom_requests'].values()):>7}"
+          f"{sum(record['dsm_requests'].values()):>6}{record['exit_code']:>7}")
+
+
+def load_history(path: str) -> list:
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def save_results(path: str, records: list):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def compare(history: list, records: list):
+    """与其他提交中相同 场景/域名数 的最近一次结果对比"""
+    print("\n与历史结果对比:")
+    for record in records:
+        baseline = next((old for old in reversed(history)
+                         if old['scenario'] == record['scenario'] and old['domains'] == record['domains']
+                         and old.get('dsm_targets', 1) == record['dsm_targets']
+                         and old.get('san_batching', False) == record['san_batching']
+                         and old.get('dns_check', False) == record['dns_check']
+                         and old.get('dns_propagation', 0) == record['dns_propagation']
+                         and (old['commit'], old.get('dirty')) != (record['commit'], record['dirty'])), None)
+        name = f"  {record['scenario']:<8}{record['domains']:>6} 个域名"
+        if baseline is None:
+            print(f"{name}: 没有可对比的历史结果")
+            continue
+
+        def delta(key):
+            old, new = baseline.get(key), record.get(key)
+            if not old or new is None:
+                return '-'
+            return f"{(new - old) / old * 100:+.1f}%"
+
+        print(f"{name} (对比 {baseline['commit']}): 墙钟 {delta('wall_s')}, "
+              f"子进程 {baseline.get('spawns')} -> {record.get('spawns')}, 峰值 RSS {delta('peak_rss_kb')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--domains', default='1,10,100', help='逗号分隔的域名数量，例如 1,10,100,1000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='逗号分隔的场景')
+    parser.add_argument('--cycles', type=int, default=3, help='loop 场景执行的轮数')
+    parser.add_argument('--acme-delay', type=float, default=0.0, help='acme.sh 替身每次签发的模拟等待秒数')
+    parser.add_argument('--wecom-delay', type=float, default=0.0, help='企业微信替身的响应延迟秒数')
+    parser.add_argument('--dsm-delay', type=float, default=0.0, help='DSM 替身的响应延迟秒数')
+    parser.add_argument('--dsm-targets', type=int, default=1, help='DSM 替身的数量 (部署目标数)')
+    parser.add_argument('--deploy-concurrency', type=int, default=4, help='同时部署的最大目标数')
+    parser.add_argument('--san-batching', action='store_true', help='启用 SAN 批量签发 (SAN_BATCHING=true)')
+    parser.add_argument('--dns-propagation', type=float, default=0.0,
+                        help='TXT 记录在全部权威 DNS 服务器上生效所需的秒数')
+    parser.add_argument('--no-dns-check', action='store_true',
+                        help='关闭 DNS 生效检查 (DNS_PROPAGATION_CHECK=false)')
+    parser.add_argument('--tls-servers', type=int, default=4, help='TLS 服务器池的大小')
+    parser.add_argument('--probe-concurrency', type=int, default=8)
+    parser.add_argument('--timeout', type=float, default=3600, help='单个场景的超时秒数')
+    parser.add_argument('--results', default=DEFAULT_RESULTS_PATH, help='结果文件 (JSON Lines)')
+    parser.add_argument('--no-save', action='store_true', help='不写入结果文件')
+    parser.add_argument('--compare', action='store_true', help='与其他提交的历史结果对比')
+    parser.add_argument('--keep-workdir', action='store_true', help='保留临时工作目录和日志')
+    args = parser.parse_args()
+
+    counts = [int(c) for c in args.domains.split(',') if c.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知的场景: {', '.join(sorted(unknown))}")
+
+    commit, dirty = git_revision()
+    meta = {
+        'commit': commit,
+        'dirty': dirty,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'cycles': args.cycles,
+        'acme_delay': args.acme_delay,
+    }
+    print(f"提交 {commit}{' (有未提交的修改)' if dirty else ''}, Python {meta['python']}")
+
+    with tempfile.TemporaryDirectory(prefix='bench-fixtures-') as fixture_dir:
+        fixtures = {
+            'ca': generate_ca(fixture_dir),
+            'expiring': generate_self_signed_cert(fixture_dir, BENCH_ZONE, days=5),
+        }
+        valid_dir = os.path.join(fixture_dir, 'valid')
+        os.makedirs(valid_dir)
+        fixtures['valid'] = generate_self_signed_cert(valid_dir, BENCH_ZONE, days=90)
+
+        print_header()
+        records = []
+        for count in counts:
+            records.extend(dict(meta, **record) for record in run_count(count, scenarios, fixtures, args))
+
+    history = load_history(args.results)
+    if args.compare:
+        compare(history, records)
+    if not args.no_save:
+        save_results(args.results, records)
+        print(f"\n结果已追加到 {args.results}")
+    return 0 if all(r['exit_code'] == 0 for r in records) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+main.py 启动耗时的基准测试。
+
+每次迭代启动一个新的 Python 进程，测量:
+  * import: 仅导入 main 模块
+  * check-only: 运行 `main.py --check-only` (读取本地证书文件，报告有效期)
+同时记录进程中加载的模块数，以及是否导入了 requests。
+
+用法:
+    python benchmarks/bench_startup.py [--iterations 20]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(BENCH_DIR, '..', 'src')
+sys.path.insert(0, BENCH_DIR)
+
+from tls_server import generate_self_signed_cert
+
+DOMAIN = 'startup.bench.test'
+
+# 在子进程中执行，最后一行输出模块数和是否导入了 requests
+IMPORT_CODE = f"""
+import sys
+sys.path.insert(0, {SRC_DIR!r})
+import main
+print('@@', len(sys.modules), 'requests' in sys.modules)
+"""
+
+CHECK_CODE = f"""
+import sys, runpy
+sys.path.insert(0, {SRC_DIR!r})
+sys.argv = ['main.py', '--check-only']
+try:
+    runpy.run_path({os.path.join(SRC_DIR, 'main.py')!r}, run_name='__main__')
+except SystemExit as e:
+    code = e.code
+else:
+    code = 0
+print('@@', len(sys.modules), 'requests' in sys.modules, code)
+"""
+
+
+def run_once(code: str, env: dict) -> tuple:
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-c', code], env=env, capture_output=True, text=True, timeout=60)
+    elapsed = time.perf_counter() - started
+    marker = next((line for line in process.stdout.splitlines() if line.startswith('@@')), None)
+    if marker is None:
+        raise RuntimeError(f"子进程没有输出结果:\n{process.stdout}\n{process.stderr}")
+    fields = marker.split()
+    return elapsed, int(fields[1]), fields[2] == 'True', fields[3:] if len(fields) > 3 else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--json', action='store_true', help='以 JSON 输出结果')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench-startup-')
+    try:
+        output = os.path.join(root, 'output')
+        os.makedirs(output)
+        cert_path, _ = generate_self_signed_cert(root, DOMAIN)
+        shutil.copy(cert_path, os.path.join(output, 'cert.pem'))
+        env = dict(os.environ,
+                   DOMAIN=DOMAIN,
+                   DNS_API='dns_cf',
+                   ACME_EMAIL='bench@example.com',
+                   CERT_OUTPUT_PATH=output,
+                   APP_STATE_DIR=os.path.join(root, 'state'),
+                   ACME_HOME=os.path.join(root, 'acme'),
+                   WECOM_TOKEN_CACHE=os.path.join(root, 'wecom_token'))
+        os.makedirs(env['APP_STATE_DIR'])
+
+        records = []
+        for name, code in (('import', IMPORT_CODE), ('check-only', CHECK_CODE)):
+            timings, modules, uses_requests, extra = [], 0, False, []
+            for _ in range(args.iterations):
+                elapsed, modules, uses_requests, extra = run_once(code, env)
+                timings.append(elapsed)
+            records.append({
+                'mode': name,
+                'median_ms': round(statistics.median(timings) * 1000, 1),
+                'min_ms': round(min(timings) * 1000, 1),
+                'modules': modules,
+                'requests': uses_requests,
+                'exit_code': int(extra[0]) if extra and extra[0].lstrip('-').isdigit() else None,
+            })
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(records, ensure_ascii=False))
+        return
+    print(f"每种方式 {args.iterations} 次 (每次启动新的 Python 进程)")
+    print(f"{'方式':<12}{'中位数(ms)':>12}{'最小(ms)':>10}{'模块数':>8}{'requests':>10}{'退出码':>8}")
+    for r in records:
+        print(f"{r['mode']:<12}{r['median_ms']:>12.1f}{r['min_ms']:>10.1f}{r['modules']:>8}"
+              f"{str(r['requests']):>10}{str(r['exit_code']):>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+基准测试用的 DNS 替身: 一个递归解析器和若干台权威 DNS 服务器，都运行在同一个 UDP 端口上。
+
+* 127.0.0.1            递归解析器，返回区域的 NS 记录 (带 glue) 和 NS 主机的 A 记录
+* 127.0.0.2, 127.0.0.3 区域的权威服务器
+
+acme.sh 替身把添加的 TXT 记录追加到 records 文件 (JSON Lines)，
+每台权威服务器在记录添加 delays[i] 秒后才返回该记录，用来模拟 DNS 生效延迟。
+"""
+
+import json
+import socket
+import struct
+import threading
+import time
+from collections import Counter
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_TXT = 16
+RESOLVER = '127.0.0.1'
+
+
+def _encode_name(name: str) -> bytes:
+    return b''.join(bytes([len(label)]) + label.encode('ascii') for label in name.strip('.').split('.') if label) + b'\x00'
+
+
+def _record(name: str, rtype: int, rdata: bytes, ttl: int = 60) -> bytes:
+    return _encode_name(name) + struct.pack('!HHIH', rtype, 1, ttl, len(rdata)) + rdata
+
+
+def _txt(value: str) -> bytes:
+    data = value.encode('utf-8')
+    return b''.join(bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255))
+
+
+class FakeDNSServer:
+    """区域 zone 的 DNS 替身，stats 记录每台服务器收到的查询数"""
+
+    def __init__(self, zone: str, records_path: str, delays=(0.0, 0.0)):
+        self.zone = zone.lower()
+        self.records_path = records_path
+        self.nameservers = [(f'ns{i}.{self.zone}', f'127.0.0.{i + 1}') for i in range(1, len(delays) + 1)]
+        self.delays = {address: delay for (_, address), delay in zip(self.nameservers, delays)}
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        self._sockets = []
+        first = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        first.bind((RESOLVER, 0))
+        self.port = first.getsockname()[1]
+        self._sockets.append(first)
+        for _, address in self.nameservers:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.bind((address, self.port))
+            self._sockets.append(sock)
+        self._threads = [threading.Thread(target=self._serve, args=(sock,), daemon=True) for sock in self._sockets]
+        self._running = True
+
+    def _txt_values(self, name: str, delay: float) -> list:
+        now = time.time()
+        values = []
+        try:
+            with open(self.records_path) as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record['name'].lower() == name and now >= record['at'] + delay:
+                        values.append(record['value'])
+        except (OSError, ValueError):
+            pass
+        return values
+
+    def _answer(self, address: str, name: str, qtype: int) -> tuple:
+        """返回 (answers, additional) 两个资源记录列表"""
+        answers, additional = [], []
+        if qtype == TYPE_NS and name == self.zone:
+            for host, ns_address in self.nameservers:
+                answers.append(_record(name, TYPE_NS, _encode_name(host)))
+                additional.append(_record(host, TYPE_A, socket.inet_aton(ns_address)))
+        elif qtype == TYPE_A:
+            answers = [_record(name, TYPE_A, socket.inet_aton(a)) for host, a in self.nameservers if host == name]
+        elif qtype == TYPE_TXT:
+            # 递归解析器在全部权威服务器都生效后才能返回记录
+            delay = self.delays.get(address, max(self.delays.values(), default=0.0))
+            answers = [_record(name, TYPE_TXT, _txt(value)) for value in self._txt_values(name, delay)]
+        return answers, additional
+
+    def _handle(self, address: str, data: bytes) -> bytes:
+        query_id, flags = struct.unpack('!HH', data[:4])
+        offset, labels = 12, []
+        while data[offset]:
+            length = data[offset]
+            labels.append(data[offset + 1:offset + 1 + length].decode('ascii'))
+            offset += 1 + length
+        qtype, _ = struct.unpack('!HH', data[offset + 1:offset + 5])
+        question = data[12:offset + 5]
+        name = '.'.join(labels).lower()
+        with self._lock:
+            self.stats[f'{address} {qtype}'] += 1
+
+        answers, additional = self._answer(address, name, qtype)
+        response_flags = 0x8000 | (flags & 0x0100) | (0x0080 if address == RESOLVER else 0x0400)
+        header = struct.pack('!HHHHHH', query_id, response_flags, 1, len(answers), 0, len(additional))
+        return header + question + b''.join(answers) + b''.join(additional)
+
+    def _serve(self, sock: socket.socket):
+        address = sock.getsockname()[0]
+        while self._running:
+            try:
+                data, peer = sock.recvfrom(4096)
+            except OSError:
+                return
+            try:
+                sock.sendto(self._handle(address, data), peer)
+            except (IndexError, struct.error, UnicodeDecodeError):
+                continue
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        for sock in self._sockets:
+            sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
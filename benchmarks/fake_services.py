@@ -0,0 +1,203 @@
+"""
+基准测试用的外部服务替身: 企业微信 API 和群晖 DSM Web API。
+两者都是运行在 127.0.0.1 随机端口上的 HTTP 服务，并记录每类请求的次数。
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from cert_utils import CertParseError, parse_der_certificate, split_pem_certificates
+
+
+class _FakeHTTPService:
+    """在后台线程中运行的 HTTP 服务基类，子类实现 handle(method, path, params, headers, body)"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _dispatch(self, method):
+                url = urlsplit(self.path)
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if service.delay:
+                    time.sleep(service.delay)
+                status, payload = service.handle(method, url.path, params, self.headers, body)
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self.url = f'http://127.0.0.1:{self.port}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def handle(self, method, path, params, headers, body):
+        raise NotImplementedError
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FakeWeComServer(_FakeHTTPService):
+    """企业微信 API 替身: /cgi-bin/gettoken 和 /cgi-bin/message/send"""
+
+    def __init__(self, delay: float = 0.0, expires_in: int = 7200):
+        super().__init__(delay)
+        self.expires_in = expires_in
+        self.messages = []
+        self._tokens = set()
+
+    def handle(self, method, path, params, headers, body):
+        if path == '/cgi-bin/gettoken':
+            self.count('gettoken')
+            token = uuid.uuid4().hex
+            with self._lock:
+                self._tokens.add(token)
+            return 200, {'errcode': 0, 'errmsg': 'ok', 'access_token': token, 'expires_in': self.expires_in}
+        if path == '/cgi-bin/message/send':
+            self.count('message_send')
+            if params.get('access_token') not in self._tokens:
+                return 200, {'errcode': 40014, 'errmsg': 'invalid access_token'}
+            message = json.loads(body or b'{}')
+            with self._lock:
+                self.messages.append(message)
+            return 200, {'errcode': 0, 'errmsg': 'ok', 'msgid': uuid.uuid4().hex}
+        self.count('unknown')
+        return 404, {'errcode': -1, 'errmsg': 'not found'}
+
+
+class FakeDSMServer(_FakeHTTPService):
+    """
+    群晖 DSM Web API 替身，实现证书部署用到的接口:
+    SYNO.API.Info query、SYNO.API.Auth login/logout、SYNO.Core.Certificate.CRT list、SYNO.Core.Certificate import。
+    """
+
+    def __init__(self, delay: float = 0.0, username: str = 'admin', password: str = 'password'):
+        super().__init__(delay)
+        self.username = username
+        self.password = password
+        self.certificates = {}      # {id: {'id', 'desc', 'is_default', 'cert'}}
+        self._sessions = {}         # {sid: synotoken}
+
+    def _authorized(self, params, headers) -> bool:
+        sid = params.get('_sid')
+        token = params.get('SynoToken') or headers.get('X-SYNO-TOKEN')
+        return sid in self._sessions and self._sessions[sid] == token
+
+    def handle(self, method, path, params, headers, body):
+        api, api_method = params.get('api'), params.get('method')
+        self.count(f'{api}.{api_method}')
+        # 登录和登出的参数在 POST 请求体 (application/x-www-form-urlencoded) 中
+        form = {}
+        if method == 'POST' and headers.get('Content-Type', '').startswith('application/x-www-form-urlencoded'):
+            form = dict(parse_qsl(body.decode('utf-8')))
+
+        if api == 'SYNO.API.Info':
+            return 200, {'success': True, 'data': {
+                'SYNO.API.Auth': {'path': 'auth.cgi', 'minVersion': 1, 'maxVersion': 7},
+                'SYNO.Core.Certificate': {'path': 'entry.cgi', 'minVersion': 1, 'maxVersion': 1},
+                'SYNO.Core.Certificate.CRT': {'path': 'entry.cgi', 'minVersion': 1, 'maxVersion': 1},
+            }}
+
+        if api == 'SYNO.API.Auth' and api_method == 'login':
+            if 'passwd' in params or (form.get('account'), form.get('passwd')) != (self.username, self.password):
+                return 200, {'success': False, 'error': {'code': 400}}
+            sid, token = uuid.uuid4().hex, uuid.uuid4().hex
+            with self._lock:
+                self._sessions[sid] = token
+            return 200, {'success': True, 'data': {'sid': sid, 'synotoken': token}}
+
+        if api == 'SYNO.API.Auth' and api_method == 'logout':
+            with self._lock:
+                self._sessions.pop(form.get('_sid'), None)
+            return 200, {'success': True}
+
+        if not self._authorized(params, headers):
+            return 200, {'success': False, 'error': {'code': 119}}
+
+        if api == 'SYNO.Core.Certificate.CRT' and api_method == 'list':
+            with self._lock:
+                certificates = [{k: v for k, v in c.items() if k != 'cert'} for c in self.certificates.values()]
+            return 200, {'success': True, 'data': {'certificates': certificates}}
+
+        if api == 'SYNO.Core.Certificate' and api_method == 'import':
+            fields = self._parse_form(headers, body)
+            if not all(fields.get(name) for name in ('key', 'cert')):
+                return 200, {'success': False, 'error': {'code': 5512}}
+            try:
+                info = parse_der_certificate(split_pem_certificates(fields['cert'])[0])
+            except (CertParseError, IndexError):
+                return 200, {'success': False, 'error': {'code': 5512}}
+            with self._lock:
+                cert_id = fields.get('id') or uuid.uuid4().hex[:6]
+                self.certificates[cert_id] = {
+                    'id': cert_id,
+                    'desc': fields.get('desc', ''),
+                    'is_default': fields.get('as_default') == 'true' or not self.certificates,
+                    'subject': {'common_name': info.subject.split('CN=')[-1].split(',')[0], 'sub_alt_name': info.san},
+                    'valid_from': info.not_before.strftime('%b %d %H:%M:%S %Y GMT'),
+                    'valid_till': info.not_after.strftime('%b %d %H:%M:%S %Y GMT'),
+                    'cert': fields['cert'],
+                }
+            return 200, {'success': True, 'data': {'id': cert_id, 'restart_httpd': False}}
+
+        return 200, {'success': False, 'error': {'code': 102}}
+
+    @staticmethod
+    def _parse_form(headers, body: bytes) -> dict:
+        """解析 multipart/form-data 请求体，返回 {字段名: 文本值}"""
+        content_type = headers.get('Content-Type', '')
+        message = BytesParser(policy=HTTP).parsebytes(
+            f'Content-Type: {content_type}\r\n\r\n'.encode('utf-8') + body)
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param('name', header='content-disposition')
+            if name:
+                fields[name] = part.get_payload(decode=True).decode('utf-8', 'replace')
+        return fields
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+在独立进程中运行一次完整流程并输出度量数据，由 bench_renewal.py 调用。
+
+* main 模式: 与 `python src/main.py` 完全相同地执行 main.py
+* loop 模式: 在同一进程内连续执行 N 轮 main_loop 的检查任务 (与主循环中的每次唤醒相同)
+
+运行前会安装以下钩子:
+* 域名解析: 把被测域名的 443 端口映射到本地 TLS 服务器池
+* 进程计数: 统计流程中通过 subprocess 启动的子进程数量
+* DNS 端口: BENCH_DNS_PORT 指定时，DNS 查询发往该端口上的 DNS 替身
+"""
+
+import argparse
+import json
+import os
+import resource
+import runpy
+import socket
+import subprocess
+import sys
+import time
+from collections import Counter
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+spawned = Counter()
+
+
+def install_spawn_counter():
+    original = subprocess.Popen._execute_child
+
+    def _execute_child(self, args, *rest, **kwargs):
+        argv = [args] if isinstance(args, (str, bytes)) else list(args)
+        name = os.path.basename(str(argv[0]))
+        spawned[f"{name} {argv[1]}" if len(argv) > 1 else name] += 1
+        return original(self, args, *rest, **kwargs)
+
+    subprocess.Popen._execute_child = _execute_child
+
+
+def install_resolver(mapping: dict):
+    """把 mapping 中的域名解析到 127.0.0.1 上对应的端口"""
+    original = socket.getaddrinfo
+
+    def getaddrinfo(host, port, *args, **kwargs):
+        if isinstance(host, str) and host in mapping:
+            return original('127.0.0.1', mapping[host], *args, **kwargs)
+        return original(host, port, *args, **kwargs)
+
+    socket.getaddrinfo = getaddrinfo
+
+
+def run_main() -> int:
+    path = os.path.join(SRC_DIR, 'main.py')
+    # 与 `python src/main.py` 相同，不带 flow_runner 自己的命令行参数
+    sys.argv = [path]
+    try:
+        runpy.run_path(path, run_name='__main__')
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return 0
+
+
+def run_loop(cycles: int) -> tuple:
+    import main_loop
+    durations, exit_code = [], 0
+    for _ in range(cycles):
+        started = time.perf_counter()
+        result = main_loop.run_certificate_check()
+        main_loop.calculate_next_run_time(result)
+        durations.append(time.perf_counter() - started)
+        if result is None or not result.success:
+            exit_code = 1
+
+    import main
+    main.notification_digest.flush(force=True)
+    main.notification_mgr.flush()
+    return exit_code, durations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=('main', 'loop'), default='main')
+    parser.add_argument('--cycles', type=int, default=1)
+    parser.add_argument('--resolve', help='{域名: 端口} 映射的 JSON 文件')
+    parser.add_argument('--metrics', required=True, help='度量数据输出文件')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    install_spawn_counter()
+    if args.resolve:
+        with open(args.resolve) as f:
+            install_resolver(json.load(f))
+    sys.path.insert(0, SRC_DIR)
+    if os.environ.get('BENCH_DNS_PORT'):
+        # DNS 替身运行在非特权端口上
+        import dns_client
+        dns_client.NAMESERVER_PORT = int(os.environ['BENCH_DNS_PORT'])
+
+    cycles = []
+    if args.mode == 'main':
+        exit_code = run_main()
+    else:
+        exit_code, cycles = run_loop(args.cycles)
+
+    metrics = {
+        'mode': args.mode,
+        'exit_code': exit_code,
+        'elapsed': time.perf_counter() - started,
+        'cycles': cycles,
+        'spawns': sum(spawned.values()),
+        'spawn_commands': dict(spawned),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    with open(args.metrics, 'w') as f:
+        json.dump(metrics, f)
+    # 后台通知线程为守护线程，刷新输出后直接退出即可
+    sys.stdout.flush()
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
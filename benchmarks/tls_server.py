@@ -0,0 +1,112 @@
+"""
+本地 TLS 服务器替身，用于基准测试证书探测。
+启动时用 openssl 生成一张自签名证书，然后在 127.0.0.1 的随机端口上完成握手。
+"""
+
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+
+
+def generate_self_signed_cert(directory: str, common_name: str = 'localhost', days: int = 90) -> tuple:
+    """生成自签名 EC 证书，返回 (证书路径, 私钥路径)"""
+    cert_path = os.path.join(directory, f'{common_name}.crt')
+    key_path = os.path.join(directory, f'{common_name}.key')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+        '-nodes', '-keyout', key_path, '-out', cert_path, '-days', str(days),
+        '-subj', f'/CN={common_name}',
+        '-addext', f'subjectAltName=DNS:{common_name},DNS:*.{common_name}'
+    ], check=True, capture_output=True)
+    return cert_path, key_path
+
+
+class LocalTLSServer:
+    """在后台线程中运行的最小 TLS 服务器，握手后立即关闭连接"""
+
+    def __init__(self, cert_path: str = None, key_path: str = None, common_name: str = 'localhost', delay: float = 0.0):
+        self._tmpdir = None
+        if cert_path is None:
+            self._tmpdir = tempfile.TemporaryDirectory()
+            cert_path, key_path = generate_self_signed_cert(self._tmpdir.name, common_name)
+        self.cert_path = cert_path
+        self.key_path = key_path
+        self.delay = delay
+
+        self._context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self._context.load_cert_chain(cert_path, key_path)
+        self._sock = socket.create_server(('127.0.0.1', 0), backlog=128)
+        self.port = self._sock.getsockname()[1]
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def _handle(self, conn):
+        try:
+            if self.delay:
+                self._stopped.wait(self.delay)
+            with self._context.wrap_socket(conn, server_side=True) as tls_conn:
+                try:
+                    tls_conn.recv(1)
+                except (ssl.SSLError, OSError):
+                    pass
+        except (ssl.SSLError, OSError):
+            conn.close()
+
+    def _serve(self):
+        while not self._stopped.is_set():
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._sock.close()
+        if self._tmpdir:
+            self._tmpdir.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class TLSServerPool:
+    """
+    一组共享同一张证书的本地 TLS 服务器，按域名把探测请求分散到不同端口。
+    配合 resolve_map() 生成的映射使用，把 域名:443 解析到对应的本地端口。
+    """
+
+    def __init__(self, size: int, cert_path: str, key_path: str, delay: float = 0.0):
+        self.servers = [LocalTLSServer(cert_path, key_path, delay=delay) for _ in range(max(1, size))]
+
+    def port_for(self, index: int) -> int:
+        return self.servers[index % len(self.servers)].port
+
+    def resolve_map(self, domains) -> dict:
+        """返回 {域名: 本地端口}"""
+        return {domain: self.port_for(i) for i, domain in enumerate(domains)}
+
+    def start(self):
+        for server in self.servers:
+            server.start()
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,127 @@
+"""
+acme.sh 账户状态的指纹。
+
+账户注册和默认 CA 设置保存在持久化的 acme.sh 目录中:
+  <ACME_HOME>/account.conf                      ACCOUNT_EMAIL、DEFAULT_ACME_SERVER
+  <ACME_HOME>/ca/<CA 主机>/<目录路径>/           account.key、account.json、ca.conf
+由邮箱、CA 地址和上述文件中的账户信息计算出指纹，并记录在 ACME_HOME 中。
+指纹不变时说明账户早已注册，无需再次调用 --register-account / --set-default-ca。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# acme.sh 内置的 CA 简称
+CA_SERVERS = {
+    'letsencrypt': 'https://acme-v02.api.letsencrypt.org/directory',
+    'letsencrypt_test': 'https://acme-staging-v02.api.letsencrypt.org/directory',
+    'zerossl': 'https://acme.zerossl.com/v2/DV90',
+    'buypass': 'https://api.buypass.com/acme/directory',
+    'buypass_test': 'https://api.test4.buypass.no/acme/directory',
+    'google': 'https://dv.acme-v02.api.pki.goog/directory',
+    'googletest': 'https://dv.acme-v02.test-api.pki.goog/directory',
+    'sslcom': 'https://acme.ssl.com/sslcom-dv-ecc',
+}
+
+FINGERPRINT_FILE = '.syno_account_fingerprint'
+
+_CONF_LINE = re.compile(r"""^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=(['"]?)(.*?)\2\s*$""")
+
+
+def server_url(server: str) -> str:
+    """将 CA 简称转换为 ACME 目录地址"""
+    return CA_SERVERS.get(server.lower(), server)
+
+
+def ca_dir(acme_home: str, server: str) -> str:
+    """acme.sh 保存某个 CA 账户信息的目录，规则与 acme.sh 的 _getCAconfig 相同"""
+    url = urlsplit(server_url(server))
+    path = re.sub(r'/+', '/', url.path).strip('/')
+    return os.path.join(acme_home, 'ca', url.netloc, *filter(None, path.split('/')))
+
+
+def read_conf(path: str) -> Dict[str, str]:
+    """读取 acme.sh 的 KEY='value' 格式配置文件，文件不存在时返回空字典"""
+    values = {}
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                match = _CONF_LINE.match(line)
+                if match:
+                    values[match.group(1)] = match.group(3)
+    except OSError:
+        pass
+    return values
+
+
+def _file_digest(path: str) -> Optional[str]:
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def current_fingerprint(acme_home: str, email: str, server: str) -> Optional[str]:
+    """
+    根据当前的 acme.sh 文件计算账户指纹。
+
+    :return: 指纹字符串；账户尚未在该 CA 注册或默认 CA 不是 server 时返回 None。
+    """
+    url = server_url(server)
+    account_conf = read_conf(os.path.join(acme_home, 'account.conf'))
+    if account_conf.get('DEFAULT_ACME_SERVER') != url:
+        return None
+
+    directory = ca_dir(acme_home, server)
+    account_key = _file_digest(os.path.join(directory, 'account.key'))
+    if account_key is None:
+        return None
+    ca_conf = read_conf(os.path.join(directory, 'ca.conf'))
+
+    material = {
+        'email': email,
+        'server': url,
+        'account_email': account_conf.get('ACCOUNT_EMAIL', ''),
+        'account_key': account_key,
+        'account_json': _file_digest(os.path.join(directory, 'account.json')),
+        'ca_email': ca_conf.get('CA_EMAIL', ''),
+        'account_url': ca_conf.get('ACCOUNT_URL', ''),
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def recorded_fingerprint(acme_home: str) -> Optional[str]:
+    """读取上次成功设置账户后记录的指纹"""
+    try:
+        with open(os.path.join(acme_home, FINGERPRINT_FILE), 'r') as f:
+            return json.load(f).get('fingerprint')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def record_fingerprint(acme_home: str, fingerprint: str):
+    """原子地记录账户指纹"""
+    path = os.path.join(acme_home, FINGERPRINT_FILE)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            json.dump({'fingerprint': fingerprint}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"无法记录 acme.sh 账户指纹: {e}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def is_up_to_date(acme_home: str, email: str, server: str) -> bool:
+    """账户是否已按当前的邮箱和 CA 注册，且与上次记录的指纹一致"""
+    fingerprint = current_fingerprint(acme_home, email, server)
+    return fingerprint is not None and fingerprint == recorded_fingerprint(acme_home)
@@ -0,0 +1,298 @@
+"""
+证书有效期探测模块。
+提供单个域名的探测函数，以及可以并发探测一批域名的 fleet 探测接口。
+
+支持两种探测方式:
+  * native: 使用 Python 的 ssl/socket 直接握手并读取对端证书 (默认)
+  * openssl: 旧的 `openssl s_client | openssl x509` 管道
+
+探测失败按原因分类 (DNS 解析失败、连接被拒绝、超时、TLS 握手失败等)，
+临时性的失败按退避间隔重试；ProbeCache 在一段时间内缓存探测结果 (包括失败结果)。
+"""
+
+import logging
+import threading
+import socket
+import ssl
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from cert_utils import CertParseError, parse_der_certificate
+
+# 默认探测参数
+DEFAULT_PORT = 443
+DEFAULT_HOST_TIMEOUT = 15      # 单个主机的超时时间(秒)
+DEFAULT_OVERALL_TIMEOUT = 60   # 整批探测的总超时时间(秒)
+DEFAULT_CONCURRENCY = 8        # 同时探测的最大主机数
+
+DEFAULT_RETRIES = 2            # 临时性失败后的最大重试次数
+RETRY_BACKOFF = 1              # 第一次重试前等待的秒数，之后每次翻倍
+DEFAULT_CACHE_TTL = 600        # 成功结果的缓存时间(秒)
+DEFAULT_NEGATIVE_TTL = 60      # 失败结果的缓存时间(秒)
+
+PROBE_MODE_NATIVE = 'native'
+PROBE_MODE_OPENSSL = 'openssl'
+
+# 探测失败的分类
+ERROR_DNS = 'dns'              # 域名解析失败
+ERROR_REFUSED = 'refused'      # 连接被拒绝
+ERROR_TIMEOUT = 'timeout'      # 连接或握手超时
+ERROR_HANDSHAKE = 'handshake'  # TLS 握手失败
+ERROR_NETWORK = 'network'      # 其他网络错误 (连接被重置、网络不可达等)
+ERROR_CERT = 'cert'            # 未返回证书或证书无法解析
+# 重试可能成功的失败类型；证书本身的问题重试也不会改变
+TRANSIENT_ERRORS = (ERROR_DNS, ERROR_REFUSED, ERROR_TIMEOUT, ERROR_HANDSHAKE, ERROR_NETWORK)
+
+
+@dataclass
+class ProbeResult:
+    """单个域名的探测结果"""
+    domain: str
+    expiry_date: Optional[datetime] = None
+    error: Optional[str] = None
+    elapsed: float = 0.0
+    san: List[str] = field(default_factory=list)
+    issuer: Optional[str] = None
+    fingerprint_sha256: Optional[str] = None
+    # 结果来源: 'network' 表示网络探测，否则为本地证书文件路径
+    source: str = 'network'
+    # 失败的分类 (ERROR_*)，成功时为 None
+    error_kind: Optional[str] = None
+    attempts: int = 1
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.expiry_date is not None
+
+
+def _new_probe_context() -> ssl.SSLContext:
+    """
+    创建探测用的 SSL 上下文。
+    探测的目的是读取证书本身，因此不校验证书链和主机名，
+    这样已过期或自签名的证书同样能被读取。
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+_probe_context = _new_probe_context()
+
+
+def probe_certificate(domain: str, port: int = DEFAULT_PORT, server_name: Optional[str] = None,
+                      timeout: float = DEFAULT_HOST_TIMEOUT) -> ProbeResult:
+    """
+    通过 TLS 握手直接读取对端证书，不启动任何子进程。
+
+    :param domain: 要连接的主机名或 IP。
+    :param port: 目标端口。
+    :param server_name: 握手时发送的 SNI 名称，默认与 domain 相同。
+    :param timeout: 连接和握手的超时时间(秒)。
+    :return: ProbeResult，包含过期时间、SAN、颁发者和 SHA-256 指纹。
+    """
+    started = time.monotonic()
+    result = ProbeResult(domain=domain)
+
+    try:
+        with socket.create_connection((domain, port), timeout=timeout) as sock:
+            with _probe_context.wrap_socket(sock, server_hostname=server_name or domain) as tls_sock:
+                der = tls_sock.getpeercert(binary_form=True)
+
+        if not der:
+            result.error, result.error_kind = f"'{domain}:{port}' 未返回证书", ERROR_CERT
+        else:
+            info = parse_der_certificate(der)
+            result.expiry_date = info.not_after
+            result.san = info.san
+            result.issuer = info.issuer
+            result.fingerprint_sha256 = info.fingerprint_sha256
+    except socket.timeout:
+        result.error, result.error_kind = f"连接到 '{domain}:{port}' 超时", ERROR_TIMEOUT
+    except socket.gaierror as e:
+        result.error, result.error_kind = f"无法解析域名 '{domain}': {e}", ERROR_DNS
+    except ConnectionRefusedError:
+        result.error, result.error_kind = f"'{domain}:{port}' 拒绝连接", ERROR_REFUSED
+    except ssl.SSLError as e:
+        result.error, result.error_kind = f"与 '{domain}:{port}' 的 TLS 握手失败: {e}", ERROR_HANDSHAKE
+    except CertParseError as e:
+        result.error, result.error_kind = f"解析 '{domain}:{port}' 的证书失败: {e}", ERROR_CERT
+    except OSError as e:
+        result.error, result.error_kind = f"连接到 '{domain}:{port}' 失败: {e}", ERROR_NETWORK
+
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def probe_expiry_openssl(domain: str, port: int = DEFAULT_PORT, timeout: float = DEFAULT_HOST_TIMEOUT,
+                         server_name: Optional[str] = None) -> ProbeResult:
+    """
+    通过 OpenSSL 获取域名当前部署证书的过期时间。
+
+    :param domain: 要探测的域名。
+    :param port: 目标端口。
+    :param timeout: 单个主机的超时时间(秒)。
+    :param server_name: 握手时发送的 SNI 名称，默认与 domain 相同。
+    :return: ProbeResult
+    """
+    started = time.monotonic()
+    result = ProbeResult(domain=domain)
+
+    try:
+        command = f"echo | openssl s_client -connect {domain}:{port} -servername {server_name or domain} 2>/dev/null | openssl x509 -noout -enddate"
+
+        process = subprocess.run(
+            command,
+            shell=True,
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=timeout
+        )
+
+        output = process.stdout.strip()
+        if not output.startswith('notAfter='):
+            result.error, result.error_kind = f"无法从命令输出中解析有效期: {output}", ERROR_CERT
+        else:
+            # OpenSSL 日期格式: "Month Day HH:MM:SS YYYY GMT"
+            expiry_date_str = output.split('=', 1)[1]
+            result.expiry_date = datetime.strptime(expiry_date_str, '%b %d %H:%M:%S %Y %Z')
+    except subprocess.TimeoutExpired:
+        result.error, result.error_kind = f"连接到 '{domain}:{port}' 超时", ERROR_TIMEOUT
+    except subprocess.CalledProcessError as e:
+        # 管道丢弃了 s_client 的错误输出，无法区分具体原因
+        result.error, result.error_kind = f"使用 OpenSSL 检查证书失败: {e.stderr}", ERROR_NETWORK
+    except Exception as e:
+        result.error, result.error_kind = f"检查证书时发生未知错误: {e}", ERROR_CERT
+
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+def probe_expiry(domain: str, port: int = DEFAULT_PORT, timeout: float = DEFAULT_HOST_TIMEOUT,
+                 mode: str = PROBE_MODE_NATIVE, server_name: Optional[str] = None) -> ProbeResult:
+    """
+    按指定方式探测域名的证书。
+
+    :param mode: 'native' (默认) 或 'openssl'。
+    :param server_name: 握手时发送的 SNI 名称，默认与 domain 相同。
+    """
+    if mode == PROBE_MODE_OPENSSL:
+        return probe_expiry_openssl(domain, port, timeout, server_name)
+    return probe_certificate(domain, port, server_name=server_name, timeout=timeout)
+
+
+def probe_with_retries(domain: str, port: int = DEFAULT_PORT, timeout: float = DEFAULT_HOST_TIMEOUT,
+                       mode: str = PROBE_MODE_NATIVE, retries: int = DEFAULT_RETRIES,
+                       server_name: Optional[str] = None) -> ProbeResult:
+    """
+    探测域名的证书，临时性失败 (TRANSIENT_ERRORS) 后按退避间隔重试。
+
+    :param retries: 最大重试次数。
+    :param server_name: 握手时发送的 SNI 名称，默认与 domain 相同。
+    :return: 最后一次探测的 ProbeResult，elapsed 为包括重试在内的总耗时。
+    """
+    started = time.monotonic()
+    for attempt in range(retries + 1):
+        result = probe_expiry(domain, port, timeout, mode, server_name)
+        result.attempts = attempt + 1
+        if result.ok or result.error_kind not in TRANSIENT_ERRORS or attempt == retries:
+            break
+        delay = RETRY_BACKOFF * 2 ** attempt
+        logging.info(f"探测域名 '{domain}' 失败 ({result.error_kind}，第 {attempt + 1} 次): {result.error}，"
+                     f"{delay} 秒后重试。")
+        time.sleep(delay)
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+class ProbeCache:
+    """
+    按域名缓存最近的探测结果。
+    失败结果同样缓存 (时间较短)，短时间内反复检查同一个无法访问的主机时不会重复等待超时。
+
+    :param ttl: 成功结果的缓存时间(秒)，0 表示不缓存。
+    :param negative_ttl: 失败结果的缓存时间(秒)。
+    """
+
+    def __init__(self, ttl: float = DEFAULT_CACHE_TTL, negative_ttl: float = DEFAULT_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, domain: str) -> Optional[ProbeResult]:
+        with self._lock:
+            entry = self._entries.get(domain)
+            if entry is None:
+                return None
+            result, expires = entry
+            if time.monotonic() >= expires:
+                del self._entries[domain]
+                return None
+            return result
+
+    def put(self, result: ProbeResult):
+        ttl = self.ttl if result.ok else min(self.ttl, self.negative_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[result.domain] = (result, time.monotonic() + ttl)
+
+    def invalidate(self, domain: str):
+        """证书更新后丢弃旧的探测结果"""
+        with self._lock:
+            self._entries.pop(domain, None)
+
+
+def probe_domains(domains: Iterable[str],
+                  port: int = DEFAULT_PORT,
+                  max_workers: int = DEFAULT_CONCURRENCY,
+                  host_timeout: float = DEFAULT_HOST_TIMEOUT,
+                  overall_timeout: float = DEFAULT_OVERALL_TIMEOUT,
+                  mode: str = PROBE_MODE_NATIVE,
+                  retries: int = 0) -> Dict[str, ProbeResult]:
+    """
+    并发探测一批域名的证书过期时间。
+    整批耗时约等于最慢的那台主机，而不是所有主机耗时之和。
+
+    :param domains: 要探测的域名列表。
+    :param port: 目标端口。
+    :param max_workers: 最大并发数。
+    :param host_timeout: 单个主机的超时时间(秒)。
+    :param overall_timeout: 整批探测的总超时时间(秒)，超时未完成的域名会返回错误结果。
+    :param mode: 探测方式，'native' 或 'openssl'。
+    :param retries: 单个域名临时性失败后的最大重试次数 (仍受总时限约束)。
+    :return: {域名: ProbeResult}，顺序与输入一致。
+    """
+    # 去重但保持输入顺序
+    domains = list(dict.fromkeys(d for d in domains if d))
+    if not domains:
+        return {}
+
+    workers = max(1, min(max_workers, len(domains)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='cert-probe')
+    try:
+        futures = {executor.submit(probe_with_retries, domain, port, host_timeout, mode, retries): domain
+                   for domain in domains}
+        done, not_done = wait(futures, timeout=overall_timeout)
+
+        results = {}
+        for future, domain in futures.items():
+            if future in done:
+                results[domain] = future.result()
+            else:
+                future.cancel()
+                results[domain] = ProbeResult(domain=domain, error=f"整批探测超过总时限 {overall_timeout} 秒",
+                                              elapsed=overall_timeout, error_kind=ERROR_TIMEOUT)
+
+        if not_done:
+            logging.warning(f"有 {len(not_done)} 个域名未能在 {overall_timeout} 秒内完成探测。")
+        return {domain: results[domain] for domain in domains}
+    finally:
+        # 不等待仍在运行的探测，它们会受单主机超时约束自行结束
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,182 @@
+"""
+X.509 证书解析工具。
+只依赖标准库，直接解析 DER 编码，读取续签流程需要的字段
+(有效期、SAN、颁发者、SHA-256 指纹)，无需启动 openssl 进程。
+"""
+
+import hashlib
+import ssl
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+# 常用 OID (DER 编码后的内容部分)
+_OID_COMMON_NAME = bytes([0x55, 0x04, 0x03])
+_OID_ORGANIZATION = bytes([0x55, 0x04, 0x0A])
+_OID_COUNTRY = bytes([0x55, 0x04, 0x06])
+_OID_SUBJECT_ALT_NAME = bytes([0x55, 0x1D, 0x11])
+
+_ATTR_NAMES = {
+    _OID_COMMON_NAME: 'CN',
+    _OID_ORGANIZATION: 'O',
+    _OID_COUNTRY: 'C',
+}
+
+_PEM_BEGIN = '-----BEGIN CERTIFICATE-----'
+_PEM_END = '-----END CERTIFICATE-----'
+
+
+class CertParseError(ValueError):
+    """证书内容无法解析"""
+
+
+@dataclass
+class CertInfo:
+    """从证书中提取的关键信息"""
+    not_before: datetime
+    not_after: datetime
+    subject: str
+    issuer: str
+    san: List[str] = field(default_factory=list)
+    fingerprint_sha256: str = ''
+    # 原始 DER 编码的 subject / issuer，用于校验证书链是否衔接
+    subject_der: bytes = b''
+    issuer_der: bytes = b''
+
+
+def _read_tlv(data: bytes, offset: int) -> Tuple[int, bytes, int]:
+    """读取一个 DER TLV，返回 (tag, value, 下一个元素的偏移)"""
+    if offset + 2 > len(data):
+        raise CertParseError("DER 数据被截断")
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        num_bytes = length & 0x7F
+        if num_bytes == 0 or offset + num_bytes > len(data):
+            raise CertParseError("无效的 DER 长度")
+        length = int.from_bytes(data[offset:offset + num_bytes], 'big')
+        offset += num_bytes
+    end = offset + length
+    if end > len(data):
+        raise CertParseError("DER 数据被截断")
+    return tag, data[offset:end], end
+
+
+def _children(data: bytes) -> List[Tuple[int, bytes, bytes]]:
+    """拆分一个构造类型的内容，返回 [(tag, value, 完整 TLV 编码)]"""
+    items = []
+    offset = 0
+    while offset < len(data):
+        tag, value, end = _read_tlv(data, offset)
+        items.append((tag, value, data[offset:end]))
+        offset = end
+    return items
+
+
+def _parse_time(tag: int, value: bytes) -> datetime:
+    text = value.decode('ascii')
+    if tag == 0x17:    # UTCTime: YYMMDDHHMMSSZ
+        return datetime.strptime(text, '%y%m%d%H%M%SZ')
+    if tag == 0x18:    # GeneralizedTime: YYYYMMDDHHMMSSZ
+        return datetime.strptime(text, '%Y%m%d%H%M%SZ')
+    raise CertParseError(f"不支持的时间类型: {tag:#x}")
+
+
+def _format_name(name: bytes) -> str:
+    """将 Name 格式化为 'CN=..., O=..., C=...' 形式"""
+    parts = []
+    for _, rdn, _ in _children(name):
+        for _, attr, _ in _children(rdn):
+            attr_items = _children(attr)
+            if len(attr_items) != 2:
+                continue
+            oid, value = attr_items[0][1], attr_items[1][1]
+            label = _ATTR_NAMES.get(oid)
+            if label:
+                parts.append(f"{label}={value.decode('utf-8', 'replace')}")
+    return ', '.join(parts)
+
+
+def _parse_san(extensions: bytes) -> List[str]:
+    names = []
+    _, ext_seq, _ = _read_tlv(extensions, 0)
+    for _, ext, _ in _children(ext_seq):
+        ext_items = _children(ext)
+        if not ext_items or ext_items[0][1] != _OID_SUBJECT_ALT_NAME:
+            continue
+        # extnValue 是最后一个元素 (OCTET STRING)，中间可能有 critical 标志
+        _, general_names, _ = _read_tlv(ext_items[-1][1], 0)
+        for tag, value, _ in _children(general_names):
+            if tag == 0x82:    # dNSName
+                names.append(value.decode('ascii', 'replace'))
+    return names
+
+
+def parse_der_certificate(der: bytes) -> CertInfo:
+    """
+    解析 DER 编码的 X.509 证书。
+
+    :param der: DER 编码的证书。
+    :return: CertInfo
+    :raises CertParseError: 证书格式无效时抛出。
+    """
+    try:
+        _, cert, _ = _read_tlv(der, 0)
+        _, tbs, _ = _read_tlv(cert, 0)
+        fields = _children(tbs)
+        # 跳过可选的 [0] version 字段
+        if fields and fields[0][0] == 0xA0:
+            fields = fields[1:]
+        # serialNumber, signature, issuer, validity, subject, subjectPublicKeyInfo, ...
+        issuer_der = fields[2][2]
+        validity = _children(fields[3][1])
+        subject_der = fields[4][2]
+
+        san = []
+        for tag, value, _ in fields[6:]:
+            if tag == 0xA3:    # [3] extensions
+                san = _parse_san(value)
+
+        return CertInfo(
+            not_before=_parse_time(validity[0][0], validity[0][1]),
+            not_after=_parse_time(validity[1][0], validity[1][1]),
+            subject=_format_name(fields[4][1]),
+            issuer=_format_name(fields[2][1]),
+            san=san,
+            fingerprint_sha256=hashlib.sha256(der).hexdigest(),
+            subject_der=subject_der,
+            issuer_der=issuer_der,
+        )
+    except CertParseError:
+        raise
+    except (IndexError, ValueError, UnicodeDecodeError) as e:
+        raise CertParseError(f"无法解析证书: {e}") from e
+
+
+def split_pem_certificates(content: str) -> List[bytes]:
+    """将 PEM 文本中的所有证书依次转换为 DER"""
+    ders = []
+    start = content.find(_PEM_BEGIN)
+    while start != -1:
+        end = content.find(_PEM_END, start)
+        if end == -1:
+            break
+        end += len(_PEM_END)
+        ders.append(ssl.PEM_cert_to_DER_cert(content[start:end]))
+        start = content.find(_PEM_BEGIN, end)
+    return ders
+
+
+def load_pem_certificates(path: str) -> List[CertInfo]:
+    """读取 PEM 文件并解析其中的全部证书 (叶子证书在前)"""
+    with open(path, 'r') as f:
+        content = f.read()
+    return [parse_der_certificate(der) for der in split_pem_certificates(content)]
+
+
+def format_fingerprint(fingerprint: Optional[str]) -> str:
+    """以 AA:BB:CC 的形式展示指纹"""
+    if not fingerprint:
+        return ''
+    return ':'.join(fingerprint[i:i + 2] for i in range(0, len(fingerprint), 2)).upper()
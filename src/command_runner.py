@@ -0,0 +1,175 @@
+"""
+以流式方式执行外部命令 (acme.sh)。
+
+* 子进程的输出逐行读取并立即以 DEBUG 级别转发给日志
+* 识别 acme.sh 输出中的进度标记，转换为阶段事件 (INFO 级别) 并记录各阶段耗时，长时间等待 DNS 生效时也能看到进度
+* 只在环形缓冲区中保留最后 N 行用于错误报告，无论 acme.sh 输出多少内存占用都保持不变
+"""
+
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import metrics
+
+DEFAULT_TAIL_LINES = 50
+# 单行的最大读取长度，超出部分按下一行处理
+MAX_LINE_LENGTH = 8192
+
+# acme.sh 输出中的进度标记: (阶段, 正则)，按顺序匹配
+ACME_PHASES: Sequence[Tuple[str, re.Pattern]] = (
+    ('account', re.compile(r'Create account key|Registering account|Already registered|Registered')),
+    ('authorize', re.compile(r'Getting domain auth token|Getting webroot for domain|Already verified, skip')),
+    ('dns_add', re.compile(r'Adding txt value|The txt record is added')),
+    ('dns_wait', re.compile(r'Sleep \d+ seconds for the txt records to take effect|Checking .* for _acme-challenge')),
+    ('verify', re.compile(r'Verifying:|Pending, The CA is processing')),
+    ('dns_remove', re.compile(r'Removing DNS records|Removing txt')),
+    ('finalize', re.compile(r"Lets finalize the order|Let's finalize the order|Downloading cert")),
+    ('done', re.compile(r'Cert success|Installing (key|cert|CA|full chain) to|Reload success')),
+)
+
+
+@dataclass
+class PhaseEvent:
+    """命令进入一个新阶段"""
+    phase: str
+    line: str
+    # 上一阶段的名称和耗时(秒)
+    previous: Optional[str] = None
+    elapsed: float = 0.0
+
+
+@dataclass
+class CommandResult:
+    """流式执行的结果"""
+    returncode: Optional[int]
+    tail: List[str] = field(default_factory=list)
+    # 总输出行数，超出 tail 的部分已被丢弃
+    line_count: int = 0
+    timed_out: bool = False
+    phases: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0 and not self.timed_out
+
+    def output(self) -> str:
+        """用于错误报告的输出，被丢弃的行以一行说明代替"""
+        dropped = self.line_count - len(self.tail)
+        lines = ([f"... (省略了前 {dropped} 行输出)"] if dropped > 0 else []) + self.tail
+        return '\n'.join(lines)
+
+
+class PhaseTracker:
+    """根据输出行识别阶段变化，并记录上一阶段的耗时"""
+
+    def __init__(self, patterns: Sequence[Tuple[str, re.Pattern]], metric_prefix: str = ''):
+        self.patterns = patterns
+        self.metric_prefix = metric_prefix
+        self.current: Optional[str] = None
+        self.history: List[str] = []
+        self._since = time.monotonic()
+
+    def feed(self, line: str) -> Optional[PhaseEvent]:
+        for phase, pattern in self.patterns:
+            if pattern.search(line):
+                break
+        else:
+            return None
+        if phase == self.current:
+            return None
+        now = time.monotonic()
+        event = PhaseEvent(phase=phase, line=line, previous=self.current, elapsed=now - self._since)
+        self.close(now)
+        self.current, self._since = phase, now
+        self.history.append(phase)
+        return event
+
+    def close(self, now: Optional[float] = None):
+        """结束当前阶段，记录其耗时"""
+        if self.current and self.metric_prefix:
+            elapsed = (now or time.monotonic()) - self._since
+            metrics.observe_phase(f'{self.metric_prefix}{self.current}', elapsed)
+
+
+def _log_phase(event: PhaseEvent):
+    if event.previous:
+        logging.info(f"acme.sh 进入阶段 {event.phase} (阶段 {event.previous} 用时 {event.elapsed:.1f} 秒)")
+    else:
+        logging.info(f"acme.sh 进入阶段 {event.phase}")
+
+
+def run_streaming(command: Sequence[str], env: Optional[dict] = None, timeout: Optional[float] = None,
+                  tail_lines: int = DEFAULT_TAIL_LINES, log_prefix: str = '',
+                  phases: Sequence[Tuple[str, re.Pattern]] = ACME_PHASES, metric_prefix: str = 'acme_',
+                  on_phase: Optional[Callable[[PhaseEvent], None]] = _log_phase,
+                  on_line: Optional[Callable[[str, subprocess.Popen], None]] = None) -> CommandResult:
+    """
+    执行命令，逐行以 DEBUG 级别转发输出 (标准错误合并到标准输出)。
+
+    :param timeout: 超时秒数，超时后终止子进程；为 None 时不限制。
+    :param tail_lines: 保留用于错误报告的最后行数。
+    :param log_prefix: 转发到日志时每行的前缀。
+    :param phases: 阶段标记，为空时不识别阶段。
+    :param metric_prefix: 记录阶段耗时使用的 phase 标签前缀，为空时不记录。
+    :param on_phase: 阶段变化时的回调。
+    :param on_line: 每行输出的回调，参数为 (行内容, 子进程)。
+    :raises OSError: 命令无法启动时抛出。
+    """
+    started = time.monotonic()
+    tail = deque(maxlen=max(1, tail_lines))
+    tracker = PhaseTracker(phases, metric_prefix)
+    result = CommandResult(returncode=None)
+
+    # 子进程放在独立的进程组中，超时后连同 acme.sh 启动的 curl、dig 等一起终止，否则管道不会关闭
+    process = subprocess.Popen(command, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                               stdin=subprocess.DEVNULL, text=True, errors='replace', bufsize=1,
+                               start_new_session=True)
+
+    def kill():
+        result.timed_out = True
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+
+    watchdog = threading.Timer(timeout, kill) if timeout else None
+    if watchdog:
+        watchdog.daemon = True
+        watchdog.start()
+    try:
+        with process.stdout:
+            while True:
+                line = process.stdout.readline(MAX_LINE_LENGTH)
+                if not line:
+                    break
+                line = line.rstrip('\r\n')
+                result.line_count += 1
+                tail.append(line)
+                logging.debug(f"{log_prefix}{line}")
+                event = tracker.feed(line)
+                if event and on_phase:
+                    on_phase(event)
+                if on_line:
+                    on_line(line, process)
+        result.returncode = process.wait()
+    finally:
+        if watchdog:
+            watchdog.cancel()
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    tracker.close()
+    result.tail = list(tail)
+    result.phases = tracker.history
+    result.elapsed = time.monotonic() - started
+    return result
@@ -1,7 +1,122 @@
 import os
 import json
 import logging
-from typing import Optional, Any
+import threading
+import time
+from typing import Optional, Any, Dict, Tuple
+
+# 需要进行类型校验的配置项: {点分隔路径: (环境变量名, 类型)}
+CONFIG_SCHEMA: Dict[str, Tuple[str, type]] = {
+    'general.domain': ('DOMAIN', str),
+    'general.domains': ('DOMAINS', list),
+    'general.dns_api': ('DNS_API', str),
+    'general.acme_email': ('ACME_EMAIL', str),
+    'general.cert_output_path': ('CERT_OUTPUT_PATH', str),
+    'general.renew_days_before_expiry': ('RENEW_DAYS_BEFORE_EXPIRY', int),
+    'general.cert_check_interval_days': ('CERT_CHECK_INTERVAL_DAYS', int),
+    'general.probe_concurrency': ('PROBE_CONCURRENCY', int),
+    'general.probe_timeout': ('PROBE_TIMEOUT', float),
+    'general.probe_deadline': ('PROBE_DEADLINE', float),
+    'general.probe_mode': ('PROBE_MODE', str),
+    'general.probe_retries': ('PROBE_RETRIES', int),
+    'general.probe_cache_ttl': ('PROBE_CACHE_TTL', float),
+    'general.verify_deployed': ('VERIFY_DEPLOYED_CERT', bool),
+    'general.verify_endpoints': ('VERIFY_ENDPOINTS', list),
+    'general.san_batching': ('SAN_BATCHING', bool),
+    'general.max_sans': ('MAX_SANS', int),
+    'general.batch_window_days': ('BATCH_WINDOW_DAYS', int),
+    'general.dns_propagation_check': ('DNS_PROPAGATION_CHECK', bool),
+    'general.dns_propagation_timeout': ('DNS_PROPAGATION_TIMEOUT', int),
+    'general.order_budget': ('ORDER_BUDGET', bool),
+    'general.schedule_jitter': ('SCHEDULE_JITTER', int),
+    'general.schedule_workers': ('SCHEDULE_WORKERS', int),
+    'synology.auto_deploy': ('AUTO_DEPLOY_TO_SYNOLOGY', bool),
+    'synology.port': ('SYNO_PORT', int),
+    'synology.scheme': ('SYNO_SCHEME', str),
+    'synology.hostname': ('SYNO_HOSTNAME', str),
+    'synology.username': ('SYNO_USERNAME', str),
+    'synology.password': ('SYNO_PASSWORD', str),
+    'synology.certificate': ('SYNO_CERTIFICATE', str),
+    'synology.create': ('SYNO_CREATE', str),
+    'synology.verify_ssl': ('SYNO_VERIFY_SSL', bool),
+    'synology.deploy_mode': ('SYNO_DEPLOY_MODE', str),
+    'synology.deploy_concurrency': ('SYNO_DEPLOY_CONCURRENCY', int),
+    'synology.deploy_timeout': ('SYNO_DEPLOY_TIMEOUT', float),
+    'synology.deploy_retries': ('SYNO_DEPLOY_RETRIES', int),
+    'notifiers.digest_window': ('NOTIFY_DIGEST_WINDOW', int),
+    'metrics.textfile': ('METRICS_TEXTFILE', str),
+    'metrics.port': ('METRICS_PORT', int),
+    'status.port': ('STATUS_PORT', int),
+    'status.token': ('STATUS_TOKEN', str),
+}
+
+_TRUE_VALUES = ('true', 'yes', '1', 'on')
+_FALSE_VALUES = ('false', 'no', '0', 'off', '')
+
+# 两次检查配置文件是否变更之间的最小间隔(秒)
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+def _coerce(value: Any, value_type: type) -> Any:
+    """将配置值转换为 schema 中声明的类型，无法转换时抛出 ValueError"""
+    if value_type is bool:
+        if isinstance(value, bool):
+            return value
+        text = str(value).strip().lower()
+        if text in _TRUE_VALUES:
+            return True
+        if text in _FALSE_VALUES:
+            return False
+        raise ValueError(f"无法将 {value!r} 解析为布尔值")
+    if value_type is list:
+        # 环境变量中的列表以逗号或空白分隔
+        items = value if isinstance(value, list) else str(value).replace(',', ' ').split()
+        return [str(item).strip() for item in items if str(item).strip()]
+    if value_type in (int, float):
+        if isinstance(value, bool):
+            raise ValueError(f"无法将 {value!r} 解析为数字")
+        return value_type(str(value).strip())
+    return value if isinstance(value, str) else str(value)
+
+
+def _flatten(config: dict, prefix: str = '') -> Dict[str, Any]:
+    """构建点分隔路径索引，例如 {'general.domain': ...}"""
+    index = {}
+    for key, value in config.items():
+        path = f"{prefix}{key}"
+        index[path] = value
+        if isinstance(value, dict):
+            index.update(_flatten(value, f"{path}."))
+    return index
+
+
+class ConfigSnapshot:
+    """
+    某一时刻的配置快照，创建后不再修改。
+    预先构建好不区分大小写的环境变量索引、点分隔路径索引以及经过类型校验的值。
+    """
+
+    def __init__(self, config: dict, environ: Dict[str, str], file_key=None):
+        self.config = config
+        self.file_key = file_key
+        self.env = {k.upper(): v for k, v in environ.items()}
+        self.paths = _flatten(config)
+        self.typed: Dict[str, Any] = {}
+        self.errors = []
+
+        for key_path, (env_var, value_type) in CONFIG_SCHEMA.items():
+            env_value = self.env.get(env_var)
+            if env_value is not None:
+                source, raw = env_var, env_value
+            elif self.paths.get(key_path) is not None:
+                source, raw = key_path, self.paths[key_path]
+            else:
+                continue
+            try:
+                self.typed[key_path] = _coerce(raw, value_type)
+            except (TypeError, ValueError) as e:
+                self.errors.append(f"配置项 {source} 的值无效 (应为 {value_type.__name__}): {e}")
+
 
 class ConfigManager:
     _instance = None
@@ -15,20 +130,78 @@ class ConfigManager:
     def __init__(self, config_path='/config/config.json'):
         if self._initialized:
             return
-            
-        self.config = {}
+
+        self.config_path = config_path
+        self.version = 0
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._snapshot = self._build_snapshot(self._load_file(initial=True))
+        self._seen_file_key = self._snapshot.file_key
+        self._initialized = True
+
+    @property
+    def config(self) -> dict:
+        return self._snapshot.config
+
+    def _file_key(self):
         try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                self.config = json.load(f)
-            logging.info(f"成功从 {config_path} 加载配置文件。")
+            stat = os.stat(self.config_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def _load_file(self, initial=False):
+        """读取配置文件，返回 (配置字典, 文件标识)；解析失败时配置字典为 None"""
+        file_key = self._file_key()
+        try:
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            if isinstance(config, dict):
+                logging.info(f"成功从 {self.config_path} 加载配置文件。")
+                return config, file_key
+            logging.warning(f"配置文件 {self.config_path} 的顶层必须是 JSON 对象。")
         except FileNotFoundError:
-            logging.info(f"配置文件 {config_path} 未找到，将仅依赖环境变量。")
+            if initial:
+                logging.info(f"配置文件 {self.config_path} 未找到，将仅依赖环境变量。")
+            return {}, file_key
         except json.JSONDecodeError:
-            logging.warning(f"无法解析配置文件 {config_path}。请检查其格式。")
+            logging.warning(f"无法解析配置文件 {self.config_path}。请检查其格式。")
         except Exception as e:
-            logging.error(f"加载配置文件 {config_path} 时发生未知错误: {e}")
+            logging.error(f"加载配置文件 {self.config_path} 时发生未知错误: {e}")
+        return ({} if initial else None), file_key
 
-        self._initialized = True
+    def _build_snapshot(self, loaded) -> ConfigSnapshot:
+        config, file_key = loaded
+        snapshot = ConfigSnapshot(config or {}, os.environ, file_key)
+        for error in snapshot.errors:
+            logging.warning(f"{error}，将使用默认值。")
+        return snapshot
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        如果配置文件发生变化则重新加载，新快照构建完成后才原子地替换旧快照。
+        新的配置文件无法解析时保留旧配置。
+
+        :param force: 为 True 时无论文件是否变化都重新加载 (同时刷新环境变量索引)。
+        :return: 是否加载了新的配置。
+        """
+        with self._lock:
+            self._last_check = time.monotonic()
+            if not force and self._file_key() == self._seen_file_key:
+                return False
+            config, file_key = self._load_file()
+            # 记录文件标识，避免对同一个损坏的文件反复报错
+            self._seen_file_key = file_key
+            if config is None:
+                return False
+            self._snapshot = self._build_snapshot((config, file_key))
+            self.version += 1
+            logging.info("配置已重新加载。")
+            return True
+
+    def _maybe_reload(self):
+        if time.monotonic() - self._last_check >= RELOAD_CHECK_INTERVAL:
+            self.reload()
 
     def get(self, key_path: str, env_var: Optional[str] = None, default: Any = None) -> Any:
         """
@@ -40,11 +213,17 @@ class ConfigManager:
         :param default: 如果都找不到，则返回此默认值
         :return: 配置值
         """
+        self._maybe_reload()
+        snapshot = self._snapshot
+
+        # 0. schema 中声明过的配置项直接返回校验后的值
+        schema = CONFIG_SCHEMA.get(key_path)
+        if schema and (env_var is None or env_var.upper() == schema[0]):
+            return snapshot.typed.get(key_path, default)
+
         # 1. 检查环境变量(不区分大小写)
         if env_var:
-            # 创建一个不区分大小写的环境变量查找
-            env_vars_upper = {k.upper(): v for k, v in os.environ.items()}
-            env_value = env_vars_upper.get(env_var.upper())
+            env_value = snapshot.env.get(env_var.upper())
 
             if env_value is not None:
                 # 转换布尔值
@@ -56,18 +235,9 @@ class ConfigManager:
                 return env_value
 
         # 2. 如果环境变量未设置，则从文件配置中查找
-        temp_config = self.config
-        try:
-            keys = key_path.split('.')
-            for key in keys:
-                if isinstance(temp_config, dict):
-                    temp_config = temp_config.get(key)
-                else:
-                    return default
-            if temp_config is not None:
-                return temp_config
-        except (KeyError, TypeError):
-            pass
+        value = snapshot.paths.get(key_path)
+        if value is not None:
+            return value
 
         # 3. 如果都找不到，则返回默认值
         return default
@@ -76,4 +246,4 @@ class ConfigManager:
     def cert_check_interval_days(self) -> int:
         """获取证书检查间隔天数，默认为7天"""
         result = self.get('general.cert_check_interval_days', 'CERT_CHECK_INTERVAL_DAYS', 7)
-        return int(result) if result is not None else 7
\ No newline at end of file
+        return int(result) if result is not None else 7
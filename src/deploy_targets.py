@@ -0,0 +1,231 @@
+"""
+将证书并发部署到多个目标。
+
+synology.targets 中的每一项描述一台 NAS (或提供 DSM 证书接口的反向代理)，拥有独立的凭证和证书描述，
+未填写的字段沿用 synology 节中的同名配置。部署通过有界线程池并发执行，
+每个目标有独立的时限和重试次数，单个目标无法访问不会阻塞或影响其他目标。
+"""
+
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+import metrics
+
+DEFAULT_CONCURRENCY = 4        # 同时部署的最大目标数
+DEFAULT_TARGET_TIMEOUT = 120   # 单个目标的总时限(秒)，包括全部重试
+DEFAULT_RETRIES = 2            # 单个目标失败后的最大重试次数
+RETRY_BACKOFF = 2              # 第一次重试前等待的秒数，之后每次翻倍
+
+# 通过 acme.sh 部署钩子部署时无法得知 DSM 上的具体动作
+DEPLOY_HOOK = 'deployed'
+
+ACTION_TEXT = {
+    'skipped': '证书已是最新，跳过上传',
+    'updated': '已替换证书',
+    'created': '已新建证书',
+    DEPLOY_HOOK: '已通过 acme.sh 部署钩子部署',
+}
+
+# 目标未填写时从 synology 节继承的字段
+INHERITED_FIELDS = ('port', 'scheme', 'username', 'password', 'certificate', 'create', 'verify_ssl')
+
+
+@dataclass
+class DeployTarget:
+    """一个部署目标"""
+    name: str
+    hostname: str
+    port: str = '5001'
+    scheme: str = 'https'
+    username: str = ''
+    password: str = ''
+    certificate: str = ''
+    create: bool = True
+    verify_ssl: bool = True
+    # 只部署这些域名的证书，为空时部署全部域名
+    domains: List[str] = field(default_factory=list)
+
+    def handles(self, domain: str) -> bool:
+        return not self.domains or domain in self.domains
+
+    def description_for(self, domain: str, primary_domain: str) -> str:
+        """
+        主域名使用配置的证书描述；其他域名的描述带上域名 (未配置描述时就是域名本身)，
+        各域名在 DSM 上对应不同的证书，不会互相覆盖。
+        """
+        if domain == primary_domain:
+            return self.certificate
+        return f"{self.certificate} ({domain})" if self.certificate else domain
+
+
+@dataclass
+class TargetResult:
+    """单个目标的部署结果"""
+    target: str
+    success: bool = False
+    action: str = ''
+    error: str = ''
+    attempts: int = 0
+    elapsed: float = 0.0
+
+    def summary(self) -> str:
+        if self.success:
+            return f"{self.target}: {ACTION_TEXT.get(self.action, '部署成功')}"
+        return f"{self.target}: 失败 ({self.error})"
+
+
+def _as_bool(value, default: bool) -> bool:
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('true', 'yes', '1', 'on')
+
+
+def parse_targets(raw, defaults: Dict[str, object]) -> Tuple[List[DeployTarget], List[str]]:
+    """
+    解析 synology.targets 配置。
+
+    :param raw: 目标列表，或 SYNO_TARGETS 环境变量中的 JSON 字符串。
+    :param defaults: synology 节中的配置，目标未填写的字段 (INHERITED_FIELDS) 使用这里的值。
+    :return: (目标列表, 错误信息列表)
+    """
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw) if raw.strip() else []
+        except ValueError as e:
+            return [], [f"SYNO_TARGETS 不是有效的 JSON: {e}"]
+    if not raw:
+        return [], []
+    if not isinstance(raw, list):
+        return [], ["synology.targets 必须是列表"]
+
+    targets, errors, names = [], [], set()
+    for index, entry in enumerate(raw, 1):
+        if not isinstance(entry, dict):
+            errors.append(f"synology.targets 的第 {index} 项必须是 JSON 对象")
+            continue
+        values = {key: defaults[key] for key in INHERITED_FIELDS if defaults.get(key) not in (None, '')}
+        values.update({key: value for key, value in entry.items() if value not in (None, '')})
+
+        missing = [key for key in ('hostname', 'username', 'password') if not values.get(key)]
+        if missing:
+            errors.append(f"synology.targets 的第 {index} 项缺少 {', '.join(missing)}")
+            continue
+
+        port = str(values.get('port') or '5001')
+        name = str(values.get('name') or f"{values['hostname']}:{port}")
+        if name in names:
+            errors.append(f"synology.targets 中的目标名称重复: {name}")
+            continue
+        names.add(name)
+
+        domains = values.get('domains') or []
+        if isinstance(domains, str):
+            domains = domains.replace(',', ' ').split()
+        targets.append(DeployTarget(
+            name=name,
+            hostname=str(values['hostname']),
+            port=port,
+            scheme=str(values.get('scheme') or 'https'),
+            username=str(values['username']),
+            password=str(values['password']),
+            certificate=str(values.get('certificate') or ''),
+            create=_as_bool(values.get('create'), True),
+            verify_ssl=_as_bool(values.get('verify_ssl'), True),
+            domains=[str(d) for d in domains],
+        ))
+    return targets, errors
+
+
+def _deploy_with_retries(target: DeployTarget, deploy_one: Callable[[DeployTarget, float], str],
+                         timeout: float, retries: int, started: Dict[str, float]) -> TargetResult:
+    begin = time.monotonic()
+    started[target.name] = begin
+    deadline = begin + timeout
+    result = TargetResult(target=target.name)
+
+    for attempt in range(retries + 1):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            result.error = result.error or f"超过时限 {timeout} 秒"
+            break
+        result.attempts = attempt + 1
+        try:
+            result.action = deploy_one(target, remaining)
+            result.success, result.error = True, ''
+            break
+        except Exception as e:
+            result.error = str(e)
+            if not getattr(e, 'retryable', True) or attempt == retries:
+                break
+            delay = min(RETRY_BACKOFF * 2 ** attempt, max(0.0, deadline - time.monotonic()))
+            logging.warning(f"部署到 {target.name} 失败 (第 {attempt + 1} 次): {e}，{delay:.0f} 秒后重试。")
+            time.sleep(delay)
+
+    result.elapsed = time.monotonic() - begin
+    return result
+
+
+def deploy_to_targets(targets: List[DeployTarget], deploy_one: Callable[[DeployTarget, float], str],
+                      max_workers: int = DEFAULT_CONCURRENCY, timeout: float = DEFAULT_TARGET_TIMEOUT,
+                      retries: int = DEFAULT_RETRIES) -> List[TargetResult]:
+    """
+    并发地将证书部署到多个目标。
+
+    :param deploy_one: 部署到单个目标的函数，参数为 (目标, 剩余可用秒数)，返回部署动作；
+                       失败时抛出异常，异常的 retryable 属性为 False 时不再重试。
+    :param max_workers: 最大并发数。
+    :param timeout: 单个目标的总时限(秒)，从该目标开始部署时计算，包括全部重试。
+    :param retries: 单个目标失败后的最大重试次数。
+    :return: 与 targets 顺序一致的结果列表。
+    """
+    if not targets:
+        return []
+
+    started: Dict[str, float] = {}
+    results: Dict[str, TargetResult] = {}
+    workers = max(1, min(max_workers, len(targets)))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='syno-deploy')
+    try:
+        futures = {executor.submit(_deploy_with_retries, target, deploy_one, timeout, retries, started): target
+                   for target in targets}
+        pending = set(futures)
+        while pending:
+            # 等到有目标完成，或最早开始的目标超过时限
+            running = [started[futures[f].name] for f in pending if futures[f].name in started]
+            wait_for = max(0.0, min(running) + timeout - time.monotonic()) if running else timeout
+            done, pending = wait(pending, timeout=wait_for + 0.05, return_when=FIRST_COMPLETED)
+            for future in done:
+                results[futures[future].name] = future.result()
+
+            now = time.monotonic()
+            for future in list(pending):
+                begin = started.get(futures[future].name)
+                if begin is not None and now - begin >= timeout:
+                    # 不再等待该目标，它会受请求超时约束自行结束
+                    pending.discard(future)
+                    results[futures[future].name] = TargetResult(
+                        target=futures[future].name, error=f"超过时限 {timeout} 秒", attempts=1, elapsed=now - begin)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    ordered = [results[target.name] for target in targets]
+    for result in ordered:
+        metrics.DEPLOY_RESULTS.inc(target=result.target, outcome=result.action if result.success else 'failed')
+        if result.success:
+            logging.info(f"部署目标 {result.summary()} (耗时 {result.elapsed:.2f} 秒)")
+        else:
+            metrics.record_failure('deploy', result.error)
+            logging.error(f"部署目标 {result.summary()} (尝试 {result.attempts} 次)")
+    return ordered
+
+
+def summarize(results: List[TargetResult]) -> Tuple[bool, str]:
+    """返回 (是否全部成功, 失败目标的汇总信息)"""
+    failed = [result.summary() for result in results if not result.success]
+    return not failed, '\n'.join(failed)
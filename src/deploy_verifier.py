@@ -0,0 +1,150 @@
+"""
+部署后校验: 确认各个端点实际提供的是新签发的证书。
+
+证书部署到 DSM 后，反向代理、邮件服务器等其他主机上可能仍在提供旧证书。
+VERIFY_ENDPOINTS 中的每一项是一个 `主机:端口` 或 `主机:端口/SNI` 端点，
+续签完成后并发探测与新证书域名匹配的端点，逐个比较证书指纹；
+仍在提供旧证书的端点记录到状态数据库中，之后只对这些端点按较短的间隔重新检查。
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+from cert_probe import DEFAULT_HOST_TIMEOUT, PROBE_MODE_NATIVE, probe_with_retries
+
+DEFAULT_CONCURRENCY = 8        # 同时探测的最大端点数
+RECHECK_INTERVAL = 300         # 第一次重新检查前等待的秒数，之后每次翻倍
+MAX_RECHECK_INTERVAL = 3600    # 两次重新检查之间的最长间隔(秒)
+MAX_RECHECKS = 8               # 端点一直未更新时最多重新检查的次数
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """一个提供证书的端点"""
+    host: str
+    port: int = 443
+    server_name: Optional[str] = None
+
+    @property
+    def sni(self) -> str:
+        return self.server_name or self.host
+
+    @property
+    def label(self) -> str:
+        text = f"{self.host}:{self.port}"
+        return f"{text}/{self.server_name}" if self.server_name else text
+
+
+@dataclass
+class EndpointResult:
+    """一个端点的校验结果"""
+    endpoint: Endpoint
+    fingerprint: Optional[str] = None
+    error: Optional[str] = None
+
+    def is_current(self, fingerprint: str) -> bool:
+        return self.error is None and self.fingerprint == fingerprint
+
+
+def parse_endpoint(text: str) -> Endpoint:
+    """
+    解析 `主机[:端口][/SNI]`，IPv6 地址需要写成 `[::1]:443`。
+
+    :raises ValueError: 格式无效时抛出。
+    """
+    address, _, server_name = text.strip().partition('/')
+    if address.startswith('['):
+        host, _, rest = address[1:].partition(']')
+        port = rest[1:] if rest.startswith(':') else ''
+    else:
+        host, _, port = address.rpartition(':') if ':' in address else (address, '', '')
+    if not host:
+        raise ValueError(f"端点 '{text}' 缺少主机名")
+    try:
+        port = int(port) if port else 443
+    except ValueError:
+        raise ValueError(f"端点 '{text}' 的端口无效") from None
+    if not 0 < port < 65536:
+        raise ValueError(f"端点 '{text}' 的端口无效")
+    return Endpoint(host=host.lower(), port=port, server_name=server_name.lower() or None)
+
+
+def parse_endpoints(values: Iterable[str]) -> Tuple[List[Endpoint], List[str]]:
+    """
+    :return: (有效的端点, 错误信息列表)
+    """
+    endpoints, errors = [], []
+    for value in values:
+        try:
+            endpoint = parse_endpoint(str(value))
+        except ValueError as e:
+            errors.append(str(e))
+            continue
+        if endpoint not in endpoints:
+            endpoints.append(endpoint)
+    return endpoints, errors
+
+
+def name_matches(name: str, pattern: str) -> bool:
+    """证书中的域名 (可以是 *.example.com 形式的通配符) 是否覆盖 name"""
+    name, pattern = name.lower().rstrip('.'), pattern.lower().rstrip('.')
+    if pattern.startswith('*.'):
+        head, _, tail = name.partition('.')
+        return bool(head) and tail == pattern[2:]
+    return name == pattern
+
+
+def endpoints_for(endpoints: Iterable[Endpoint], names: Iterable[str]) -> List[Endpoint]:
+    """SNI 名称被证书中的域名覆盖的端点"""
+    names = list(names)
+    return [e for e in endpoints if any(name_matches(e.sni, pattern) for pattern in names)]
+
+
+def verify_endpoints(endpoints: List[Endpoint], timeout: float = DEFAULT_HOST_TIMEOUT,
+                     max_workers: int = DEFAULT_CONCURRENCY, retries: int = 0) -> List[EndpointResult]:
+    """并发探测端点，返回各端点当前提供的证书指纹，顺序与输入一致"""
+    if not endpoints:
+        return []
+
+    def probe(endpoint: Endpoint) -> EndpointResult:
+        result = probe_with_retries(endpoint.host, endpoint.port, timeout, PROBE_MODE_NATIVE, retries,
+                                    server_name=endpoint.sni)
+        return EndpointResult(endpoint=endpoint, fingerprint=result.fingerprint_sha256, error=result.error)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(endpoints))),
+                            thread_name_prefix='deploy-verify') as executor:
+        return list(executor.map(probe, endpoints))
+
+
+def recheck_delay(attempt: int) -> float:
+    """第 attempt 次 (从 0 开始) 重新检查前等待的秒数"""
+    return min(RECHECK_INTERVAL * 2 ** attempt, MAX_RECHECK_INTERVAL)
+
+
+def summarize(results: List[EndpointResult], fingerprint: str) -> Tuple[List[Endpoint], str]:
+    """
+    :return: (仍未提供新证书的端点, 给通知使用的说明文字)
+    """
+    stale = [r.endpoint for r in results if not r.is_current(fingerprint)]
+    lines = []
+    for r in results:
+        if r.is_current(fingerprint):
+            lines.append(f"  • {r.endpoint.label}: ✅ 已更新")
+        elif r.error:
+            lines.append(f"  • {r.endpoint.label}: ❌ 无法检查 ({r.error})")
+        else:
+            lines.append(f"  • {r.endpoint.label}: ⚠️ 仍在提供旧证书 (SHA-256 {r.fingerprint[:16]}...)")
+    for r in results:
+        if not r.is_current(fingerprint):
+            logging.warning(f"端点 {r.endpoint.label} 尚未提供新证书: {r.error or '证书指纹不一致'}")
+    if results and not stale:
+        logging.info(f"全部 {len(results)} 个端点均已提供新证书。")
+    return stale, '\n'.join(lines)
+
+
+def next_recheck(attempt: int, now: Optional[float] = None) -> float:
+    """下一次重新检查的时间 (Unix 时间戳)"""
+    return (time.time() if now is None else now) + recheck_delay(attempt)
@@ -0,0 +1,211 @@
+"""
+最小化的 DNS 客户端 (RFC 1035)，只依赖标准库。
+
+用于直接向权威 DNS 服务器查询 TXT / NS / A 记录，判断 _acme-challenge 记录是否已经生效。
+使用 UDP 查询，响应被截断 (TC) 时改用 TCP 重新查询。
+"""
+
+import os
+import random
+import socket
+import struct
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+TYPE_A = 1
+TYPE_NS = 2
+TYPE_CNAME = 5
+TYPE_SOA = 6
+TYPE_TXT = 16
+TYPE_AAAA = 28
+CLASS_IN = 1
+
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+# DNS 服务器端口，测试时可以指向本地的 DNS 替身
+NAMESERVER_PORT = 53
+DEFAULT_TIMEOUT = 3.0
+RESOLV_CONF = '/etc/resolv.conf'
+
+
+class DNSError(Exception):
+    """DNS 查询失败 (超时、无法连接或响应无效)"""
+
+
+@dataclass
+class Record:
+    name: str
+    type: int
+    ttl: int
+    # A/AAAA: 地址；NS/CNAME: 目标名称；TXT: 拼接后的文本；其他类型: 原始数据
+    value: object
+
+
+@dataclass
+class Response:
+    rcode: int
+    authoritative: bool
+    truncated: bool
+    answers: List[Record] = field(default_factory=list)
+    authority: List[Record] = field(default_factory=list)
+    additional: List[Record] = field(default_factory=list)
+
+
+def _encode_name(name: str) -> bytes:
+    encoded = b''
+    for label in name.strip('.').split('.'):
+        if label:
+            data = label.encode('idna') if not label.isascii() else label.encode('ascii')
+            if len(data) > 63:
+                raise DNSError(f"域名标签过长: {label}")
+            encoded += bytes([len(data)]) + data
+    return encoded + b'\x00'
+
+
+def build_query(name: str, qtype: int, query_id: int, recursion: bool = True) -> bytes:
+    flags = 0x0100 if recursion else 0
+    return struct.pack('!HHHHHH', query_id, flags, 1, 0, 0, 0) + _encode_name(name) + struct.pack('!HH', qtype, CLASS_IN)
+
+
+def _read_name(data: bytes, offset: int) -> Tuple[str, int]:
+    """读取 (可能被压缩的) 域名，返回 (域名, 名称之后的偏移)"""
+    labels, end, jumps = [], None, 0
+    while True:
+        if offset >= len(data):
+            raise DNSError("DNS 响应被截断")
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            if offset + 1 >= len(data) or jumps > 32:
+                raise DNSError("无效的 DNS 名称压缩指针")
+            if end is None:
+                end = offset + 2
+            offset = ((length & 0x3F) << 8) | data[offset + 1]
+            jumps += 1
+            continue
+        offset += 1
+        if length == 0:
+            break
+        labels.append(data[offset:offset + length].decode('ascii', 'replace'))
+        offset += length
+    return '.'.join(labels).lower(), end if end is not None else offset
+
+
+def _parse_record(data: bytes, offset: int) -> Tuple[Record, int]:
+    name, offset = _read_name(data, offset)
+    if offset + 10 > len(data):
+        raise DNSError("DNS 响应被截断")
+    rtype, _, ttl, length = struct.unpack('!HHIH', data[offset:offset + 10])
+    offset += 10
+    rdata = data[offset:offset + length]
+    if len(rdata) != length:
+        raise DNSError("DNS 响应被截断")
+
+    if rtype == TYPE_A and length == 4:
+        value = socket.inet_ntop(socket.AF_INET, rdata)
+    elif rtype == TYPE_AAAA and length == 16:
+        value = socket.inet_ntop(socket.AF_INET6, rdata)
+    elif rtype in (TYPE_NS, TYPE_CNAME):
+        value, _ = _read_name(data, offset)
+    elif rtype == TYPE_TXT:
+        parts, position = [], 0
+        while position < length:
+            size = rdata[position]
+            parts.append(rdata[position + 1:position + 1 + size].decode('utf-8', 'replace'))
+            position += 1 + size
+        value = ''.join(parts)
+    else:
+        value = rdata
+    return Record(name, rtype, ttl, value), offset + length
+
+
+def parse_response(data: bytes, query_id: Optional[int] = None) -> Response:
+    if len(data) < 12:
+        raise DNSError("DNS 响应过短")
+    response_id, flags, qdcount, ancount, nscount, arcount = struct.unpack('!HHHHHH', data[:12])
+    if query_id is not None and response_id != query_id:
+        raise DNSError("DNS 响应 ID 不匹配")
+    response = Response(rcode=flags & 0x0F, authoritative=bool(flags & 0x0400), truncated=bool(flags & 0x0200))
+
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = _read_name(data, offset)
+        offset += 4
+    for section, count in ((response.answers, ancount), (response.authority, nscount),
+                           (response.additional, arcount)):
+        for _ in range(count):
+            record, offset = _parse_record(data, offset)
+            section.append(record)
+    return response
+
+
+def _query_udp(server: str, port: int, packet: bytes, query_id: int, timeout: float) -> Response:
+    family = socket.AF_INET6 if ':' in server else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((server, port))
+        sock.send(packet)
+        while True:
+            data = sock.recv(4096)
+            try:
+                return parse_response(data, query_id)
+            except DNSError:
+                # 忽略不匹配的响应，继续等待直到超时
+                continue
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise DNSError("TCP 连接被关闭")
+        data += chunk
+    return data
+
+
+def _query_tcp(server: str, port: int, packet: bytes, query_id: int, timeout: float) -> Response:
+    with socket.create_connection((server, port), timeout=timeout) as sock:
+        sock.sendall(struct.pack('!H', len(packet)) + packet)
+        length, = struct.unpack('!H', _recv_exact(sock, 2))
+        return parse_response(_recv_exact(sock, length), query_id)
+
+
+def query(server: str, name: str, qtype: int, timeout: float = DEFAULT_TIMEOUT, port: Optional[int] = None,
+          recursion: bool = True) -> Response:
+    """
+    向指定的 DNS 服务器发送一次查询。
+
+    :param server: DNS 服务器的 IP 地址。
+    :param recursion: 是否请求递归查询 (向权威服务器查询时应为 False)。
+    :raises DNSError: 超时、无法连接或响应无效时抛出。
+    """
+    port = port or NAMESERVER_PORT
+    query_id = random.randint(0, 0xFFFF)
+    packet = build_query(name, qtype, query_id, recursion)
+    try:
+        response = _query_udp(server, port, packet, query_id, timeout)
+        if response.truncated:
+            response = _query_tcp(server, port, packet, query_id, timeout)
+        return response
+    except socket.timeout:
+        raise DNSError(f"查询 {server} 超时 ({name})")
+    except OSError as e:
+        raise DNSError(f"无法查询 {server}: {e}")
+
+
+def system_resolvers(path: str = RESOLV_CONF) -> List[str]:
+    """读取 /etc/resolv.conf 中的 DNS 服务器，DNS_RESOLVER 环境变量 (逗号分隔) 优先"""
+    configured = os.environ.get('DNS_RESOLVER', '')
+    if configured.strip():
+        return [s.strip() for s in configured.split(',') if s.strip()]
+    servers = []
+    try:
+        with open(path) as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2 and parts[0] == 'nameserver':
+                    servers.append(parts[1].split('%')[0])
+    except OSError:
+        pass
+    return servers or ['8.8.8.8']
@@ -0,0 +1,243 @@
+"""
+DNS-01 验证记录的生效检查。
+
+acme.sh 添加 _acme-challenge TXT 记录后会固定等待 --dnssleep 秒才让 CA 开始验证。
+这里直接向该区域的全部权威 DNS 服务器查询 TXT 记录 (按退避间隔轮询)，
+所有服务器都返回了记录后立即结束 acme.sh 的等待，签发耗时从固定上限降为实际的生效时间。
+检查失败或超时时 acme.sh 仍按 --dnssleep 等待，行为与原来相同。
+"""
+
+import logging
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import dns_client
+from dns_client import DNSError, TYPE_A, TYPE_CNAME, TYPE_NS, TYPE_TXT
+
+DEFAULT_TIMEOUT = 180          # 等待记录生效的最长时间(秒)，同时作为 acme.sh 的 --dnssleep
+INITIAL_INTERVAL = 2           # 第一次重新检查前等待的秒数，之后每次翻倍
+MAX_INTERVAL = 20              # 两次检查之间的最长间隔(秒)
+MAX_QUERY_WORKERS = 16         # 同时进行的 DNS 查询数
+MAX_CNAME_HOPS = 8
+
+# acme.sh 输出中的标记
+ADD_PATTERN = re.compile(r'Adding txt value: (\S+) for domain:\s*(\S+)')
+SLEEP_PATTERN = re.compile(r'Sleep (\d+) seconds for the txt records to take effect')
+
+
+class PropagationChecker:
+    """向权威 DNS 服务器轮询 TXT 记录，权威服务器的查找结果在实例内缓存"""
+
+    def __init__(self, resolvers: Optional[List[str]] = None, query_timeout: float = dns_client.DEFAULT_TIMEOUT):
+        self.resolvers = resolvers or dns_client.system_resolvers()
+        self.query_timeout = query_timeout
+        # {记录名: (CNAME 解析后的记录名, 权威服务器 IP 列表)}
+        self._servers: Dict[str, Tuple[str, List[str]]] = {}
+        self._lock = threading.Lock()
+
+    def _ask(self, name: str, qtype: int) -> dns_client.Response:
+        """依次向递归 DNS 服务器查询，返回第一个有效响应"""
+        error = None
+        for resolver in self.resolvers:
+            try:
+                return dns_client.query(resolver, name, qtype, timeout=self.query_timeout)
+            except DNSError as e:
+                error = e
+        raise error or DNSError("没有可用的 DNS 服务器")
+
+    def _follow_cname(self, name: str) -> str:
+        """_acme-challenge 记录可能通过 CNAME 委托给其他区域 (例如 acme-dns)"""
+        for _ in range(MAX_CNAME_HOPS):
+            response = self._ask(name, TYPE_CNAME)
+            target = next((r.value for r in response.answers if r.type == TYPE_CNAME and r.name == name), None)
+            if not target:
+                return name
+            name = target
+        raise DNSError(f"{name} 的 CNAME 链过长")
+
+    def _addresses(self, host: str, response: dns_client.Response) -> List[str]:
+        glue = [r.value for r in response.additional if r.type == TYPE_A and r.name == host]
+        if glue:
+            return glue
+        answers = self._ask(host, TYPE_A).answers
+        return [r.value for r in answers if r.type == TYPE_A]
+
+    def find_nameservers(self, name: str) -> Tuple[str, List[str]]:
+        """
+        从记录名开始逐级向上查找 NS 记录。
+
+        :return: (区域名, 权威服务器 IP 列表)
+        :raises DNSError: 找不到权威服务器时抛出。
+        """
+        labels = name.strip('.').lower().split('.')
+        for index in range(len(labels) - 1):
+            zone = '.'.join(labels[index:])
+            response = self._ask(zone, TYPE_NS)
+            hosts = [r.value for r in response.answers if r.type == TYPE_NS and r.name == zone]
+            if hosts:
+                addresses = []
+                for host in hosts:
+                    try:
+                        addresses.extend(self._addresses(host, response))
+                    except DNSError as e:
+                        logging.debug(f"无法解析权威 DNS 服务器 {host}: {e}")
+                if not addresses:
+                    raise DNSError(f"无法解析区域 {zone} 的权威 DNS 服务器地址")
+                return zone, list(dict.fromkeys(addresses))
+        raise DNSError(f"找不到 {name} 的权威 DNS 服务器")
+
+    def servers_for(self, name: str) -> Tuple[str, List[str]]:
+        name = name.strip('.').lower()
+        with self._lock:
+            cached = self._servers.get(name)
+        if cached:
+            return cached
+        target = self._follow_cname(name)
+        zone, servers = self.find_nameservers(target)
+        logging.debug(f"{target} 的权威 DNS 服务器 (区域 {zone}): {', '.join(servers)}")
+        with self._lock:
+            self._servers[name] = (target, servers)
+        return target, servers
+
+    def missing_servers(self, name: str, values: Set[str]) -> List[str]:
+        """返回尚未返回全部 TXT 值的权威服务器"""
+        target, servers = self.servers_for(name)
+        missing = []
+        for server in servers:
+            try:
+                response = dns_client.query(server, target, TYPE_TXT, timeout=self.query_timeout, recursion=False)
+                found = {r.value for r in response.answers if r.type == TYPE_TXT}
+            except DNSError as e:
+                logging.debug(f"向 {server} 查询 {target} 失败: {e}")
+                found = set()
+            if not values <= found:
+                missing.append(server)
+        return missing
+
+    def wait(self, records: List[Tuple[str, str]], timeout: float = DEFAULT_TIMEOUT,
+             should_stop: Optional[Callable[[], bool]] = None) -> bool:
+        """
+        等待全部 TXT 记录在所有权威服务器上生效。
+
+        :param records: [(记录名, TXT 值)]。
+        :param should_stop: 返回 True 时放弃等待 (例如 acme.sh 已退出)。
+        :return: 是否在时限内全部生效。
+        """
+        pending: Dict[str, Set[str]] = {}
+        for name, value in records:
+            pending.setdefault(name.strip('.').lower(), set()).add(value)
+        deadline = time.monotonic() + timeout
+        interval = INITIAL_INTERVAL
+        logging.info(f"正在检查 {len(pending)} 个 TXT 记录是否已在权威 DNS 服务器上生效 (最长等待 {timeout:g} 秒)...")
+
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_QUERY_WORKERS, len(pending))),
+                                thread_name_prefix='dns-check') as executor:
+            while pending:
+                futures = {name: executor.submit(self.missing_servers, name, values)
+                           for name, values in pending.items()}
+                for name, future in futures.items():
+                    try:
+                        missing = future.result()
+                    except DNSError as e:
+                        logging.debug(f"检查 {name} 失败: {e}")
+                        continue
+                    if not missing:
+                        del pending[name]
+                if not pending:
+                    return True
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or (should_stop and should_stop()):
+                    return False
+                logging.info(f"还有 {len(pending)} 个 TXT 记录未在全部权威 DNS 服务器上生效，"
+                             f"{min(interval, remaining):.0f} 秒后重新检查。")
+                time.sleep(min(interval, remaining))
+                interval = min(interval * 2, MAX_INTERVAL)
+        return True
+
+
+def _sleep_processes(pgid: int) -> List[int]:
+    """进程组中正在运行的 sleep 进程 (通过 /proc 查找，其他平台返回空列表)"""
+    pids = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return pids
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 格式: pid (comm) state ppid pgrp ...
+        comm = stat[stat.find('(') + 1:stat.rfind(')')]
+        fields = stat[stat.rfind(')') + 2:].split()
+        if comm == 'sleep' and len(fields) > 2 and fields[2] == str(pgid):
+            pids.append(int(entry))
+    return pids
+
+
+def interrupt_sleep(pgid: int, attempts: int = 20) -> bool:
+    """结束进程组中的 sleep 进程，使 acme.sh 立即继续执行；找不到时返回 False"""
+    for _ in range(attempts):
+        pids = _sleep_processes(pgid)
+        if pids:
+            for pid in pids:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except OSError:
+                    pass
+            return True
+        time.sleep(0.1)
+    return False
+
+
+class AcmeDnsWaiter:
+    """
+    command_runner.run_streaming 的逐行回调，配合 acme.sh --dnssleep 使用。
+
+    收集 acme.sh 输出中添加的 TXT 记录；acme.sh 开始固定等待时在后台线程中检查权威服务器，
+    记录全部生效后结束 acme.sh 的 sleep 进程。
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, checker: Optional[PropagationChecker] = None):
+        self.timeout = timeout
+        self.checker = checker
+        self.records: List[Tuple[str, str]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    def __call__(self, line: str, process):
+        match = ADD_PATTERN.search(line)
+        if match:
+            self.records.append((match.group(2), match.group(1)))
+            return
+        if SLEEP_PATTERN.search(line) and self.records and self._thread is None:
+            records, self.records = self.records, []
+            self._thread = threading.Thread(target=self._wait, args=(records, process), name='dns-wait', daemon=True)
+            self._thread.start()
+
+    def _wait(self, records: List[Tuple[str, str]], process):
+        started = time.monotonic()
+        checker = self.checker or PropagationChecker()
+        try:
+            propagated = checker.wait(records, self.timeout, should_stop=lambda: process.poll() is not None)
+        except Exception as e:
+            logging.warning(f"检查 TXT 记录是否生效时出错，acme.sh 将按固定时间等待: {e}")
+            return
+        if process.poll() is not None:
+            return
+        if not propagated:
+            logging.warning(f"未能在 {self.timeout} 秒内确认 TXT 记录生效，acme.sh 将按固定时间等待。")
+            return
+        if interrupt_sleep(process.pid):
+            logging.info(f"全部 {len(records)} 条 TXT 记录已在权威 DNS 服务器上生效 (用时 {time.monotonic() - started:.1f} 秒)，"
+                         f"提前结束 acme.sh 的等待。")
+        else:
+            logging.info("TXT 记录已生效，但未找到 acme.sh 的等待进程，acme.sh 将按固定时间等待。")
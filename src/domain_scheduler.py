@@ -0,0 +1,85 @@
+"""
+按域名的调度表。
+
+每个域名一个条目，到期时间为该域名的下次检查时间 (证书过期时间减去续签窗口，或失败后的重试时间)。
+条目保存在状态数据库的 domains 表中，next_due 列上的 B 树索引就是优先队列:
+取出最早的条目和更新条目都是 O(log n)，多个进程 (例如手动运行 main.py) 看到的是同一张表。
+每个域名的到期时间加上由域名计算出的固定抖动，大量域名在同一天签发的证书也会错开续签，
+CA、DNS API 和 DSM 收到的请求是平滑的而不是集中在同一时刻。
+
+条目被取出时先租约到 LEASE_SECONDS 之后，开始处理每个域名前再续租 LEASE_SECONDS，
+一个任务依次处理多个域名时，排在后面的域名不会因为前面的域名耗时过长而租约到期、被再次取出；
+任务完成时写入真正的下次检查时间，进程在任务中途退出时，租约到期后会重新检查该域名。
+"""
+
+import hashlib
+import time
+from typing import Dict, Iterable, List, Optional
+
+from state_store import StateStore
+
+# 抖动的最大秒数
+DEFAULT_JITTER = 3600
+# 抖动不超过距离到期时间的这个比例，失败后短时间内的重试不会被推迟太久
+JITTER_FRACTION = 0.1
+# 条目被取出或开始处理时的租约秒数，远大于单个域名的签发、部署和校验时间
+LEASE_SECONDS = 3600
+
+
+def jitter_fraction(domain: str) -> float:
+    """由域名计算出的 [0, 1) 之间的固定值，同一个域名每次得到相同的抖动"""
+    digest = hashlib.sha256(domain.lower().encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class DomainScheduler:
+    """
+    :param store: 状态数据库。
+    :param jitter: 抖动的最大秒数，0 表示不加抖动。
+    """
+
+    def __init__(self, store: StateStore, jitter: float = DEFAULT_JITTER):
+        self.store = store
+        self.jitter = jitter
+
+    def jitter_for(self, domain: str, delay: float) -> float:
+        spread = min(self.jitter, max(0.0, delay) * JITTER_FRACTION)
+        return spread * jitter_fraction(domain)
+
+    def update(self, entries: Dict[str, float], now: Optional[float] = None):
+        """
+        设置域名的下次检查时间 (Unix 时间戳)，实际到期时间会加上该域名的抖动。
+
+        :param entries: {域名: 下次检查时间}。
+        """
+        now = time.time() if now is None else now
+        if entries:
+            self.store.set_due({domain: when + self.jitter_for(domain, when - now)
+                                for domain, when in entries.items()})
+
+    def sync(self, domains: Iterable[str], now: Optional[float] = None) -> List[str]:
+        """
+        让调度表与配置中的域名一致: 新增的域名立即到期，已删除的域名移出调度表。
+
+        :return: 新增的域名。
+        """
+        return self.store.sync_domains(domains, time.time() if now is None else now)
+
+    def next_due(self) -> Optional[float]:
+        return self.store.next_due()
+
+    def pop_due(self, now: Optional[float] = None, horizon: float = 0.0) -> List[str]:
+        """
+        取出已到期的域名，并将它们租约到 LEASE_SECONDS 之后。
+
+        :param horizon: 有域名到期时，把之后 horizon 秒内到期的域名一起取出 (用于 SAN 批量签发)。
+        """
+        return self.store.take_due(time.time() if now is None else now, horizon, LEASE_SECONDS)
+
+    def renew_lease(self, domains: Iterable[str], now: Optional[float] = None):
+        """开始处理域名前续租，租约延长到 LEASE_SECONDS 之后"""
+        now = time.time() if now is None else now
+        self.store.extend_lease(domains, now + LEASE_SECONDS, now)
+
+    def __len__(self) -> int:
+        return self.store.count_domains()
@@ -0,0 +1,155 @@
+"""
+文件变更监听模块。
+在 Linux 上通过 inotify (ctypes 调用 libc) 监听文件变更，空闲时不产生任何唤醒；
+inotify 不可用时退化为定期比较文件的 mtime 和大小。
+"""
+
+import ctypes
+import logging
+import os
+import select
+import struct
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# inotify 事件掩码 (见 <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct('iIII')
+
+DEFAULT_POLL_INTERVAL = 60  # 退化为轮询时的检查间隔(秒)
+
+
+def _load_inotify():
+    """加载 libc 中的 inotify 函数，不支持时返回 None"""
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """
+    监听一组文件，文件被写入、替换或删除时调用回调函数。
+    监听的是文件所在目录，因此临时文件 + rename 的原子写入同样能被捕获。
+    """
+
+    def __init__(self, paths: Iterable[str], callback: Callable[[str], None],
+                 poll_interval: float = DEFAULT_POLL_INTERVAL):
+        self.paths = [os.path.abspath(p) for p in paths]
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread: Optional[threading.Thread] = None
+        self._inotify_fd = -1
+        # {watch descriptor: (目录, {文件名})}
+        self._watches: Dict[int, Tuple[str, set]] = {}
+
+    @property
+    def using_inotify(self) -> bool:
+        return self._inotify_fd >= 0
+
+    def start(self):
+        self._setup_inotify()
+        target = self._run_inotify if self.using_inotify else self._run_polling
+        self._thread = threading.Thread(target=target, name='file-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        os.write(self._stop_w, b'x')
+        if self._thread:
+            self._thread.join(timeout=5)
+        if self._inotify_fd >= 0:
+            os.close(self._inotify_fd)
+            self._inotify_fd = -1
+
+    def _setup_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            logging.info("当前系统不支持 inotify，将定期检查文件变更。")
+            return
+        fd = libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if fd < 0:
+            logging.info(f"inotify 初始化失败 (errno {ctypes.get_errno()})，将定期检查文件变更。")
+            return
+
+        by_dir: Dict[str, set] = {}
+        for path in self.paths:
+            by_dir.setdefault(os.path.dirname(path), set()).add(os.path.basename(path))
+        for directory, names in by_dir.items():
+            if not os.path.isdir(directory):
+                logging.debug(f"目录 {directory} 不存在，不监听其中的文件。")
+                continue
+            wd = libc.inotify_add_watch(fd, directory.encode(), _WATCH_MASK)
+            if wd < 0:
+                logging.warning(f"无法监听目录 {directory} (errno {ctypes.get_errno()})。")
+                continue
+            self._watches[wd] = (directory, names)
+        self._inotify_fd = fd
+
+    def _run_inotify(self):
+        while True:
+            readable, _, _ = select.select([self._inotify_fd, self._stop_r], [], [])
+            if self._stop_r in readable:
+                return
+            try:
+                data = os.read(self._inotify_fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError:
+                return
+            for path in self._parse_events(data):
+                self._notify(path)
+
+    def _parse_events(self, data: bytes) -> List[str]:
+        changed = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, _mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            watch = self._watches.get(wd)
+            if watch and name in watch[1]:
+                path = os.path.join(watch[0], name)
+                if path not in changed:
+                    changed.append(path)
+        return changed
+
+    def _snapshot(self) -> Dict[str, Optional[Tuple[int, int]]]:
+        snapshot = {}
+        for path in self.paths:
+            try:
+                stat = os.stat(path)
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                snapshot[path] = None
+        return snapshot
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        while True:
+            readable, _, _ = select.select([self._stop_r], [], [], self.poll_interval)
+            if readable:
+                return
+            current = self._snapshot()
+            for path in self.paths:
+                if current[path] != previous[path]:
+                    self._notify(path)
+            previous = current
+
+    def _notify(self, path: str):
+        try:
+            self.callback(path)
+        except Exception as e:
+            logging.error(f"处理文件变更 {path} 时发生异常: {e}")
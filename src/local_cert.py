@@ -0,0 +1,100 @@
+"""
+本地证书文件读取模块。
+优先从已安装的证书文件 (CERT_OUTPUT_PATH) 或 acme.sh 证书库中读取有效期，
+只有找不到本地文件时才需要进行网络探测。
+
+解析结果按 (路径, mtime, 文件大小) 缓存，文件未变化时不会被重复解析。
+"""
+
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from cert_probe import ProbeResult
+from cert_utils import CertInfo, CertParseError, load_pem_certificates
+
+ACME_HOME = os.environ.get('ACME_HOME', '/root/.acme.sh')
+
+# {路径: ((mtime_ns, size), 叶子证书信息)}
+_parse_cache: Dict[str, Tuple[Tuple[int, int], Optional[CertInfo]]] = {}
+_cache_lock = threading.Lock()
+
+
+def read_cert_file(path: str) -> Optional[CertInfo]:
+    """
+    读取 PEM 证书文件中的叶子证书信息，结果按 mtime 和文件大小缓存。
+
+    :param path: 证书文件路径。
+    :return: CertInfo，文件不存在或无法解析时返回 None。
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        cached = _parse_cache.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    info = None
+    try:
+        certs = load_pem_certificates(path)
+        if certs:
+            info = certs[0]
+        else:
+            logging.warning(f"本地证书文件 {path} 中没有找到证书。")
+    except (OSError, CertParseError, ValueError) as e:
+        logging.warning(f"解析本地证书文件 {path} 失败: {e}")
+
+    with _cache_lock:
+        _parse_cache[path] = (key, info)
+    return info
+
+
+def candidate_paths(domain: str, output_path: str) -> List[str]:
+    """按优先级列出某个域名可能的本地证书文件"""
+    return [
+        os.path.join(output_path, 'cert.pem'),
+        os.path.join(output_path, 'fullchain.pem'),
+        os.path.join(ACME_HOME, f'{domain}_ecc', f'{domain}.cer'),
+        os.path.join(ACME_HOME, f'{domain}_ecc', 'fullchain.cer'),
+        os.path.join(ACME_HOME, domain, f'{domain}.cer'),
+    ]
+
+
+def _covers_domain(info: CertInfo, domain: str) -> bool:
+    """证书的 SAN 是否包含该域名 (输出目录可能存放着其他域名的证书)"""
+    names = info.san or []
+    return domain in names or not names and f'CN={domain}' in info.subject
+
+
+def read_local_expiry(domain: str, output_path: str) -> Optional[ProbeResult]:
+    """
+    从本地证书文件读取域名证书的有效期。
+
+    :param domain: 域名。
+    :param output_path: 证书输出目录 (CERT_OUTPUT_PATH)。
+    :return: ProbeResult (source 为本地文件路径)，找不到匹配的本地证书时返回 None。
+    """
+    for path in candidate_paths(domain, output_path):
+        info = read_cert_file(path)
+        if info is None or not _covers_domain(info, domain):
+            continue
+        return ProbeResult(
+            domain=domain,
+            expiry_date=info.not_after,
+            san=info.san,
+            issuer=info.issuer,
+            fingerprint_sha256=info.fingerprint_sha256,
+            source=path,
+        )
+    return None
+
+
+def clear_cache():
+    """清空解析缓存"""
+    with _cache_lock:
+        _parse_cache.clear()
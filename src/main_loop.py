@@ -7,89 +7,118 @@
 
 import os
 import sys
-import time
-import subprocess
+import signal
+import threading
 import logging
-from datetime import datetime, timedelta
-import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import sqlite3
+from datetime import datetime, timedelta, timezone
 
 # 添加项目src目录到Python路径
 sys.path.append('/app/src')
 
 from config_manager import ConfigManager
+from file_watcher import FileWatcher
+import metrics
+from state_store import StateStore
+from status_server import StatusCache, StatusServer
 
-# 配置日志
+# 配置日志 (设置 DEBUG 环境变量时输出 acme.sh 的逐行输出等调试日志)
 logging.basicConfig(
-    level=logging.INFO,
+    level=logging.DEBUG if os.environ.get('DEBUG') else logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     stream=sys.stdout
 )
 
 logger = logging.getLogger(__name__)
 
-# 状态文件路径
-STATE_FILE_PATH = '/app/.scheduler_state'
-
 # 设置时区
 tz_offset_hours = int(os.environ.get('TZ_OFFSET_HOURS', '8'))  # 默认东八区(中国时区)
 local_tz_offset = timedelta(hours=tz_offset_hours)
 
+# 状态数据库路径 (调度器状态和按域名的调度表，由 main.run_sweep 更新)
+APP_STATE_DIR = os.environ.get('APP_STATE_DIR', '/app')
+STATE_DB_PATH = os.path.join(APP_STATE_DIR, 'state.db')
+# 第一次打开时导入旧版本的 .last_run / .scheduler_state
+state_store = StateStore(STATE_DB_PATH, legacy_dir=APP_STATE_DIR,
+                         legacy_utc_offset=local_tz_offset.total_seconds())
+# /healthz 和 /status 接口的数据来源
+status_cache = StatusCache()
+
 def get_local_time():
     """获取本地时间"""
     return datetime.utcnow() + local_tz_offset
 
 def load_scheduler_state():
     """加载调度器状态"""
-    if os.path.exists(STATE_FILE_PATH):
-        try:
-            with open(STATE_FILE_PATH, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.warning(f"无法加载调度器状态: {e}")
-    return {}
+    try:
+        next_run_time = state_store.get_meta('next_run_time')
+    except sqlite3.Error as e:
+        logger.warning(f"无法加载调度器状态: {e}")
+        return {}
+    return {'next_run_time': next_run_time} if next_run_time else {}
 
 def save_scheduler_state(state):
     """保存调度器状态"""
     try:
-        with open(STATE_FILE_PATH, 'w') as f:
-            json.dump(state, f)
-    except Exception as e:
+        for key, value in state.items():
+            state_store.set_meta(key, value)
+    except sqlite3.Error as e:
         logger.warning(f"无法保存调度器状态: {e}")
 
-def run_certificate_check():
-    """运行证书检查和更新任务"""
-    logger.info("开始执行证书检查与更新任务...")
-    
+def run_certificate_check(domains=None, concurrent=False):
+    """
+    在当前进程内运行证书检查和更新任务。
+    main 模块只在第一次调用时导入，配置、通知器会话和各类缓存在多次运行之间复用。
+
+    :param domains: 要检查的域名，默认为全部域名。
+    :param concurrent: 在工作线程中与其他检查并发运行，设置和摘要由主循环负责。
+    :return: main.SweepResult，发生异常时返回 None。
+    """
+    if domains:
+        logger.info(f"开始检查到期的域名: {', '.join(domains)}")
+    else:
+        logger.info("开始执行证书检查与更新任务...")
+
     try:
-        # 执行主程序
-        result = subprocess.run([
-            'python', '/app/src/main.py'
-        ], capture_output=True, text=True, timeout=300)  # 5分钟超时
-        
-        if result.returncode == 0:
-            logger.info("证书检查与更新任务执行成功")
-            logger.debug(f"输出: {result.stdout}")
+        import main as renewal
+        result = renewal.run_sweep(domains, concurrent=concurrent)
+        for r in result.results:
+            status_cache.record(r.domain, r.success, r.renewed, r.event, r.error,
+                                expiry=renewal._utc_timestamp(r.expiry_date),
+                                next_run=renewal._timestamp(r.next_run_time) if r.next_run_time else None,
+                                finished_at=renewal._timestamp(r.finished_at) if r.finished_at else None)
+
+        if result.success:
+            logger.info(f"证书检查与更新任务执行成功: {result.event}")
         else:
-            logger.error(f"证书检查与更新任务执行失败，返回码: {result.returncode}")
-            logger.error(f"错误输出: {result.stderr}")
-            
-        return result.returncode == 0
-    except subprocess.TimeoutExpired:
-        logger.error("证书检查与更新任务执行超时")
-        return False
+            logger.error(f"证书检查与更新任务执行失败: {result.event}")
+            if result.error:
+                logger.error(f"错误信息: {result.error}")
+
+        return result
     except Exception as e:
         logger.error(f"执行证书检查与更新任务时发生异常: {e}")
-        return False
+        return None
 
-def calculate_next_run_time():
-    """计算下次运行时间"""
+def calculate_next_run_time(last_result=None, include_state_file=False):
+    """
+    计算下次运行时间。
+    优先使用上一次任务返回的结果，只有没有结果或状态数据库发生变更时才读取状态数据库。
+    """
     config_manager = ConfigManager()
     interval_days = config_manager.cert_check_interval_days
     
     # 默认按配置间隔计算下次运行时间
     next_run = get_local_time() + timedelta(days=interval_days)
     
-    # 检查状态文件中是否有更精确的下次运行时间
+    if last_result is not None and last_result.next_run_time:
+        next_run = min(next_run, last_result.next_run_time)
+        if not include_state_file:
+            return next_run
+
+    # 检查状态数据库中是否有更精确的下次运行时间
     state = load_scheduler_state()
     if 'next_run_time' in state:
         try:
@@ -97,60 +126,200 @@ def calculate_next_run_time():
             # 取两个时间中较早的一个
             next_run = min(next_run, scheduled_next_run)
         except Exception as e:
-            logger.warning(f"无法解析状态文件中的下次运行时间: {e}")
+            logger.warning(f"无法解析状态数据库中的下次运行时间: {e}")
     
     return next_run
 
+# 调度器事件: 任意事件都会唤醒主循环，run_now 表示需要立即执行任务
+_wake_event = threading.Event()
+_run_now_event = threading.Event()
+_files_changed_event = threading.Event()
+
+# 任务执行后如果计算出的下次运行时间已过，至少等待这么久再重试
+MIN_RETRY_SECONDS = 60
+
+def request_run(reason=""):
+    """请求主循环立即执行一次证书检查任务 (可从信号处理函数或其他线程调用)"""
+    logger.info(f"收到立即执行请求{f' ({reason})' if reason else ''}")
+    _run_now_event.set()
+    _wake_event.set()
+
+def _handle_run_signal(signum, frame):
+    request_run(f"信号 {signal.Signals(signum).name}")
+
+def _handle_file_change(path):
+    logger.info(f"检测到文件变更: {path}")
+    config_manager = ConfigManager()
+    if path == os.path.abspath(config_manager.config_path):
+        config_manager.reload()
+    _files_changed_event.set()
+    _wake_event.set()
+
+def install_event_sources():
+    """注册信号处理函数并开始监听状态数据库和配置文件"""
+    for sig in (signal.SIGHUP, signal.SIGUSR1):
+        signal.signal(sig, _handle_run_signal)
+
+    # 其他进程 (例如手动运行的 main.py) 写入数据库后关闭文件时触发
+    watcher = FileWatcher([STATE_DB_PATH, STATE_DB_PATH + '-wal', ConfigManager().config_path], _handle_file_change)
+    watcher.start()
+    if watcher.using_inotify:
+        logger.info("已通过 inotify 监听状态数据库和配置文件的变更。")
+    return watcher
+
+def start_metrics_server():
+    """配置了 METRICS_PORT 时在后台提供 /metrics 接口"""
+    port = ConfigManager().get('metrics.port', 'METRICS_PORT', 0) or 0
+    if not port:
+        return None
+    try:
+        server = metrics.start_http_server(int(port))
+    except OSError as e:
+        logger.error(f"无法在端口 {port} 上启动指标接口: {e}")
+        return None
+    logger.info(f"指标接口已启动: http://0.0.0.0:{port}/metrics")
+    return server
+
+def start_status_server():
+    """配置了 STATUS_PORT 时在后台提供 /healthz、/status 和 POST /run 接口"""
+    port = ConfigManager().get('status.port', 'STATUS_PORT', 0) or 0
+    if not port:
+        return None
+    # POST /run 的 Bearer 令牌，未配置时只接受来自本机的 POST /run
+    token = str(ConfigManager().get('status.token', 'STATUS_TOKEN', '') or '')
+    try:
+        status_cache.load(state_store.domain_status())
+    except sqlite3.Error as e:
+        logger.warning(f"无法从状态数据库加载域名状态: {e}")
+    try:
+        server = StatusServer(status_cache, request_run, token=token).start(int(port))
+    except OSError as e:
+        logger.error(f"无法在端口 {port} 上启动状态接口: {e}")
+        return None
+    logger.info(f"状态接口已启动: http://0.0.0.0:{port}/healthz, /status, POST /run")
+    return server
+
+def publish_next_run(next_run_time):
+    """更新下次运行时间指标；配置了 METRICS_TEXTFILE 时同时写入文件"""
+    metrics.NEXT_RUN.set((next_run_time - local_tz_offset).replace(tzinfo=timezone.utc).timestamp())
+    textfile = ConfigManager().get('metrics.textfile', 'METRICS_TEXTFILE', '')
+    if textfile:
+        metrics.write_textfile(textfile)
+
+def _run_worker(domains):
+    """工作线程: 检查一组到期的域名"""
+    return run_certificate_check(domains, concurrent=True)
+
+def _wake_on_done(future):
+    """任务结束 (future 已标记完成) 后唤醒主循环，分配下一批并在全部结束时发送摘要"""
+    _wake_event.set()
+
+def dispatch_due(renewal, pool, running, workers):
+    """
+    取出已到期的域名，分配给空闲的工作线程。
+    启用 SAN 批量签发时，抖动范围内到期的域名一起取出并在同一个任务中规划批次；
+    否则平均分给空闲的工作线程。本进程中仍在处理的域名不会被再次分配。
+
+    :param running: {future: 任务中的域名}，新分配的任务会加入其中。
+    :return: 是否分配了任务。
+    """
+    free = workers - len(running)
+    if free <= 0:
+        return False
+    horizon = renewal.SCHEDULE_JITTER if renewal.SAN_BATCHING else 0
+    in_flight = set().union(*running.values())
+    due = [domain for domain in renewal.domain_schedule.pop_due(horizon=horizon) if domain not in in_flight]
+    if not due:
+        return False
+    parts = 1 if renewal.SAN_BATCHING else min(free, len(due))
+    for index in range(parts):
+        future = pool.submit(_run_worker, due[index::parts])
+        future.add_done_callback(_wake_on_done)
+        running[future] = due[index::parts]
+    return True
+
 def main():
-    """主循环函数"""
+    """
+    主循环函数。
+    首次启动时检查全部域名，之后按调度表中各域名的到期时间取出到期的域名，
+    由最多 SCHEDULE_WORKERS 个工作线程处理 (修改该设置后需要重启服务)。
+    """
     logger.info("=== 证书续签服务启动 ===")
-    
-    # 立即执行一次任务
+    install_event_sources()
+    start_metrics_server()
+    start_status_server()
+
+    # 立即执行一次任务，结果写入按域名的调度表
     logger.info("首次启动，立即执行证书检查任务")
     run_certificate_check()
-    
+
+    pool, workers, running = None, 0, {}
+    announced = None
+    # 分配过任务、尚未发送合并的成功通知
+    pending_digest = False
+    # 配置已变化，正在等待运行中的任务结束
+    deferred = False
     while True:
         try:
-            # 计算下次运行时间
-            next_run_time = calculate_next_run_time()
-            
-            # 计算睡眠时间
+            status_cache.busy()
+            # 先清除唤醒事件再检查任务状态: 之后结束的任务会再次唤醒主循环
+            _wake_event.clear()
+            import main as renewal
+            if pool is None:
+                workers = renewal.SCHEDULE_WORKERS
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='renewal')
+            running = {future: domains for future, domains in running.items() if not future.done()}
+            if pending_digest and not running:
+                # 分配出去的任务全部结束后发送一条合并的成功通知
+                pending_digest = False
+                renewal.flush_notifications()
+
+            if running and renewal.settings_changed():
+                # 工作线程读取的是同一份设置: 等运行中的任务结束后再加载新配置，期间不分配新任务
+                if not deferred:
+                    deferred = True
+                    logger.info(f"配置已变化，等待 {len(running)} 个运行中的任务结束后重新加载。")
+            else:
+                deferred = False
+                renewal.apply_settings()
+                if _run_now_event.is_set():
+                    _run_now_event.clear()
+                    # 立即执行: 全部域名立即到期，同样由工作线程处理
+                    renewal.domain_schedule.update({domain: time.time() for domain in renewal.DOMAINS})
+                added = renewal.sync_schedule()
+                if added:
+                    logger.info(f"新增域名，立即检查: {', '.join(added)}")
+                status_cache.retain(renewal.DOMAINS)
+                _files_changed_event.clear()
+                if dispatch_due(renewal, pool, running, workers):
+                    pending_digest = True
+
+            next_due = renewal.domain_schedule.next_due()
+            if next_due is None:
+                next_run_time = calculate_next_run_time()
+            else:
+                next_run_time = datetime.utcfromtimestamp(next_due) + local_tz_offset
+            publish_next_run(next_run_time)
+
             sleep_seconds = (next_run_time - get_local_time()).total_seconds()
-            
-            if sleep_seconds > 0:
+            if sleep_seconds <= 0:
+                # 有域名到期但工作线程已满，等待任意任务结束
+                sleep_seconds = MIN_RETRY_SECONDS
+            elif (next_run_time, len(running)) != announced:
+                announced = (next_run_time, len(running))
                 logger.info(f"下次运行时间: {next_run_time.strftime('%Y-%m-%d %H:%M:%S')} "
-                           f"(约 {sleep_seconds/3600:.1f} 小后)")
-                
-                # 分段睡眠，每分钟检查一次是否需要提前执行
-                while sleep_seconds > 0:
-                    # 每次最多睡眠60秒
-                    sleep_chunk = min(sleep_seconds, 60)
-                    time.sleep(sleep_chunk)
-                    sleep_seconds -= sleep_chunk
-                    
-                    # 重新检查下次运行时间，以防有变化
-                    new_next_run_time = calculate_next_run_time()
-                    if new_next_run_time < next_run_time:
-                        logger.info("检测到新的下次运行时间，更新计划")
-                        next_run_time = new_next_run_time
-                        break
-                
-                # 执行任务
-                run_certificate_check()
-            else:
-                # 如果计算出的时间已经过去，立即执行
-                logger.warning("计划的执行时间已过，立即执行任务")
-                run_certificate_check()
-                # 等待一段时间再继续循环
-                time.sleep(60)
-                
+                            f"(约 {sleep_seconds/3600:.1f} 小时后，{len(running)} 个任务运行中)")
+            status_cache.tick(time.time() + sleep_seconds, renewal._timestamp(next_run_time), len(running))
+            _wake_event.wait(timeout=sleep_seconds)
+
         except KeyboardInterrupt:
             logger.info("收到中断信号，正在退出...")
             break
         except Exception as e:
             logger.error(f"主循环中发生异常: {e}")
             # 发生异常时等待一段时间再继续
-            time.sleep(60)
+            status_cache.tick(time.time() + MIN_RETRY_SECONDS, None, len(running))
+            _wake_event.wait(timeout=MIN_RETRY_SECONDS)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,311 @@
+"""
+运行指标: 各阶段耗时、结果计数和证书到期时间。
+
+* span() / timed() 记录每个阶段的耗时，并对失败按原因分类计数
+* 指标以 Prometheus 文本格式导出，可写入 node-exporter 的 textfile 目录，
+  也可以由 main_loop 通过 /metrics HTTP 接口提供
+"""
+
+import bisect
+import functools
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 阶段耗时的直方图分桶(秒)，覆盖从读取本地文件到等待 DNS 生效的范围
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600)
+
+# 失败原因分类，按顺序匹配错误信息
+FAILURE_PATTERNS = (
+    ('rate_limit', re.compile(r'ratelimited|rate limit|too many (certificates|requests)|retry after', re.I)),
+    ('timeout', re.compile(r'timed? ?out|timeout|deadline', re.I)),
+    ('dns', re.compile(r'\bdns\b|nxdomain|servfail|txt record|_acme-challenge|name or service not known|'
+                       r'name resolution|getaddrinfo|nodename nor servname', re.I)),
+    ('auth', re.compile(r'authenticat|unauthori[sz]ed|forbidden|password|invalid credential|access_token', re.I)),
+    ('network', re.compile(r'connection (refused|reset|aborted)|network is unreachable|no route to host|'
+                           r'ssl|certificate verify failed', re.I)),
+)
+
+
+def classify_failure(message: str) -> str:
+    """根据错误信息判断失败原因: rate_limit / timeout / dns / auth / network / other"""
+    for reason, pattern in FAILURE_PATTERNS:
+        if pattern.search(message or ''):
+            return reason
+    return 'other'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(self._render_samples(items))
+        return '\n'.join(lines)
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def remove(self, **labels):
+        with self._lock:
+            self._values.pop(self._key(labels), None)
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # 最后一个位置统计超出最大分桶的观测值
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(bound)}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(self.label_names, key)} {cumulative}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+PHASE_DURATION = REGISTRY.register(Histogram(
+    'syno_cert_phase_duration_seconds', '续签流程各阶段的耗时', ['phase']))
+PHASE_FAILURES = REGISTRY.register(Counter(
+    'syno_cert_phase_failures_total', '各阶段按原因分类的失败次数', ['phase', 'reason']))
+DOMAIN_OUTCOMES = REGISTRY.register(Counter(
+    'syno_cert_domain_runs_total', '按结果统计的域名处理次数 (valid / renewed / failed)', ['outcome']))
+DEPLOY_RESULTS = REGISTRY.register(Counter(
+    'syno_cert_deploy_results_total', '按目标和结果统计的证书部署次数 (skipped / updated / created / failed)',
+    ['target', 'outcome']))
+EXPIRY_DAYS = REGISTRY.register(Gauge(
+    'syno_cert_expiry_days', '证书距离过期的天数', ['domain']))
+NEXT_RUN = REGISTRY.register(Gauge(
+    'syno_cert_next_run_timestamp_seconds', '下次计划运行时间 (Unix 时间戳)'))
+LAST_RUN = REGISTRY.register(Gauge(
+    'syno_cert_last_run_timestamp_seconds', '上一轮检查结束的时间 (Unix 时间戳)'))
+LAST_RUN_SUCCESS = REGISTRY.register(Gauge(
+    'syno_cert_last_run_success', '各域名最近一次处理是否全部成功 (1 / 0)'))
+
+
+def _failed(result) -> Optional[str]:
+    """
+    判断阶段函数的返回值是否表示失败，返回错误信息；成功时返回 None。
+    约定与 main.py 中的阶段函数一致: 返回 False，或返回 (False, 错误信息)。
+    """
+    if result is False:
+        return ''
+    if isinstance(result, tuple) and result and result[0] is False:
+        return str(result[1]) if len(result) > 1 else ''
+    return None
+
+
+# 当前线程中正在收集阶段耗时的列表 (见 record_phases)
+_collector = threading.local()
+
+
+@contextmanager
+def record_phases() -> Iterator[List[Tuple[str, float]]]:
+    """
+    收集当前线程中记录的阶段耗时，用于保存每次运行的阶段明细。
+
+    用法:
+        with metrics.record_phases() as phases:
+            ...
+        # phases: [(阶段, 秒数)]
+    """
+    phases: List[Tuple[str, float]] = []
+    previous = getattr(_collector, 'phases', None)
+    _collector.phases = phases
+    try:
+        yield phases
+    finally:
+        _collector.phases = previous
+
+
+def observe_phase(phase: str, elapsed: float):
+    """记录一个阶段的耗时"""
+    PHASE_DURATION.observe(elapsed, phase=phase)
+    phases = getattr(_collector, 'phases', None)
+    if phases is not None:
+        phases.append((phase, elapsed))
+
+
+@contextmanager
+def span(phase: str):
+    """
+    记录一个阶段的耗时；阶段内抛出异常时按异常信息分类计入失败次数。
+
+    用法:
+        with metrics.span('notify'):
+            ...
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_failure(phase, str(e))
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        observe_phase(phase, elapsed)
+        logging.debug(f"阶段 {phase} 耗时 {elapsed:.3f} 秒")
+
+
+def record_failure(phase: str, message: str = ''):
+    """按错误信息分类记录一次阶段失败"""
+    PHASE_FAILURES.inc(phase=phase, reason=classify_failure(message))
+
+
+def timed(phase: str, check_result: bool = True):
+    """
+    装饰器: 为阶段函数记录耗时，返回值表示失败时按错误信息分类计数。
+
+    :param check_result: 为 False 时不根据返回值判断失败 (返回值不符合 (成功, 错误信息) 约定的函数)。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(phase):
+                result = func(*args, **kwargs)
+            error = _failed(result) if check_result else None
+            if error is not None:
+                record_failure(phase, error)
+            return result
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """以 Prometheus 文本格式输出全部指标"""
+    return REGISTRY.render()
+
+
+def write_textfile(path: str) -> bool:
+    """
+    原子地写入 node-exporter textfile collector 使用的 .prom 文件。
+
+    :return: 是否写入成功。
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(render())
+        os.replace(tmp_path, path)
+        return True
+    except OSError as e:
+        logging.warning(f"写入指标文件 {path} 失败: {e}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
+
+
+def start_http_server(port: int, addr: str = '0.0.0.0'):
+    """在后台线程中提供 /metrics 接口 (http.server 只在启用时导入)"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((addr, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
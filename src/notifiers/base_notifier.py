@@ -5,13 +5,25 @@ class BaseNotifier(ABC):
     所有通知服务的抽象基类。
     每个具体的通知器都必须实现 'send' 方法。
     """
+    # 通知器名称，发件箱日志中用它来找到对应的通知器
+    name = "base"
+    # 单条消息的最大字节数，None 表示不限制
+    max_message_bytes = None
+    # 发送配额 (notifiers.quota.ChannelQuota)，None 表示不限制
+    quota = None
+
+    def is_configured(self) -> bool:
+        """通知器的必要参数是否已配置；未配置的通知器不会收到任何消息。"""
+        return True
+
     @abstractmethod
-    def send(self, status: str, domain: str, details: str = "") -> None:
+    def send(self, status: str, domain: str, details: str = "") -> bool:
         """
         发送通知的抽象方法。
 
         :param status: 操作状态 ('success' 或 'failure').
         :param domain: 操作涉及的域名。
         :param details: 关于结果的可选额外信息。
+        :return: 是否发送成功；返回 False 时发件箱会稍后重试。
         """
         pass
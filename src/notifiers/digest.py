@@ -0,0 +1,117 @@
+"""
+通知摘要 (digest) 模式。
+位于续签流程和 NotificationManager 之间：失败通知立即发送，成功通知先缓存，
+在一轮检查结束 (或时间窗口到期) 时合并成一条摘要发送，并按渠道的消息长度上限拆分。
+"""
+
+import logging
+import threading
+import time
+from typing import List, Optional
+
+
+def split_message(header: str, lines: List[str], max_bytes: Optional[int]) -> List[str]:
+    """
+    将多行内容拆分成若干条不超过 max_bytes 字节的消息，每条都带有标题。
+    多于一条时会在标题后标注序号，例如 '(1/3)'。
+    """
+    if not max_bytes:
+        return [header + '\n\n' + '\n'.join(lines)]
+
+    # 为序号预留空间
+    budget = max_bytes - len((header + ' (99/99)\n\n').encode('utf-8'))
+    chunks, current, size = [], [], 0
+    for line in lines:
+        encoded = line.encode('utf-8')
+        if len(encoded) > budget:
+            line = encoded[:budget - 3].decode('utf-8', 'ignore') + '...'
+            encoded = line.encode('utf-8')
+        line_size = len(encoded) + 1
+        if current and size + line_size > budget:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(line)
+        size += line_size
+    if current:
+        chunks.append(current)
+
+    if len(chunks) == 1:
+        return [header + '\n\n' + '\n'.join(chunks[0])]
+    return [f"{header} ({i}/{len(chunks)})\n\n" + '\n'.join(chunk) for i, chunk in enumerate(chunks, 1)]
+
+
+class NotificationDigest:
+    """
+    :param manager: NotificationManager 实例。
+    :param window_seconds: 成功通知的合并时间窗口；为 0 时每轮检查结束调用 flush 即发送。
+    """
+
+    def __init__(self, manager, window_seconds: float = 0):
+        self.manager = manager
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+        self._buffer = []          # [(domain, summary, details)]
+        self._first_added_at = None
+        self._timer: Optional[threading.Timer] = None
+
+    def dispatch(self, status: str, domain: str, details: str = "", summary: Optional[str] = None):
+        """
+        接收一条通知。失败通知立即发送，成功通知进入缓冲区。
+
+        :param summary: 合并到摘要中时使用的单行描述，默认取 details 的第一行。
+        """
+        if status != 'success':
+            self._send_now(status, domain, details)
+            return
+
+        if not summary:
+            summary = (details.strip().splitlines() or [domain])[0]
+        with self._lock:
+            self._buffer.append((domain, summary, details))
+            if self._first_added_at is None:
+                self._first_added_at = time.monotonic()
+                if self.window_seconds > 0:
+                    self._timer = threading.Timer(self.window_seconds, self.flush, kwargs={'force': True})
+                    self._timer.daemon = True
+                    self._timer.start()
+
+    def _send_now(self, status: str, domain: str, details: str):
+        """立即发送一条通知，超出渠道长度上限时按行拆分"""
+        max_bytes = self.manager.max_message_bytes
+        if not max_bytes or len(details.encode('utf-8')) <= max_bytes:
+            self.manager.dispatch(status, domain, details)
+            return
+        lines = details.splitlines()
+        for message in split_message(lines[0], lines[1:], max_bytes):
+            self.manager.dispatch(status, domain, message)
+
+    def flush(self, force: bool = False):
+        """
+        发送缓冲区中的成功通知。
+
+        :param force: 为 True 时忽略时间窗口立即发送 (例如进程退出前)。
+        """
+        with self._lock:
+            if not self._buffer:
+                return
+            if not force and self.window_seconds > 0 and \
+                    time.monotonic() - self._first_added_at < self.window_seconds:
+                return
+            items = self._buffer
+            self._buffer = []
+            self._first_added_at = None
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+        if len(items) == 1:
+            domain, _, details = items[0]
+            self._send_now('success', domain, details)
+            return
+
+        header = f"✅ 证书检查汇总: {len(items)} 个域名"
+        lines = [f"• {domain}: {summary}" for domain, summary, _ in items]
+        messages = split_message(header, lines, self.manager.max_message_bytes)
+        logging.info(f"将 {len(items)} 条成功通知合并为 {len(messages)} 条摘要消息。")
+        for message in messages:
+            self.manager.dispatch('success', f"{len(items)} 个域名", message)
@@ -0,0 +1,33 @@
+"""
+基于 fcntl.flock 的跨进程排他文件锁，供 token 缓存和通知发件箱使用。
+同一进程内的不同线程各自打开锁文件，彼此之间同样互斥。
+"""
+
+import fcntl
+import logging
+import os
+
+
+class FileLock:
+    """锁文件无法创建或加锁失败时不阻塞调用方，退化为不加锁"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        try:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        except OSError as e:
+            logging.debug(f"无法获取文件锁 {self.path}: {e}")
+            if self._fd is not None:
+                os.close(self._fd)
+            self._fd = None
+        return self
+
+    def __exit__(self, *exc):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
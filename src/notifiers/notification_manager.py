@@ -1,29 +1,89 @@
-from .wecom_notifier import WeComNotifier
+import importlib
+import logging
+import os
+import threading
+from .outbox import DEFAULT_WORKERS, NotificationOutbox
+
+# 发件箱日志路径，未投递的通知在进程重启后仍会继续发送
+OUTBOX_PATH = os.path.join(os.environ.get('APP_STATE_DIR', '/app'), '.notification_outbox.jsonl')
+
+# 通知器后端 (模块, 类名)，第一次需要发送通知时才导入 (企业微信通知器会导入 requests)
+BACKENDS = (
+    ('notifiers.wecom_notifier', 'WeComNotifier'),
+)
 
 class NotificationManager:
-    def __init__(self):
+    def __init__(self, outbox_path=OUTBOX_PATH, workers=DEFAULT_WORKERS):
         """
-        初始化通知管理器并加载所有可用的通知器。
+        初始化通知管理器。
+        消息会先写入持久化的发件箱，再由后台工作线程并发投递。
+        通知器和发件箱在第一次使用时才加载，证书无需续签、也没有待发送通知时不会导入任何通知器后端。
         """
-        self.notifiers = []
-        # 在这里可以添加更多的通知器
-        # 我们现在正确地实例化 WeComNotifier 类
-        self.notifiers.append(WeComNotifier())
+        self.outbox_path = outbox_path
+        self.workers = workers
+        self._notifiers = None
+        self._outbox = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._outbox is None:
+                notifiers = []
+                # 在 BACKENDS 中可以添加更多的通知器
+                for module_name, class_name in BACKENDS:
+                    notifier_class = getattr(importlib.import_module(module_name), class_name)
+                    notifiers.append(notifier_class(pool_size=self.workers))
+                self._notifiers = notifiers
+                self._outbox = NotificationOutbox({n.name: n for n in notifiers}, self.outbox_path,
+                                                  workers=self.workers).start()
+        return self._outbox
+
+    @property
+    def notifiers(self):
+        self._start()
+        return self._notifiers
+
+    @property
+    def outbox(self):
+        return self._start()
+
+    @property
+    def started(self):
+        return self._outbox is not None
+
+    def resume_pending(self):
+        """发件箱日志中有上次未投递的通知时加载通知器并继续发送"""
+        if self.started:
+            return
+        try:
+            if os.path.getsize(self.outbox_path) > 0:
+                self._start()
+        except (OSError, TypeError):
+            pass
 
     def dispatch(self, status, domain, details=""):
         """
-        分发通知到所有已注册的通知器。
+        将通知写入发件箱，分发到所有已配置的通知器。该方法不会等待消息发送完成。
         """
-        if not self.notifiers:
-            print("没有配置任何通知器。")
+        notifiers = [n for n in self.notifiers if n.is_configured()]
+        if not notifiers:
+            logging.info("没有配置任何通知器。")
             return
 
-        print(f"正在向 {len(self.notifiers)} 个通知器分发消息...")
-        for notifier in self.notifiers:
-            try:
-                # 调用每个通知器实例的 send 方法
-                notifier.send(status, domain, details)
-            except Exception as e:
-                # 增加错误捕获，防止一个通知器的失败影响其他通知器
-                print(f"发送通知时遇到错误: {e}")
+        logging.info(f"正在向 {len(notifiers)} 个通知器分发消息...")
+        for notifier in notifiers:
+            self.outbox.enqueue(notifier.name, status, domain, details)
+
+    def flush(self, timeout=30):
+        """等待发件箱中可投递的消息发送完毕，进程退出前调用"""
+        self.resume_pending()
+        if not self.started:
+            return
+        if not self.outbox.flush(timeout):
+            logging.warning(f"仍有通知未能在 {timeout} 秒内发送完毕，将在下次启动时继续投递。")
 
+    @property
+    def max_message_bytes(self):
+        """所有已配置通知器中最严格的单条消息长度上限，None 表示不限制"""
+        limits = [n.max_message_bytes for n in self.notifiers if n.max_message_bytes and n.is_configured()]
+        return min(limits) if limits else None
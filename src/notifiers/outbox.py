@@ -0,0 +1,383 @@
+"""
+持久化的通知发件箱。
+dispatch 只负责把消息写入磁盘上的追加式日志 (journal)，由后台工作线程并发投递，
+失败时按指数退避重试。进程重启后，日志中尚未投递的消息会被重新加载。
+
+main_loop 和手动运行的 main.py 可能同时使用同一个日志:
+* 追加、加载和压缩都在日志的 fcntl 文件锁 (journal_path + '.lock') 内完成，
+  压缩时重新读取日志，保留其他进程写入的记录
+* 每条消息记录所属的进程，加载时只接管所属进程已经退出的消息，同一条消息不会被两个进程同时投递
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+from .file_lock import FileLock
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 10
+BACKOFF_BASE_SECONDS = 5
+BACKOFF_MAX_SECONDS = 3600
+# 内容相同的消息在这段时间内只投递一次
+DEDUP_WINDOW_SECONDS = 600
+# 日志中已完成的记录超过此数量时压缩日志
+COMPACT_THRESHOLD = 200
+
+# 当前进程的标识: 进程号 + 随机值 (容器重启后进程号可能相同)
+PROCESS_OWNER = f"{os.getpid()}:{uuid.uuid4().hex[:12]}"
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """消息所属的进程是否仍在运行 (当前进程视为在运行)"""
+    if not owner:
+        return False
+    if owner == PROCESS_OWNER:
+        return True
+    pid, _, _ = str(owner).partition(':')
+    try:
+        pid = int(pid)
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        # 进程号与当前进程相同但标识不同: 之前 (容器重启前) 的进程
+        return False
+    try:
+        os.kill(pid, 0)
+    except PermissionError:
+        return True
+    except OSError:
+        return False
+    return True
+
+
+def message_key(notifier: str, status: str, domain: str, details: str) -> str:
+    """根据通知器和消息内容计算去重键"""
+    raw = json.dumps([notifier, status, domain, details], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:32]
+
+
+class NotificationOutbox:
+    """
+    磁盘持久化的通知队列。
+
+    日志中的每一行是一条 JSON 记录:
+      {"op": "enqueue", "id": ..., "notifier": ..., "status": ..., "domain": ..., "details": ..., "key": ...,
+       "owner": ...}
+      {"op": "claim", "id": ..., "owner": ...}     (接管所属进程已退出的消息)
+      {"op": "retry", "id": ..., "attempts": ..., "next_attempt_at": ...}
+      {"op": "done", "id": ..., "key": ..., "at": ...}
+    """
+
+    def __init__(self, notifiers: Dict[str, object], journal_path: Optional[str],
+                 workers: int = DEFAULT_WORKERS, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.notifiers = notifiers
+        if journal_path and not os.path.isdir(os.path.dirname(os.path.abspath(journal_path))):
+            logging.warning(f"发件箱日志目录不存在，通知将只保存在内存中: {journal_path}")
+            journal_path = None
+        self.journal_path = journal_path
+        self.lock_path = f"{journal_path}.lock" if journal_path else None
+        self.workers = max(1, workers)
+        self.max_attempts = max_attempts
+
+        self._cond = threading.Condition()
+        self._pending: Dict[str, dict] = {}
+        self._heap = []                # [(next_attempt_at, id)]
+        self._in_flight = 0
+        self._delivered: Dict[str, float] = {}   # {去重键: 投递时间}
+        self._done_records = 0
+        self._threads = []
+        self._stopped = False
+
+        self._load_journal()
+
+    # --- 日志读写 ---
+
+    def _locked(self):
+        return FileLock(self.lock_path)
+
+    def _write_records(self, records: List[dict], sync: bool = False):
+        """在文件锁内调用"""
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _append(self, record: dict, sync: bool = False):
+        if not self.journal_path:
+            return
+        try:
+            with self._locked():
+                self._write_records([record], sync)
+        except OSError as e:
+            logging.warning(f"写入通知发件箱日志 {self.journal_path} 失败: {e}")
+
+    def _replay(self, now: float) -> Tuple[Dict[str, dict], Dict[str, float]]:
+        """
+        读取整个日志 (在文件锁内调用)。
+
+        :return: (全部进程尚未投递的消息 {id: 记录}, 去重窗口内已投递的消息 {去重键: 投递时间})
+        """
+        pending, delivered = {}, {}
+        if not os.path.exists(self.journal_path):
+            return pending, delivered
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程崩溃时最后一行可能不完整
+                    continue
+                op = record.get('op')
+                if op == 'enqueue':
+                    record.setdefault('attempts', 0)
+                    record.setdefault('next_attempt_at', now)
+                    pending[record['id']] = record
+                elif op == 'claim' and record.get('id') in pending:
+                    pending[record['id']]['owner'] = record.get('owner')
+                elif op == 'retry' and record.get('id') in pending:
+                    pending[record['id']].update(
+                        attempts=record['attempts'], next_attempt_at=record['next_attempt_at'])
+                elif op == 'done':
+                    pending.pop(record.get('id'), None)
+                    if record.get('key') and now - record.get('at', 0) < DEDUP_WINDOW_SECONDS:
+                        delivered[record['key']] = record['at']
+        for record in pending.values():
+            record.pop('op', None)
+        return pending, delivered
+
+    def _load_journal(self):
+        if not self.journal_path or not os.path.exists(self.journal_path):
+            return
+        now = time.time()
+        try:
+            with self._locked():
+                pending, self._delivered = self._replay(now)
+                # 只接管所属进程已经退出的消息，仍在运行的进程会自己投递
+                adopted = {entry_id: entry for entry_id, entry in pending.items()
+                           if entry.get('owner') == PROCESS_OWNER or not _owner_alive(entry.get('owner'))}
+                for entry in adopted.values():
+                    entry['owner'] = PROCESS_OWNER
+                self._write_records([{'op': 'claim', 'id': entry_id, 'owner': PROCESS_OWNER}
+                                     for entry_id in adopted], sync=True)
+                self._pending = adopted
+                self._compact_locked(now)
+        except OSError as e:
+            logging.warning(f"读取通知发件箱日志 {self.journal_path} 失败: {e}")
+            return
+
+        for entry_id, entry in self._pending.items():
+            heapq.heappush(self._heap, (entry['next_attempt_at'], entry_id))
+        if self._pending:
+            logging.info(f"从发件箱日志中恢复了 {len(self._pending)} 条未投递的通知。")
+
+    def _compact(self):
+        """只保留未投递的消息和去重窗口内的记录，原子地重写日志"""
+        if not self.journal_path:
+            return
+        try:
+            with self._locked():
+                self._compact_locked(time.time())
+        except OSError as e:
+            logging.warning(f"压缩通知发件箱日志失败: {e}")
+
+    def _compact_locked(self, now: float):
+        """
+        在文件锁内重新读取日志后重写: 其他进程尚未投递的消息原样保留，
+        本进程的消息使用内存中的最新状态，已投递的记录合并两者并只保留去重窗口内的部分。
+        """
+        pending, delivered = self._replay(now)
+        for entry_id in [entry_id for entry_id, entry in pending.items() if entry.get('owner') == PROCESS_OWNER]:
+            if entry_id not in self._pending:
+                # 本进程已经投递或放弃，done 记录可能已被之前的压缩移除
+                del pending[entry_id]
+        pending.update(self._pending)
+        delivered.update(self._delivered)
+        delivered = {key: at for key, at in delivered.items() if now - at < DEDUP_WINDOW_SECONDS}
+
+        tmp_path = f"{self.journal_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in pending.values():
+                    f.write(json.dumps(dict(entry, op='enqueue'), ensure_ascii=False) + '\n')
+                for key, at in delivered.items():
+                    f.write(json.dumps({'op': 'done', 'id': None, 'key': key, 'at': at}) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.journal_path)
+            self._done_records = 0
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    # --- 入队与投递 ---
+
+    def enqueue(self, notifier: str, status: str, domain: str, details: str = "") -> bool:
+        """
+        将一条消息写入发件箱，立即返回。
+
+        :return: 是否入队；重复的消息会被忽略并返回 False。
+        """
+        key = message_key(notifier, status, domain, details)
+        now = time.time()
+        with self._cond:
+            if now - self._delivered.get(key, 0) < DEDUP_WINDOW_SECONDS:
+                logging.info(f"相同内容的通知在 {DEDUP_WINDOW_SECONDS} 秒内已发送过，跳过。")
+                return False
+            if any(entry['key'] == key for entry in self._pending.values()):
+                logging.info("相同内容的通知已在发件箱中等待投递，跳过。")
+                return False
+
+            entry = {
+                'id': uuid.uuid4().hex,
+                'key': key,
+                'notifier': notifier,
+                'status': status,
+                'domain': domain,
+                'details': details,
+                'created_at': now,
+                'attempts': 0,
+                'next_attempt_at': now,
+                'owner': PROCESS_OWNER,
+            }
+            self._append(dict(entry, op='enqueue'), sync=True)
+            self._pending[entry['id']] = entry
+            heapq.heappush(self._heap, (now, entry['id']))
+            self._cond.notify()
+        return True
+
+    def _next_entry(self) -> Optional[dict]:
+        """阻塞直到有到期的消息，停止时返回 None"""
+        with self._cond:
+            while not self._stopped:
+                if self._heap:
+                    due_at, entry_id = self._heap[0]
+                    wait_seconds = due_at - time.time()
+                    if wait_seconds <= 0:
+                        heapq.heappop(self._heap)
+                        entry = self._pending.get(entry_id)
+                        if entry is None:
+                            continue
+                        self._in_flight += 1
+                        return entry
+                    self._cond.wait(timeout=wait_seconds)
+                else:
+                    self._cond.wait()
+            return None
+
+    def _deliver(self, entry: dict) -> bool:
+        notifier = self.notifiers.get(entry['notifier'])
+        if notifier is None:
+            logging.warning(f"通知器 '{entry['notifier']}' 不存在，丢弃消息。")
+            return True
+        try:
+            delivered = notifier.send(entry['status'], entry['domain'], entry['details']) is not False
+        except Exception as e:
+            logging.error(f"通知器 '{entry['notifier']}' 发送时遇到错误: {e}")
+            metrics.record_failure('notify', str(e))
+            return False
+        if not delivered:
+            metrics.record_failure('notify')
+        return delivered
+
+    def _finish(self, entry: dict, delivered: bool):
+        with self._cond:
+            self._in_flight -= 1
+            now = time.time()
+            entry['attempts'] += 1
+            if delivered or entry['attempts'] >= self.max_attempts:
+                if not delivered:
+                    logging.error(f"通知在 {entry['attempts']} 次尝试后仍发送失败，已放弃: {entry['domain']} ({entry['status']})")
+                self._pending.pop(entry['id'], None)
+                if delivered:
+                    self._delivered[entry['key']] = now
+                self._append({'op': 'done', 'id': entry['id'], 'key': entry['key'] if delivered else None, 'at': now})
+                self._done_records += 1
+                if self._done_records >= COMPACT_THRESHOLD:
+                    self._prune_delivered(now)
+                    self._compact()
+            else:
+                delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (entry['attempts'] - 1))
+                delay *= random.uniform(0.8, 1.2)
+                entry['next_attempt_at'] = now + delay
+                logging.warning(f"通知发送失败，{delay:.0f} 秒后进行第 {entry['attempts'] + 1} 次尝试。")
+                self._append({'op': 'retry', 'id': entry['id'], 'attempts': entry['attempts'],
+                              'next_attempt_at': entry['next_attempt_at']})
+                heapq.heappush(self._heap, (entry['next_attempt_at'], entry['id']))
+            self._cond.notify_all()
+
+    def _prune_delivered(self, now: float):
+        self._delivered = {k: at for k, at in self._delivered.items() if now - at < DEDUP_WINDOW_SECONDS}
+
+    def _defer(self, entry: dict, delay: float):
+        """渠道配额用尽时推迟投递，不计入重试次数"""
+        with self._cond:
+            self._in_flight -= 1
+            entry['next_attempt_at'] = time.time() + delay
+            logging.info(f"通知渠道 '{entry['notifier']}' 的发送配额已用尽，{delay:.0f} 秒后再投递。")
+            heapq.heappush(self._heap, (entry['next_attempt_at'], entry['id']))
+            self._cond.notify_all()
+
+    def _worker(self):
+        while True:
+            entry = self._next_entry()
+            if entry is None:
+                return
+            quota = getattr(self.notifiers.get(entry['notifier']), 'quota', None)
+            wait = quota.acquire() if quota else 0
+            if wait > 0:
+                self._defer(entry, wait)
+                continue
+            with metrics.span('notify'):
+                delivered = self._deliver(entry)
+            self._finish(entry, delivered)
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f'notify-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def flush(self, timeout: float = 30) -> bool:
+        """
+        等待当前可投递的消息全部处理完毕 (正在退避等待重试的消息除外)。
+
+        :return: 是否在超时前处理完毕。
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.time()
+                due = any(at <= now for at, entry_id in self._heap if entry_id in self._pending)
+                # 因配额或退避而推迟的消息留给后台线程，不阻塞调用方
+                if not due and self._in_flight == 0:
+                    return True
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(timeout=min(remaining, 1))
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._pending)
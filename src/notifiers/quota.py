@@ -0,0 +1,52 @@
+"""
+通知渠道的发送配额。
+按滑动时间窗口记录每个渠道的发送次数，超出配额时给出需要等待的秒数。
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Iterable, Tuple
+
+
+class ChannelQuota:
+    """
+    :param limits: [(窗口秒数, 窗口内最多发送次数)]，例如 ((60, 30), (3600, 1000))。
+    """
+
+    def __init__(self, limits: Iterable[Tuple[float, int]]):
+        self.limits = [(float(window), int(count)) for window, count in limits]
+        self._lock = threading.Lock()
+        self._sent = deque()
+        self._max_window = max((window for window, _ in self.limits), default=0)
+
+    def _prune(self, now: float):
+        while self._sent and now - self._sent[0] >= self._max_window:
+            self._sent.popleft()
+
+    def acquire(self) -> float:
+        """
+        尝试占用一次发送配额。
+
+        :return: 0 表示已占用可以立即发送；大于 0 表示需要等待的秒数 (未占用)。
+        """
+        if not self.limits:
+            return 0.0
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            wait = 0.0
+            for window, count in self.limits:
+                in_window = [t for t in self._sent if now - t < window]
+                if len(in_window) >= count:
+                    wait = max(wait, in_window[len(in_window) - count] + window - now)
+            if wait > 0:
+                return wait
+            self._sent.append(now)
+            return 0.0
+
+    @property
+    def used(self) -> int:
+        with self._lock:
+            self._prune(time.time())
+            return len(self._sent)
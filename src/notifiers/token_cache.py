@@ -0,0 +1,140 @@
+"""
+跨进程共享的 access_token 缓存。
+
+* 通过 fcntl 文件锁保证同一时间只有一个进程/线程去请求新 token (single-flight)
+* 缓存文件使用 临时文件 + fsync + rename 原子写入，读取方永远不会看到写了一半的文件
+* token 即将过期时在后台线程中提前刷新，发送消息的调用方无需等待
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+from .file_lock import FileLock
+
+# 在 token 过期前多久开始后台刷新(秒)
+DEFAULT_REFRESH_AHEAD = 600
+# 相对官方 expires_in 预留的安全余量(秒)
+EXPIRY_SAFETY_MARGIN = 200
+
+
+class TokenCache:
+    """
+    :param path: 缓存文件路径，锁文件为 path + '.lock'。
+    :param fetch: 获取新 token 的函数，返回 (token, expires_in秒)，失败时返回 None。
+    :param owner: token 所属的凭证标识，凭证变化后旧的缓存文件自动失效。
+    """
+
+    def __init__(self, path: str, fetch: Callable[[], Optional[Tuple[str, int]]], owner: str = '',
+                 refresh_ahead: float = DEFAULT_REFRESH_AHEAD):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.fetch = fetch
+        self.owner = hashlib.sha256(owner.encode('utf-8')).hexdigest()[:16]
+        self.refresh_ahead = refresh_ahead
+
+        self.token: Optional[str] = None
+        self.expires_at = 0.0
+        self._thread_lock = threading.Lock()
+        self._refreshing = False
+
+    # --- 文件读写 ---
+
+    def _read_file(self) -> Tuple[Optional[str], float]:
+        try:
+            with open(self.path, 'r') as f:
+                cache = json.load(f)
+        except FileNotFoundError:
+            return None, 0.0
+        except (OSError, ValueError) as e:
+            logging.warning(f"读取 token 缓存文件失败: {e}，将重新获取。")
+            return None, 0.0
+        if cache.get('owner', self.owner) != self.owner:
+            return None, 0.0
+        return cache.get('access_token'), float(cache.get('expires_at', 0))
+
+    def _write_file(self, token: str, expires_at: float):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'access_token': token, 'expires_at': expires_at, 'owner': self.owner}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"写入 token 缓存文件失败: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def _locked(self):
+        """获取跨进程排他锁，锁文件无法创建时退化为仅进程内加锁"""
+        return FileLock(self.lock_path)
+
+    # --- 获取与刷新 ---
+
+    def _valid(self, expires_at: float, margin: float = 0) -> bool:
+        return time.time() + margin < expires_at
+
+    def _refresh(self, force: bool = False) -> Optional[str]:
+        """
+        在锁内刷新 token。先重新读取缓存文件，只有文件中的 token 也不可用时才真正请求。
+        :param force: 为 True 时，文件中的 token 只要进入提前刷新窗口就重新请求。
+        """
+        with self._thread_lock, self._locked():
+            margin = self.refresh_ahead if force else 0
+            token, expires_at = self._read_file()
+            if token and self._valid(expires_at, margin):
+                self.token, self.expires_at = token, expires_at
+                logging.info("从文件缓存加载了有效的 access_token。")
+                return token
+
+            fetched = self.fetch()
+            if not fetched:
+                # 请求失败时，只要旧 token 尚未过期就继续使用
+                if token and self._valid(expires_at):
+                    self.token, self.expires_at = token, expires_at
+                    return token
+                return None
+
+            token, expires_in = fetched
+            self.token = token
+            self.expires_at = time.time() + expires_in - EXPIRY_SAFETY_MARGIN
+            self._write_file(self.token, self.expires_at)
+            logging.info("成功获取并缓存了新的 access_token。")
+            return token
+
+    def _background_refresh(self):
+        try:
+            self._refresh(force=True)
+        except Exception as e:
+            logging.warning(f"后台刷新 access_token 失败: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self) -> Optional[str]:
+        """返回可用的 token，必要时同步获取；临近过期时触发一次后台刷新"""
+        if self.token and self._valid(self.expires_at):
+            if not self._valid(self.expires_at, self.refresh_ahead) and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._background_refresh, name='token-refresh', daemon=True).start()
+            return self.token
+        return self._refresh()
+
+    def invalidate(self, token: Optional[str] = None):
+        """token 被服务端拒绝时调用，同时删除仍保存着这个 token 的缓存文件"""
+        token = token or self.token
+        with self._thread_lock, self._locked():
+            if self.token == token:
+                self.token, self.expires_at = None, 0.0
+            file_token, _ = self._read_file()
+            if token and file_token == token:
+                try:
+                    os.unlink(self.path)
+                except OSError:
+                    pass
@@ -1,82 +1,126 @@
-import os
-import json
-import time
 import requests
 import logging
+import threading
+from functools import partial
+from typing import NamedTuple, Optional
+from requests.adapters import HTTPAdapter
 from .base_notifier import BaseNotifier
+from .quota import ChannelQuota
+from .token_cache import TokenCache
 from config_manager import ConfigManager
 
+
+class WeComConfig(NamedTuple):
+    """一份完整的企业微信配置，配置重新加载时整体替换，发送过程中不会被其他线程修改"""
+    corp_id: Optional[str]
+    corp_secret: Optional[str]
+    agent_id: Optional[str]
+    touser: str
+    api_origin: str
+    token_cache_path: str
+
+
 class WeComNotifier(BaseNotifier):
     """
     通过企业微信应用发送纯文本格式消息的通知器。
     这种方式可以确保在微信插件中也能正常显示。
     """
-    def __init__(self):
-        config_mgr = ConfigManager()
-        self.corp_id = config_mgr.get("notifiers.wecom.corp_id", "WECOM_CORP_ID")
-        self.corp_secret = config_mgr.get("notifiers.wecom.corp_secret", "WECOM_CORP_SECRET")
-        self.agent_id = config_mgr.get("notifiers.wecom.agent_id", "WECOM_AGENT_ID")
-        self.touser = config_mgr.get("notifiers.wecom.touser", "WECOM_TOUSER", "@all")
+    name = "wecom"
 
-        self.api_origin = "https://qyapi.weixin.qq.com"
-        self.token_cache_path = "/temp/wecom_token.json"
-        self.access_token = None
-        self.token_expires_at = 0
+    # access_token 失效相关的错误码，遇到时清除缓存的 token 后重试
+    TOKEN_ERROR_CODES = (40001, 40014, 42001)
+    # 文本消息内容最长 2048 字节，超出部分会被企业微信截断
+    max_message_bytes = 2048
+    # 应用消息频率限制: 同一成员每分钟 30 次、每小时 1000 次
+    RATE_LIMITS = ((60, 30), (3600, 1000))
 
-    def _get_access_token(self):
-        """高效地获取并缓存 access_token。"""
-        if self.access_token and time.time() < self.token_expires_at:
-            return self.access_token
+    def __init__(self, pool_size=4):
+        self.config: Optional[WeComConfig] = None
+        self.token_cache = None
+        self.quota = ChannelQuota(self.RATE_LIMITS)
+        # 复用 HTTP 连接，在主循环的多次运行之间保持；连接池大小与发件箱工作线程数一致
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
-        try:
-            if os.path.exists(self.token_cache_path):
-                with open(self.token_cache_path, "r") as f:
-                    cache = json.load(f)
-                    if time.time() < cache.get("expires_at", 0):
-                        self.access_token = cache.get("access_token")
-                        self.token_expires_at = cache.get("expires_at")
-                        logging.info("从文件缓存加载了有效的 access_token。")
-                        return self.access_token
-        except (IOError, json.JSONDecodeError) as e:
-            logging.warning(f"读取 token 缓存文件失败: {e}，将重新获取。")
+        self.config_version = None
+        # 发件箱和续签任务的多个线程会同时调用 _load_config
+        self._config_lock = threading.Lock()
+        self._load_config()
+
+    def _load_config(self):
+        """
+        读取企业微信配置；配置重新加载后会在下一次发送前刷新。
+        配置和对应的 TokenCache 在锁内一起替换，返回的 (配置, TokenCache) 属于同一份凭证。
+        """
+        config_mgr = ConfigManager()
+        with self._config_lock:
+            if self.config_version == config_mgr.version:
+                return self.config, self.token_cache
+            config = WeComConfig(
+                corp_id=config_mgr.get("notifiers.wecom.corp_id", "WECOM_CORP_ID"),
+                corp_secret=config_mgr.get("notifiers.wecom.corp_secret", "WECOM_CORP_SECRET"),
+                agent_id=config_mgr.get("notifiers.wecom.agent_id", "WECOM_AGENT_ID"),
+                touser=config_mgr.get("notifiers.wecom.touser", "WECOM_TOUSER", "@all"),
+                # 通过代理转发或在基准测试中使用本地替身时可修改 API 地址
+                api_origin=str(config_mgr.get("notifiers.wecom.api_origin", "WECOM_API_ORIGIN",
+                                              "https://qyapi.weixin.qq.com")).rstrip('/'),
+                token_cache_path=config_mgr.get("notifiers.wecom.token_cache", "WECOM_TOKEN_CACHE",
+                                                "/temp/wecom_token.json"),
+            )
+            previous = self.config
+            if self.token_cache is None or previous is None or \
+                    (config.corp_id, config.corp_secret, config.token_cache_path) != \
+                    (previous.corp_id, previous.corp_secret, previous.token_cache_path):
+                # 企业凭证变化后旧 token 不再可用
+                self.token_cache = TokenCache(config.token_cache_path, partial(self._fetch_access_token, config),
+                                              owner=f"{config.corp_id}:{config.corp_secret}")
+            self.config = config
+            self.config_version = config_mgr.version
+            return self.config, self.token_cache
+
+    @staticmethod
+    def _configured(config: WeComConfig) -> bool:
+        return all([config.corp_id, config.corp_secret, config.agent_id])
+
+    def is_configured(self):
+        config, _ = self._load_config()
+        return self._configured(config)
 
+    def _fetch_access_token(self, config: WeComConfig):
+        """从企业微信 API 获取新的 access_token，返回 (token, expires_in)，失败时返回 None"""
         logging.info("access_token 无效或已过期，正在从企业微信 API 获取新的 token...")
-        if not all([self.corp_id, self.corp_secret]):
+        if not all([config.corp_id, config.corp_secret]):
             logging.error("获取 access_token 失败: corp_id 或 corp_secret 未配置。")
             return None
-            
-        url = f"{self.api_origin}/cgi-bin/gettoken?corpid={self.corp_id}&corpsecret={self.corp_secret}"
+
+        url = f"{config.api_origin}/cgi-bin/gettoken?corpid={config.corp_id}&corpsecret={config.corp_secret}"
         try:
-            response = requests.get(url, timeout=10)
+            response = self.session.get(url, timeout=10)
             response.raise_for_status()
             data = response.json()
             if data.get("errcode") == 0:
-                self.access_token = data.get("access_token")
-                self.token_expires_at = time.time() + data.get("expires_in", 7200) - 200
-                try:
-                    with open(self.token_cache_path, "w") as f:
-                        json.dump({"access_token": self.access_token, "expires_at": self.token_expires_at}, f)
-                    logging.info("成功获取并缓存了新的 access_token。")
-                except IOError as e:
-                    logging.warning(f"写入 token 缓存文件失败: {e}")
-                return self.access_token
-            else:
-                logging.error(f"获取 access_token 失败: {data.get('errmsg')} (errcode: {data.get('errcode')})")
-                return None
+                return data.get("access_token"), data.get("expires_in", 7200)
+            logging.error(f"获取 access_token 失败: {data.get('errmsg')} (errcode: {data.get('errcode')})")
+            return None
         except requests.exceptions.RequestException as e:
             logging.error(f"请求 access_token 时发生网络错误: {e}")
             return None
 
     def send(self, status, domain, details=""):
-        """主发送方法，被 NotificationManager 调用。"""
-        if not all([self.corp_id, self.corp_secret, self.agent_id]):
+        """主发送方法，被 NotificationManager 调用。返回是否发送成功。"""
+        # 本次发送自始至终使用同一份配置，其他线程重新加载配置不影响正在进行的发送
+        config, token_cache = self._load_config()
+        if not self._configured(config):
             logging.warning("企业微信通知缺少必要的参数 (corp_id, corp_secret, agent_id)，跳过发送。")
-            return
+            return True
 
-        token = self._get_access_token()
+        # access_token 由跨进程共享的 TokenCache 负责缓存和提前刷新
+        token = token_cache.get()
         if not token:
             logging.error("无法发送消息，因为 access_token 获取失败。")
-            return
+            return False
 
         # 准备纯文本内容
         text_content = details if details else (
@@ -85,12 +129,12 @@ class WeComNotifier(BaseNotifier):
             f"状态: {status.upper()}\n"
         )
 
-        send_url = f"{self.api_origin}/cgi-bin/message/send?access_token={token}"
+        send_url = f"{config.api_origin}/cgi-bin/message/send?access_token={token}"
         # 将 payload 修改为 text 类型
         payload = {
-            "touser": self.touser,
+            "touser": config.touser,
             "msgtype": "text",
-            "agentid": self.agent_id,
+            "agentid": config.agent_id,
             "text": {
                 "content": text_content
             },
@@ -100,15 +144,16 @@ class WeComNotifier(BaseNotifier):
             "duplicate_check_interval": 1800
         }
 
-        # --- 修改结束 ---
-
         try:
-            response = requests.post(send_url, json=payload, timeout=10)
+            response = self.session.post(send_url, json=payload, timeout=10)
             response.raise_for_status()
             result = response.json()
             if result.get("errcode") == 0:
                 logging.info("企业微信 text 消息发送成功。")
-            else:
-                logging.error(f"企业微信 text 消息发送失败: {result.get('errmsg')} (errcode: {result.get('errcode')})")
+                return True
+            if result.get("errcode") in self.TOKEN_ERROR_CODES:
+                token_cache.invalidate(token)
+            logging.error(f"企业微信 text 消息发送失败: {result.get('errmsg')} (errcode: {result.get('errcode')})")
         except requests.exceptions.RequestException as e:
-            logging.error(f"发送企业微信 text 消息时发生网络错误: {e}")
\ No newline at end of file
+            logging.error(f"发送企业微信 text 消息时发生网络错误: {e}")
+        return False
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+ACME 订单的速率限制预算。
+
+Let's Encrypt 对每个账户的新订单数、每个注册域名的证书数以及完全相同的域名组合的证书数都有限制，
+超出后订单直接失败，并在错误中给出 "retry after <时间>"。这里为每个范围维护一个持久化的令牌桶:
+* 令牌按限制的速率匀速补充，签发前检查所有相关范围的令牌，不足时推迟签发而不是去撞限制
+* 收到 rateLimited 错误时解析 Retry-After 时间，在此之前对应的范围不再尝试
+
+状态保存在 JSON 文件中 (临时文件 + rename 原子写入)，重启容器后预算仍然有效。
+"""
+
+import email.utils
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 范围 -> (容量, 窗口秒数)，与 Let's Encrypt 公布的限制一致
+DEFAULT_LIMITS: Dict[str, Tuple[int, float]] = {
+    'account': (300, 3 * 3600),          # 每个账户每 3 小时 300 个新订单
+    'domain': (50, 7 * 86400),           # 每个注册域名每 7 天 50 张证书
+    'names': (5, 7 * 86400),             # 完全相同的域名组合每 7 天 5 张证书
+}
+# 没有给出 Retry-After 时间时的等待秒数
+DEFAULT_RETRY_AFTER = 3600
+# 在 Retry-After 时间之后再多等待的秒数，避免因时钟误差过早重试
+RETRY_AFTER_MARGIN = 60
+
+# 常见的多级公共后缀；完整的公共后缀列表过大，其余后缀按最后两级计算注册域名
+MULTI_LABEL_SUFFIXES = {
+    'com.cn', 'net.cn', 'org.cn', 'gov.cn', 'edu.cn', 'ac.cn',
+    'com.hk', 'net.hk', 'org.hk', 'com.tw', 'net.tw', 'org.tw',
+    'co.uk', 'org.uk', 'ac.uk', 'co.jp', 'ne.jp', 'or.jp',
+    'com.au', 'net.au', 'org.au', 'co.nz', 'com.sg', 'com.br', 'co.kr', 'co.in',
+}
+
+_RETRY_AFTER_PATTERNS = (
+    # Let's Encrypt 错误详情: "retry after 2024-05-01 12:00:00 UTC" / "retry after 2024-05-01T12:00:00Z"
+    re.compile(r'retry after (\d{4}-\d{2}-\d{2})[ T](\d{2}:\d{2}:\d{2})', re.I),
+    # 调试输出中的 HTTP 响应头: "Retry-After: 3600" 或 HTTP 日期
+    re.compile(r'Retry-After:\s*([^\r\n"]+)', re.I),
+)
+
+
+def registered_domain(name: str) -> str:
+    """证书中的域名所属的注册域名 (近似计算，见 MULTI_LABEL_SUFFIXES)"""
+    labels = name.lower().strip('.').removeprefix('*.').split('.')
+    size = 3 if '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 2
+    return '.'.join(labels[-size:])
+
+
+def parse_retry_after(output: str, now: Optional[float] = None) -> Optional[float]:
+    """
+    从 acme.sh 的输出中解析速率限制的解除时间。
+
+    :return: Unix 时间戳；输出中没有 Retry-After 信息时返回 None。
+    """
+    now = time.time() if now is None else now
+    match = _RETRY_AFTER_PATTERNS[0].search(output)
+    if match:
+        try:
+            moment = datetime.strptime(f'{match.group(1)} {match.group(2)}', '%Y-%m-%d %H:%M:%S')
+            return moment.replace(tzinfo=timezone.utc).timestamp()
+        except ValueError:
+            pass
+    match = _RETRY_AFTER_PATTERNS[1].search(output)
+    if match:
+        value = match.group(1).strip()
+        if value.isdigit():
+            return now + int(value)
+        try:
+            return email.utils.parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            pass
+    return None
+
+
+def limited_scope(output: str) -> str:
+    """根据 rateLimited 错误详情判断触发的是哪一类限制"""
+    text = output.lower()
+    if 'exact set' in text or 'duplicate' in text:
+        return 'names'
+    if 'new orders' in text or 'per account' in text or 'too many requests' in text:
+        return 'account'
+    return 'domain'
+
+
+class OrderBudget:
+    """
+    :param path: 状态文件路径。
+    :param limits: {范围: (容量, 窗口秒数)}。
+    """
+
+    def __init__(self, path: str, limits: Optional[Dict[str, Tuple[int, float]]] = None):
+        self.path = path
+        self.limits = dict(DEFAULT_LIMITS if limits is None else limits)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scopes(account: str, names: Iterable[str]) -> Dict[str, List[str]]:
+        """一次订单涉及的全部范围键: {范围: [键]}"""
+        names = sorted({n.lower() for n in names})
+        return {
+            'account': [hashlib.sha256(account.encode('utf-8')).hexdigest()[:16]],
+            'domain': sorted({registered_domain(n) for n in names}),
+            'names': [hashlib.sha256(','.join(names).encode('utf-8')).hexdigest()[:16]],
+        }
+
+    # --- 状态文件 ---
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {'buckets': {}, 'blocked': {}}
+        except (OSError, ValueError) as e:
+            logging.warning(f"读取订单预算状态失败: {e}，将重新开始计数。")
+            return {'buckets': {}, 'blocked': {}}
+        state.setdefault('buckets', {})
+        state.setdefault('blocked', {})
+        return state
+
+    def _save(self, state: dict):
+        now = time.time()
+        # 清理已解除的限制和已补满的令牌桶
+        state['blocked'] = {k: v for k, v in state['blocked'].items() if v > now}
+        state['buckets'] = {k: v for k, v in state['buckets'].items() if self._tokens(k, v, now) < self._capacity(k)}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"写入订单预算状态失败: {e}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    # --- 令牌桶 ---
+
+    def _capacity(self, key: str) -> int:
+        return self.limits.get(key.split(':', 1)[0], (0, 1))[0]
+
+    def _tokens(self, key: str, bucket: dict, now: float) -> float:
+        capacity, window = self.limits.get(key.split(':', 1)[0], (0, 1))
+        elapsed = max(0.0, now - bucket['updated'])
+        return min(capacity, bucket['tokens'] + elapsed * capacity / window)
+
+    def _keys(self, scopes: Dict[str, List[str]], kinds: Iterable[str]) -> List[str]:
+        return [f'{kind}:{key}' for kind in kinds if kind in self.limits for key in scopes.get(kind, [])]
+
+    def wait_time(self, scopes: Dict[str, List[str]], kinds: Iterable[str] = ('account', 'domain', 'names')) -> float:
+        """返回可以提交订单前需要等待的秒数，0 表示预算充足"""
+        now = time.time()
+        with self._lock:
+            state = self._load()
+        wait = 0.0
+        for key in self._keys(scopes, kinds):
+            wait = max(wait, state['blocked'].get(key, 0) - now)
+            bucket = state['buckets'].get(key)
+            if bucket is not None:
+                capacity, window = self.limits[key.split(':', 1)[0]]
+                tokens = self._tokens(key, bucket, now)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) * window / capacity)
+        return max(0.0, wait)
+
+    def consume(self, scopes: Dict[str, List[str]], kinds: Iterable[str]):
+        """记录一次消耗 (新订单消耗 account，签发成功的证书消耗 domain 和 names)"""
+        now = time.time()
+        with self._lock:
+            state = self._load()
+            for key in self._keys(scopes, kinds):
+                bucket = state['buckets'].get(key)
+                tokens = self._tokens(key, bucket, now) if bucket else self._capacity(key)
+                state['buckets'][key] = {'tokens': tokens - 1, 'updated': now}
+            self._save(state)
+
+    def block(self, scopes: Dict[str, List[str]], kind: str, until: float):
+        """CA 返回速率限制错误后，在 until (Unix 时间戳) 之前不再为该范围提交订单"""
+        with self._lock:
+            state = self._load()
+            for key in self._keys(scopes, [kind]):
+                state['blocked'][key] = max(until, state['blocked'].get(key, 0))
+                # 解除限制时只剩一个令牌，之后按正常速率恢复，避免解除后立即连续提交订单
+                state['buckets'][key] = {'tokens': 1.0, 'updated': until}
+            self._save(state)
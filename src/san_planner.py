@@ -0,0 +1,100 @@
+"""
+多域名 (SAN) 证书的批量签发规划。
+
+每个域名需要 <域名> 和 *.<域名> 两个 SAN。按 DNS 提供商分组后，把需要续签的域名打包进
+尽量少的多 SAN 证书 (不超过 CA 的 SAN 上限)，每个批次只需一次 ACME 订单、一次 DNS API 会话，
+也只消耗一次 Let's Encrypt 的签发额度。
+
+续签窗口: 距离续签时间不足 window_days 天的域名也会被并入同组中已到期域名的批次，
+这样同一批次的证书以后会在同一时间到期，下次仍然可以一起续签。
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Let's Encrypt 单张证书最多 100 个 SAN
+DEFAULT_MAX_SANS = 100
+DEFAULT_WINDOW_DAYS = 7
+
+
+def names_for(domain: str) -> List[str]:
+    """一个域名在证书中占用的 SAN"""
+    return [domain, f'*.{domain}']
+
+
+SANS_PER_DOMAIN = len(names_for('example.com'))
+
+
+@dataclass
+class Batch:
+    """一次 ACME 订单，第一个域名为主域名 (acme.sh 以它命名证书目录)"""
+    dns_api: str
+    domains: List[str] = field(default_factory=list)
+    # 已到续签时间的域名，其余域名是提前并入的
+    due: List[str] = field(default_factory=list)
+
+    @property
+    def primary(self) -> str:
+        return self.domains[0]
+
+    @property
+    def names(self) -> List[str]:
+        return [name for domain in self.domains for name in names_for(domain)]
+
+
+def parse_dns_overrides(raw) -> Dict[str, str]:
+    """
+    解析按域名指定的 DNS API。
+
+    :param raw: 字典 {域名: DNS API}，或 'example.org=dns_ali,example.net=dns_cf' 格式的字符串。
+    """
+    if isinstance(raw, dict):
+        return {str(k).strip(): str(v).strip() for k, v in raw.items() if str(k).strip() and str(v).strip()}
+    overrides = {}
+    for item in str(raw or '').replace(';', ',').split(','):
+        domain, sep, api = item.partition('=')
+        if sep and domain.strip() and api.strip():
+            overrides[domain.strip()] = api.strip()
+    return overrides
+
+
+def plan_batches(domains: List[str], checks: Dict[str, Tuple[bool, Optional[datetime]]],
+                 dns_api_for: Callable[[str], str], renew_days: int,
+                 max_sans: int = DEFAULT_MAX_SANS, window_days: int = DEFAULT_WINDOW_DAYS,
+                 now: Optional[datetime] = None) -> List[Batch]:
+    """
+    规划本轮需要签发的批次。
+
+    :param domains: 全部域名，顺序决定主域名的优先级。
+    :param checks: {域名: (是否需要续签, 过期时间)}。
+    :param dns_api_for: 返回域名使用的 DNS API。
+    :param renew_days: 过期前多少天需要续签。
+    :param max_sans: 单张证书的 SAN 上限。
+    :param window_days: 续签窗口，距离续签时间不足该天数的域名会被提前并入批次。
+    :return: 批次列表；不需要续签的域名不会出现在任何批次中。
+    """
+    now = now or datetime.utcnow()
+    per_batch = max(1, max_sans // SANS_PER_DOMAIN)
+    order = {domain: index for index, domain in enumerate(domains)}
+
+    groups: Dict[str, Tuple[List[str], List[Tuple[datetime, str]]]] = {}
+    for domain in domains:
+        need_renew, expiry = checks.get(domain, (False, None))
+        due, early = groups.setdefault(dns_api_for(domain), ([], []))
+        if need_renew:
+            due.append(domain)
+        elif expiry is not None and (expiry - now).days <= renew_days + window_days:
+            early.append((expiry, domain))
+
+    batches = []
+    for dns_api, (due, early) in groups.items():
+        if not due:
+            continue
+        # 已到期的域名在前 (保持配置顺序)，提前并入的域名按过期时间排序，只填充最后一个批次的剩余容量
+        due.sort(key=order.get)
+        candidates = due + [domain for _, domain in sorted(early, key=lambda item: (item[0], order[item[1]]))]
+        for start in range(0, len(due), per_batch):
+            members = candidates[start:start + per_batch]
+            batches.append(Batch(dns_api=dns_api, domains=members, due=[d for d in members if d in due]))
+    return batches
@@ -0,0 +1,359 @@
+"""
+运行状态和历史的 SQLite 存储 (WAL 模式)。
+
+替代原来的 .last_run / .scheduler_state JSON 文件:
+  domains          每个域名一行: 下次检查时间、证书过期时间、上次运行时间
+  runs             每次处理域名的结果
+  phase_durations  每次运行中各阶段的耗时
+  cert_versions    安装过的证书 (按指纹去重)
+  stale_endpoints  部署后仍在提供旧证书、等待重新检查的端点
+  meta             其他键值状态 (例如主循环的下次运行时间)
+
+domains 表在 next_due 和 expiry 上建有索引，上千个域名的调度查询和更新也只需几毫秒。
+每个线程使用自己的连接；写入在事务中完成，进程崩溃时不会留下写了一半的状态。
+
+升级后第一次打开数据库时，旧版本留下的 .last_run (已知的证书过期时间) 和 .scheduler_state
+(下次运行时间) 会导入到 domains / meta 表，随后重命名为 *.migrated，不会重复导入。
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 等待其他连接释放写锁的最长时间(秒)
+BUSY_TIMEOUT = 30
+
+# 旧版本的状态文件
+LEGACY_LAST_RUN = '.last_run'
+LEGACY_SCHEDULER_STATE = '.scheduler_state'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS domains (
+    domain      TEXT PRIMARY KEY,
+    next_due    REAL,
+    expiry      REAL,
+    last_run    REAL,
+    updated_at  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_domains_next_due ON domains(next_due);
+CREATE INDEX IF NOT EXISTS idx_domains_expiry ON domains(expiry);
+
+CREATE TABLE IF NOT EXISTS runs (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    domain      TEXT NOT NULL,
+    started_at  REAL,
+    finished_at REAL,
+    success     INTEGER NOT NULL,
+    renewed     INTEGER NOT NULL,
+    event       TEXT,
+    error       TEXT,
+    expiry      REAL,
+    next_run    REAL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_domain ON runs(domain, started_at);
+
+CREATE TABLE IF NOT EXISTS phase_durations (
+    run_id      INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    phase       TEXT NOT NULL,
+    seconds     REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_phase_durations_run ON phase_durations(run_id);
+
+CREATE TABLE IF NOT EXISTS cert_versions (
+    domain       TEXT NOT NULL,
+    fingerprint  TEXT NOT NULL,
+    not_before   REAL,
+    not_after    REAL,
+    installed_at REAL NOT NULL,
+    PRIMARY KEY (domain, fingerprint)
+);
+
+CREATE TABLE IF NOT EXISTS stale_endpoints (
+    domain       TEXT NOT NULL,
+    endpoint     TEXT NOT NULL,
+    fingerprint  TEXT NOT NULL,
+    attempts     INTEGER NOT NULL,
+    next_check   REAL NOT NULL,
+    PRIMARY KEY (domain, endpoint)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def _legacy_timestamp(text: Optional[str], utc_offset: float) -> Optional[float]:
+    """旧状态文件中的 ISO 时间 (不带时区时比 UTC 快 utc_offset 秒) 转换为 Unix 时间戳"""
+    if not text:
+        return None
+    value = datetime.fromisoformat(text)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc).timestamp() - utc_offset
+    return value.timestamp()
+
+
+class StateStore:
+    """
+    :param path: 数据库文件路径，所在目录不存在时自动创建。
+    :param legacy_dir: 旧版本状态文件所在的目录，为空时不导入。
+    :param legacy_utc_offset: 旧状态文件中本地时间相对 UTC 的偏移(秒)。
+    """
+
+    def __init__(self, path: str, legacy_dir: Optional[str] = None, legacy_utc_offset: float = 0.0):
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self.legacy_utc_offset = legacy_utc_offset
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    # --- 连接与事务 ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # isolation_level=None: 由 transaction() 显式控制事务
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                if self.legacy_dir:
+                    self._import_legacy(conn)
+                self._schema_ready = True
+        self._local.conn = conn
+        return conn
+
+    def _import_legacy(self, conn: sqlite3.Connection):
+        """
+        导入旧版本的 .last_run 和 .scheduler_state，已有的记录优先；导入后把文件重命名为 *.migrated。
+        文件无法解析时保留原文件，只记录警告。
+        """
+        last_run_path = os.path.join(self.legacy_dir, LEGACY_LAST_RUN)
+        scheduler_path = os.path.join(self.legacy_dir, LEGACY_SCHEDULER_STATE)
+        imported = []
+        for path in (last_run_path, scheduler_path):
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    if path == last_run_path and data.get('domain'):
+                        now = time.time()
+                        conn.execute(
+                            "INSERT INTO domains (domain, expiry, last_run, updated_at) VALUES (?, ?, ?, ?) "
+                            "ON CONFLICT(domain) DO UPDATE SET expiry = COALESCE(domains.expiry, excluded.expiry), "
+                            "last_run = COALESCE(domains.last_run, excluded.last_run)",
+                            (data['domain'], _legacy_timestamp(data.get('expiry_date'), 0.0),
+                             _legacy_timestamp(data.get('last_run'), self.legacy_utc_offset), now))
+                    elif path == scheduler_path and data.get('next_run_time'):
+                        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('next_run_time', ?)",
+                                     (str(data['next_run_time']),))
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+                conn.execute('COMMIT')
+            except (OSError, ValueError, TypeError, AttributeError) as e:
+                logging.warning(f"无法导入旧状态文件 {path}: {e}")
+                continue
+            try:
+                os.replace(path, path + '.migrated')
+            except OSError as e:
+                logging.warning(f"无法重命名已导入的旧状态文件 {path}: {e}")
+            imported.append(os.path.basename(path))
+        if imported:
+            logging.info(f"已将旧状态文件 {', '.join(imported)} 导入状态数据库。")
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务 (BEGIN IMMEDIATE)，退出时提交，发生异常时回滚"""
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def query(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return self._connect().execute(sql, params).fetchall()
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # --- 调度 ---
+
+    def set_due(self, entries: Dict[str, float]):
+        """设置域名的下次检查时间 (Unix 时间戳)"""
+        now = time.time()
+        with self.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO domains (domain, next_due, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(domain) DO UPDATE SET next_due = excluded.next_due, updated_at = excluded.updated_at",
+                [(domain, when, now) for domain, when in entries.items()])
+
+    def sync_domains(self, domains: Iterable[str], now: float) -> List[str]:
+        """
+        让 domains 表与配置中的域名一致: 新增 (或还没有检查时间) 的域名立即到期，已删除的域名移除。
+        运行历史不受影响。
+
+        :return: 新增的域名。
+        """
+        domains = list(dict.fromkeys(domains))
+        with self.transaction() as conn:
+            existing = dict(conn.execute("SELECT domain, next_due FROM domains").fetchall())
+            added = [domain for domain in domains if existing.get(domain) is None]
+            configured = set(domains)
+            removed = [domain for domain in existing if domain not in configured]
+            if added:
+                conn.executemany(
+                    "INSERT INTO domains (domain, next_due, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(domain) DO UPDATE SET next_due = excluded.next_due, updated_at = excluded.updated_at",
+                    [(domain, now, now) for domain in added])
+            if removed:
+                conn.executemany("DELETE FROM domains WHERE domain = ?", [(domain,) for domain in removed])
+        return added
+
+    def next_due(self) -> Optional[float]:
+        row = self.query("SELECT MIN(next_due) FROM domains")
+        return row[0][0] if row else None
+
+    def take_due(self, now: float, horizon: float, lease: float) -> List[str]:
+        """取出已到期的域名 (以及之后 horizon 秒内到期的域名)，并把它们的检查时间推迟到 now + lease"""
+        with self.transaction() as conn:
+            earliest = conn.execute("SELECT MIN(next_due) FROM domains").fetchone()[0]
+            if earliest is None or earliest > now:
+                return []
+            taken = [row[0] for row in conn.execute(
+                "SELECT domain FROM domains WHERE next_due <= ? ORDER BY next_due", (now + horizon,))]
+            conn.executemany("UPDATE domains SET next_due = ?, updated_at = ? WHERE domain = ?",
+                             [(now + lease, now, domain) for domain in taken])
+        return taken
+
+    def extend_lease(self, domains: Iterable[str], until: float, now: Optional[float] = None):
+        """把域名的检查时间推迟到至少 until (任务开始处理该域名时续租，已经更晚的检查时间保持不变)"""
+        now = time.time() if now is None else now
+        with self.transaction() as conn:
+            conn.executemany("UPDATE domains SET next_due = MAX(next_due, ?), updated_at = ? WHERE domain = ?",
+                             [(until, now, domain) for domain in domains])
+
+    def count_domains(self) -> int:
+        return self.query("SELECT COUNT(*) FROM domains")[0][0]
+
+    # --- 运行结果 ---
+
+    def record_check(self, domain: str, expiry: Optional[float], checked_at: Optional[float] = None):
+        """记录一次检查的结果 (替代原来的 .last_run 文件)，expiry 为 None 时保留已知的过期时间"""
+        checked_at = checked_at or time.time()
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT INTO domains (domain, expiry, last_run, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(domain) DO UPDATE SET expiry = COALESCE(excluded.expiry, domains.expiry), "
+                "last_run = excluded.last_run, "
+                "updated_at = excluded.updated_at",
+                (domain, expiry, checked_at, checked_at))
+
+    def record_run(self, domain: str, success: bool, renewed: bool, event: str = '', error: str = '',
+                   started_at: Optional[float] = None, finished_at: Optional[float] = None,
+                   expiry: Optional[float] = None, next_run: Optional[float] = None,
+                   phases: Sequence[Tuple[str, float]] = ()) -> int:
+        """记录一次运行及其各阶段耗时，返回运行 ID"""
+        with self.transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO runs (domain, started_at, finished_at, success, renewed, event, error, expiry, next_run) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (domain, started_at, finished_at, int(success), int(renewed), event, error, expiry, next_run))
+            run_id = cursor.lastrowid
+            conn.executemany("INSERT INTO phase_durations (run_id, phase, seconds) VALUES (?, ?, ?)",
+                             [(run_id, phase, seconds) for phase, seconds in phases])
+        return run_id
+
+    def record_cert_version(self, domain: str, fingerprint: str, not_before: Optional[float],
+                            not_after: Optional[float]):
+        """记录安装的证书，同一张证书只记录第一次安装的时间"""
+        with self.transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO cert_versions (domain, fingerprint, not_before, not_after, installed_at) "
+                "VALUES (?, ?, ?, ?, ?)", (domain, fingerprint, not_before, not_after, time.time()))
+
+    def set_stale_endpoints(self, domain: str, fingerprint: str, endpoints: Iterable[str], attempts: int,
+                            next_check: float):
+        """替换域名的待重新检查端点，endpoints 为空时清除"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM stale_endpoints WHERE domain = ?", (domain,))
+            conn.executemany(
+                "INSERT INTO stale_endpoints (domain, endpoint, fingerprint, attempts, next_check) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(domain, endpoint, fingerprint, attempts, next_check) for endpoint in endpoints])
+
+    def stale_endpoints(self, domain: str) -> Optional[Tuple[str, List[str], int, float]]:
+        """
+        :return: (新证书指纹, 端点列表, 已重新检查的次数, 下次检查时间)，没有待检查的端点时返回 None。
+        """
+        rows = self.query("SELECT endpoint, fingerprint, attempts, next_check FROM stale_endpoints "
+                          "WHERE domain = ? ORDER BY endpoint", (domain,))
+        if not rows:
+            return None
+        return rows[0][1], [row[0] for row in rows], rows[0][2], rows[0][3]
+
+    def recent_runs(self, domain: str, limit: int = 10) -> List[sqlite3.Row]:
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        try:
+            return conn.execute("SELECT * FROM runs WHERE domain = ? ORDER BY started_at DESC LIMIT ?",
+                                (domain, limit)).fetchall()
+        finally:
+            conn.row_factory = None
+
+    def known_expiry(self, domain: str) -> Optional[float]:
+        """最近一次记录的证书过期时间 (Unix 时间戳)"""
+        row = self.query("SELECT expiry FROM domains WHERE domain = ?", (domain,))
+        return row[0][0] if row else None
+
+    def domain_status(self) -> List[tuple]:
+        """
+        每个域名的当前状态和最近一次运行结果。
+
+        :return: [(域名, 下次检查时间, 过期时间, 上次运行时间, 成功, 续签, 事件, 错误)]，
+                 没有运行记录的域名后四项为 None。
+        """
+        return self.query(
+            "SELECT d.domain, d.next_due, d.expiry, d.last_run, r.success, r.renewed, r.event, r.error "
+            "FROM domains d LEFT JOIN runs r ON r.id = "
+            "(SELECT MAX(id) FROM runs WHERE runs.domain = d.domain) ORDER BY d.domain")
+
+    def expiring_before(self, timestamp: float) -> List[Tuple[str, float]]:
+        """过期时间早于 timestamp 的域名，按过期时间排序"""
+        return self.query("SELECT domain, expiry FROM domains WHERE expiry < ? ORDER BY expiry", (timestamp,))
+
+    # --- 键值状态 ---
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.query("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0][0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?) "
+                         "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
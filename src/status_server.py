@@ -0,0 +1,287 @@
+"""
+循环模式下的健康检查和状态接口 (asyncio HTTP 服务)。
+
+  GET  /healthz   主循环是否存活，以及距上次循环的秒数；不健康时返回 503
+  GET  /status    每个域名的证书过期时间、最近一次结果和下次检查时间
+  POST /run       立即执行一次证书检查 (与 SIGUSR1 相同)
+
+POST /run 会让全部域名立即到期并消耗 ACME 订单配额: 配置了 STATUS_TOKEN 时必须携带
+`Authorization: Bearer <STATUS_TOKEN>`，否则只接受来自本机 (回环地址) 的请求。
+
+响应全部来自内存中的 StatusCache，由主循环和工作线程在状态变化时更新，
+编排系统频繁轮询时不会读取状态数据库或连接任何主机。
+"""
+
+import asyncio
+import hmac
+import ipaddress
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+# 主循环在处理事件 (而不是睡眠等待) 时，超过这么多秒没有完成一次循环视为卡住
+STALL_SECONDS = 300
+# 启动时的全量检查在主循环中执行，允许的时间更长
+STARTUP_STALL_SECONDS = 3600
+# 主循环睡眠时，超过预定唤醒时间这么多秒仍未醒来视为卡住
+OVERSLEEP_GRACE = 60
+# 读取请求的超时时间(秒)
+REQUEST_TIMEOUT = 10
+MAX_BODY_SIZE = 64 * 1024
+
+
+def _isoformat(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
+
+
+class StatusCache:
+    """主循环和各域名的最新状态；编码后的响应在状态变化后的第一次请求时生成"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.last_tick: Optional[float] = None
+        self.busy_since: Optional[float] = time.time()
+        self.stall_after = STARTUP_STALL_SECONDS
+        self.state = 'starting'
+        self.wake_at: Optional[float] = None
+        self.next_run: Optional[float] = None
+        self.running = 0
+        self.domains: Dict[str, dict] = {}
+        self._status_body: Optional[bytes] = None
+
+    def load(self, rows):
+        """用状态数据库中的记录初始化 (StateStore.domain_status() 的返回值)"""
+        with self._lock:
+            for domain, next_due, expiry, last_run, success, renewed, event, error in rows:
+                self.domains[domain] = {
+                    'expiry': expiry,
+                    'next_run': next_due,
+                    'last_run': last_run,
+                    'success': None if success is None else bool(success),
+                    'renewed': None if renewed is None else bool(renewed),
+                    'event': event,
+                    'error': error or None,
+                }
+            self._status_body = None
+
+    def busy(self):
+        """主循环开始处理事件"""
+        with self._lock:
+            self.busy_since = time.time()
+            self.stall_after = STALL_SECONDS
+            self.state = 'busy'
+            self.wake_at = None
+
+    def tick(self, wake_at: float, next_run: Optional[float], running: int):
+        """主循环完成一次循环，将睡眠到 wake_at (Unix 时间戳)；next_run 为 None 时保持不变"""
+        with self._lock:
+            next_run = self.next_run if next_run is None else next_run
+            self.last_tick = time.time()
+            self.busy_since = None
+            self.state = 'sleeping'
+            self.wake_at = wake_at
+            if (next_run, running) != (self.next_run, self.running):
+                self.next_run, self.running = next_run, running
+                self._status_body = None
+
+    def record(self, domain: str, success: bool, renewed: bool, event: str, error: str,
+               expiry: Optional[float], next_run: Optional[float], finished_at: Optional[float] = None):
+        """记录域名的一次运行结果"""
+        with self._lock:
+            entry = self.domains.setdefault(domain, {})
+            entry.update({
+                'success': success,
+                'renewed': renewed,
+                'event': event,
+                'error': error or None,
+                'last_run': finished_at or time.time(),
+                'next_run': next_run,
+            })
+            if expiry is not None:
+                entry['expiry'] = expiry
+            self._status_body = None
+
+    def retain(self, domains):
+        """移除已不在配置中的域名"""
+        configured = set(domains)
+        with self._lock:
+            removed = [domain for domain in self.domains if domain not in configured]
+            for domain in removed:
+                del self.domains[domain]
+            if removed:
+                self._status_body = None
+
+    def health(self, now: Optional[float] = None) -> Tuple[bool, dict]:
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.busy_since is not None:
+                healthy = now - self.busy_since < self.stall_after
+            else:
+                healthy = now < self.wake_at + OVERSLEEP_GRACE
+            body = {
+                'status': 'ok' if healthy else 'stalled',
+                'loop': self.state,
+                'seconds_since_tick': None if self.last_tick is None else round(now - self.last_tick, 3),
+                'uptime_seconds': round(now - self.started_at, 3),
+                'running_tasks': self.running,
+            }
+        return healthy, body
+
+    def status_body(self) -> bytes:
+        with self._lock:
+            if self._status_body is None:
+                domains = {}
+                for domain, entry in sorted(self.domains.items()):
+                    domains[domain] = {
+                        'expiry': _isoformat(entry.get('expiry')),
+                        'last_run': _isoformat(entry.get('last_run')),
+                        'success': entry.get('success'),
+                        'renewed': entry.get('renewed'),
+                        'event': entry.get('event'),
+                        'error': entry.get('error'),
+                        'next_run': _isoformat(entry.get('next_run')),
+                    }
+                self._status_body = json.dumps({
+                    'next_run': _isoformat(self.next_run),
+                    'running_tasks': self.running,
+                    'domains': domains,
+                }, ensure_ascii=False).encode('utf-8')
+            return self._status_body
+
+
+class StatusServer:
+    """
+    在后台线程的事件循环中提供 HTTP 接口。
+
+    :param cache: 状态缓存。
+    :param request_run: POST /run 时调用，参数为触发原因。
+    :param token: POST /run 需要的 Bearer 令牌；为空时只接受来自回环地址的 POST /run。
+    """
+
+    def __init__(self, cache: StatusCache, request_run: Callable[[str], None], token: Optional[str] = None):
+        self.cache = cache
+        self.request_run = request_run
+        self.token = token or None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, reason: str, body: bytes,
+                       content_type: str = 'application/json; charset=utf-8', extra_headers: str = ''):
+        writer.write(f"HTTP/1.1 {status} {reason}\r\n"
+                     f"Content-Type: {content_type}\r\n"
+                     f"{extra_headers}"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"Cache-Control: no-store\r\n"
+                     f"Connection: close\r\n\r\n".encode('ascii') + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            parts = request_line.decode('latin-1').split()
+            if len(parts) < 2:
+                return
+            method, path = parts[0].upper(), parts[1].split('?', 1)[0]
+            length, authorization = 0, ''
+            while True:
+                header = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+                if header in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = header.decode('latin-1').partition(':')
+                name = name.strip().lower()
+                if name == 'content-length':
+                    length = min(int(value.strip() or 0), MAX_BODY_SIZE)
+                elif name == 'authorization':
+                    authorization = value.strip()
+            if length:
+                await asyncio.wait_for(reader.readexactly(length), REQUEST_TIMEOUT)
+            await self._route(writer, method, path, authorization)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def _run_allowed(self, writer: asyncio.StreamWriter, authorization: str) -> bool:
+        """POST /run 是否被允许: 令牌匹配，或未配置令牌且请求来自回环地址"""
+        if self.token:
+            scheme, _, credentials = authorization.partition(' ')
+            return scheme.lower() == 'bearer' and \
+                hmac.compare_digest(credentials.strip().encode('utf-8'), self.token.encode('utf-8'))
+        peer = writer.get_extra_info('peername')
+        try:
+            return bool(peer) and ipaddress.ip_address(peer[0]).is_loopback
+        except ValueError:
+            return False
+
+    async def _route(self, writer: asyncio.StreamWriter, method: str, path: str, authorization: str = ''):
+        if path == '/healthz' and method == 'GET':
+            healthy, body = self.cache.health()
+            await self._respond(writer, 200 if healthy else 503, 'OK' if healthy else 'Service Unavailable',
+                                json.dumps(body).encode('utf-8'))
+        elif path == '/status' and method == 'GET':
+            await self._respond(writer, 200, 'OK', self.cache.status_body())
+        elif path == '/run' and method == 'POST':
+            if not self._run_allowed(writer, authorization):
+                if self.token:
+                    await self._respond(writer, 401, 'Unauthorized', b'{"error": "unauthorized"}',
+                                        extra_headers='WWW-Authenticate: Bearer\r\n')
+                else:
+                    await self._respond(writer, 403, 'Forbidden',
+                                        b'{"error": "set STATUS_TOKEN to allow remote POST /run"}')
+                return
+            self.request_run("HTTP 请求")
+            await self._respond(writer, 202, 'Accepted', b'{"status": "accepted"}')
+        elif path in ('/healthz', '/status', '/run'):
+            await self._respond(writer, 405, 'Method Not Allowed', b'{"error": "method not allowed"}')
+        else:
+            await self._respond(writer, 404, 'Not Found', b'{"error": "not found"}')
+
+    def start(self, port: int, addr: str = '0.0.0.0'):
+        """
+        启动后台线程，端口绑定完成后返回。
+
+        :raises OSError: 无法绑定端口时抛出。
+        """
+        ready = threading.Event()
+        error = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                self._server = loop.run_until_complete(asyncio.start_server(self._handle, addr, port))
+            except OSError as e:
+                error.append(e)
+                ready.set()
+                loop.close()
+                return
+            self._loop = loop
+            ready.set()
+            try:
+                loop.run_forever()
+            finally:
+                self._server.close()
+                loop.run_until_complete(self._server.wait_closed())
+                loop.close()
+
+        threading.Thread(target=run, name='status-http', daemon=True).start()
+        ready.wait()
+        if error:
+            raise error[0]
+        return self
+
+    @property
+    def port(self) -> Optional[int]:
+        if self._server is None or not self._server.sockets:
+            return None
+        return self._server.sockets[0].getsockname()[1]
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
@@ -0,0 +1,272 @@
+"""
+群晖 DSM Web API 客户端，用于部署证书。
+
+* 每台 NAS 保持一个已登录的会话 (SID)，多个证书、多次运行之间复用，会话失效时自动重新登录
+* 通过 requests.Session 复用 HTTP 连接
+* 上传前列出 DSM 上已有的证书，同一张证书已经存在时跳过上传
+"""
+
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cert_utils import CertInfo, CertParseError, load_pem_certificates
+
+DEFAULT_TIMEOUT = 30
+
+# 会话失效相关的错误码: 106 超时、107 被其他登录挤下线、119 SID 不存在
+SESSION_ERROR_CODES = (106, 107, 119)
+# 登录失败中重试也无法解决的错误码: 400 密码错误、401 账户被禁用、402 权限不足、403/404 需要两步验证
+AUTH_ERROR_CODES = (400, 401, 402, 403, 404)
+
+DEPLOY_SKIPPED = 'skipped'
+DEPLOY_UPDATED = 'updated'
+DEPLOY_CREATED = 'created'
+
+
+class DSMError(Exception):
+    """
+    DSM API 返回失败或无法访问。
+
+    :param retryable: 重试是否可能成功；凭证错误、配置不允许等情况为 False。
+    """
+
+    def __init__(self, message: str, code: Optional[int] = None, retryable: bool = True):
+        super().__init__(message if code is None else f"{message} (错误码 {code})")
+        self.code = code
+        self.retryable = retryable
+
+
+@dataclass
+class DeployResult:
+    """一次证书部署的结果"""
+    action: str             # skipped / updated / created
+    cert_id: str
+    description: str
+
+
+def _parse_dsm_time(value: str) -> Optional[datetime]:
+    """解析 DSM 返回的时间，例如 'Jan 15 12:00:00 2027 GMT'"""
+    try:
+        return datetime.strptime(' '.join(str(value).split()), '%b %d %H:%M:%S %Y GMT')
+    except ValueError:
+        return None
+
+
+def _common_name(subject: str) -> str:
+    match = re.search(r'(?:^|,\s*)CN=([^,]+)', subject or '')
+    return match.group(1).strip() if match else ''
+
+
+def same_certificate(existing: dict, cert: CertInfo) -> bool:
+    """
+    DSM 上的证书与本地证书是否为同一张证书。
+    DSM 的列表接口不返回证书指纹，这里比较 通用名、SAN 和精确到秒的有效期，
+    同一 CA 对同一组域名的两次签发不会具有相同的起止时间。
+    """
+    subject = existing.get('subject') or {}
+    if subject.get('common_name') != _common_name(cert.subject):
+        return False
+    if set(subject.get('sub_alt_name') or []) != set(cert.san):
+        return False
+    return (_parse_dsm_time(existing.get('valid_from', '')) == cert.not_before
+            and _parse_dsm_time(existing.get('valid_till', '')) == cert.not_after)
+
+
+class DSMClient:
+    """
+    单台 NAS 的 DSM Web API 客户端。
+
+    :param scheme: http 或 https。
+    :param verify_ssl: https 访问时是否校验 NAS 的证书。
+    """
+
+    def __init__(self, hostname: str, port, username: str, password: str, scheme: str = 'https',
+                 verify_ssl: bool = True, timeout: float = DEFAULT_TIMEOUT):
+        self.base_url = f"{scheme or 'https'}://{hostname}:{port}/webapi"
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.verify = verify_ssl
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.sid: Optional[str] = None
+        self.synotoken: Optional[str] = None
+        self._api_paths: Dict[str, Tuple[str, int]] = {}
+        self._lock = threading.RLock()
+
+    # --- 底层请求 ---
+
+    def _request(self, path: str, params: dict, files=None, data=None) -> dict:
+        url = f"{self.base_url}/{path}"
+        try:
+            if files or data:
+                response = self.session.post(url, params=params, files=files, data=data, timeout=self.timeout)
+            else:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except requests.exceptions.RequestException as e:
+            raise DSMError(f"请求 DSM 接口 {path} 失败: {e}")
+        except ValueError:
+            raise DSMError(f"DSM 接口 {path} 返回了无法解析的内容")
+
+    def _api_path(self, api: str, default: Tuple[str, int]) -> Tuple[str, int]:
+        """通过 SYNO.API.Info 查询接口路径和最高版本，结果在客户端生命周期内缓存"""
+        if not self._api_paths:
+            result = self._request('query.cgi', {
+                'api': 'SYNO.API.Info', 'version': 1, 'method': 'query',
+                'query': 'SYNO.API.Auth,SYNO.Core.Certificate,SYNO.Core.Certificate.CRT'})
+            for name, info in (result.get('data') or {}).items():
+                self._api_paths[name] = (info.get('path', 'entry.cgi'), int(info.get('maxVersion', 1)))
+        return self._api_paths.get(api, default)
+
+    def _call(self, api: str, method: str, params: Optional[dict] = None, files=None, data=None,
+              version: Optional[int] = None, retry_login: bool = True) -> dict:
+        """调用需要登录的接口，会话失效时重新登录并重试一次"""
+        with self._lock:
+            if not self.sid:
+                self.login()
+            path, _ = self._api_path(api, ('entry.cgi', 1))
+            query = {'api': api, 'method': method, 'version': version or 1, '_sid': self.sid,
+                     'SynoToken': self.synotoken or ''}
+            query.update(params or {})
+            result = self._request(path, query, files=files, data=data)
+            if result.get('success'):
+                return result.get('data') or {}
+
+            code = (result.get('error') or {}).get('code')
+            if code in SESSION_ERROR_CODES and retry_login:
+                logging.info(f"DSM 会话已失效 (错误码 {code})，重新登录。")
+                self.sid = None
+                return self._call(api, method, params, files, data, version, retry_login=False)
+            raise DSMError(f"DSM 接口 {api}.{method} 调用失败", code)
+
+    # --- 会话 ---
+
+    def login(self):
+        """登录 DSM；凭证放在 POST 请求体中，不会出现在 URL、访问日志和错误信息里"""
+        with self._lock:
+            path, max_version = self._api_path('SYNO.API.Auth', ('auth.cgi', 6))
+            result = self._request(path, {
+                'api': 'SYNO.API.Auth', 'version': min(max_version, 6), 'method': 'login',
+            }, data={'account': self.username, 'passwd': self.password, 'format': 'sid',
+                     'enable_syno_token': 'yes'})
+            if not result.get('success'):
+                code = (result.get('error') or {}).get('code')
+                raise DSMError("登录 DSM 失败，请检查用户名和密码", code, retryable=code not in AUTH_ERROR_CODES)
+            data = result.get('data') or {}
+            self.sid = data.get('sid')
+            self.synotoken = data.get('synotoken')
+            self.session.headers['X-SYNO-TOKEN'] = self.synotoken or ''
+            logging.info(f"已登录 DSM {self.base_url}")
+
+    def logout(self):
+        with self._lock:
+            if not self.sid:
+                return
+            path, _ = self._api_path('SYNO.API.Auth', ('auth.cgi', 6))
+            try:
+                self._request(path, {'api': 'SYNO.API.Auth', 'version': 1, 'method': 'logout'},
+                              data={'_sid': self.sid})
+            except DSMError as e:
+                logging.debug(f"登出 DSM 失败: {e}")
+            self.sid = None
+            self.synotoken = None
+
+    # --- 证书 ---
+
+    def list_certificates(self) -> List[dict]:
+        data = self._call('SYNO.Core.Certificate.CRT', 'list')
+        return data.get('certificates') or []
+
+    def import_certificate(self, key_pem: bytes, cert_pem: bytes, chain_pem: bytes,
+                           cert_id: str = '', description: str = '', as_default: bool = False) -> str:
+        """上传证书，cert_id 为空时新建证书；返回 DSM 中的证书 ID"""
+        files = {
+            'key': ('privkey.pem', key_pem, 'application/octet-stream'),
+            'cert': ('cert.pem', cert_pem, 'application/octet-stream'),
+            'inter_cert': ('chain.pem', chain_pem, 'application/octet-stream'),
+        }
+        data = {'id': cert_id, 'desc': description, 'as_default': 'true' if as_default else ''}
+        result = self._call('SYNO.Core.Certificate', 'import', files=files, data=data)
+        return result.get('id') or cert_id
+
+    def deploy_certificate(self, key_path: str, cert_path: str, chain_path: str,
+                           description: str = '', create: bool = True) -> DeployResult:
+        """
+        部署证书到 DSM: 按描述查找已有证书，内容相同时跳过上传，否则替换或新建。
+
+        :param description: 证书描述，用于在 DSM 中定位证书。
+        :param create: 找不到对应描述的证书时是否新建。
+        """
+        try:
+            certs = load_pem_certificates(cert_path)
+        except (OSError, CertParseError) as e:
+            raise DSMError(f"无法读取要部署的证书 {cert_path}: {e}", retryable=False)
+        if not certs:
+            raise DSMError(f"证书文件 {cert_path} 中没有证书", retryable=False)
+        leaf = certs[0]
+
+        with self._lock:
+            existing = next((c for c in self.list_certificates() if c.get('desc', '') == description), None)
+            if existing and same_certificate(existing, leaf):
+                logging.info(f"DSM 上描述为 '{description}' 的证书已是最新，跳过上传。")
+                return DeployResult(DEPLOY_SKIPPED, existing.get('id', ''), description)
+            if existing is None and not create:
+                raise DSMError(f"DSM 上找不到描述为 '{description}' 的证书，且未允许新建证书", retryable=False)
+
+            contents = []
+            for path in (key_path, cert_path, chain_path):
+                with open(path, 'rb') as f:
+                    contents.append(f.read())
+            cert_id = self.import_certificate(*contents, cert_id=existing.get('id', '') if existing else '',
+                                              description=description,
+                                              as_default=bool(existing and existing.get('is_default')))
+        action = DEPLOY_UPDATED if existing else DEPLOY_CREATED
+        logging.info(f"证书已{'替换' if existing else '新建'}到 DSM (ID: {cert_id}, 描述: '{description}')。")
+        return DeployResult(action, cert_id, description)
+
+    def close(self):
+        self.logout()
+        self.session.close()
+
+
+# 每台 NAS 一个客户端，在主循环的多次运行之间复用会话
+_clients: Dict[tuple, DSMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(hostname: str, port, username: str, password: str, scheme: str = 'https',
+               verify_ssl: bool = True, timeout: float = DEFAULT_TIMEOUT) -> DSMClient:
+    """返回该 NAS 的共享客户端；凭证变化时创建新的客户端，超时设置始终取本次传入的值"""
+    key = (scheme, hostname, str(port), username)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None and (client.password, client.session.verify) != (password, verify_ssl):
+            client.close()
+            client = None
+        if client is None:
+            client = DSMClient(hostname, port, username, password, scheme, verify_ssl, timeout)
+            _clients[key] = client
+        client.timeout = timeout
+        return client
+
+
+def close_all():
+    """登出全部会话，单次运行模式退出前调用"""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()